@@ -0,0 +1 @@
+"""Data and model helpers shared by the AirSense Streamlit app and its offline tools."""
@@ -0,0 +1,514 @@
+"""Anomaly-detector training in bounded memory.
+
+``notebooks/anomaly_det_model.ipynb`` fits ``DBSCAN(eps=1.5, min_samples=5)``
+on the full six-feature matrix.  sklearn holds every point's eps-neighbourhood
+at once, which grows with rows times neighbours, and the neighbour count
+itself grows with the data's density.  ``train`` computes the same model out
+of core:
+
+1. The processed table is streamed once to get latitude quantiles
+   (``QuantileSketch``), the row count and a reservoir sample for the
+   Isolation Forest.
+2. Latitude is cut into strips of about ``strip_rows`` rows each, and every
+   strip is at least ``eps`` wide.  Feature rows are spilled to one file per
+   strip, so a point's eps-neighbours lie in its own strip or one of the two
+   next to it.
+3. Core flags: for each strip, neighbours are counted against the strip plus
+   the eps-wide margins of the adjacent strips.  ``return_length`` is used, so
+   no neighbour lists are built.
+4. Clusters: strips are visited south to north.  Core-core edges are
+   enumerated at most ``edge_batch`` at a time and merged into connected
+   components.  Components that reach into the previous strip are joined
+   through a union-find over cluster ids, not over points.
+5. Cluster ids are ordered by each cluster's first core row.  A border point
+   takes the smallest id among the cores within ``eps`` of it.  This is how
+   sklearn numbers clusters and assigns border points, so labels, core
+   samples and flags match ``DBSCAN.fit``.
+6. A final pass streams the processed table in row order.  It merges the
+   per-strip results (each strip file is already in row order), scores the
+   Isolation Forest one chunk at a time, and appends to
+   ``processed_with_anomalies.csv`` and to the model arrays.
+
+Working memory depends on ``chunk_rows``, ``strip_rows`` and ``edge_batch``,
+not on the row count.  A single eps-wide latitude band with more than
+``strip_rows`` rows is kept whole.  The exception is the DBSCAN pickle: like
+the notebook's model, it holds every core sample and label, and pickling reads
+those back from the spill directory.
+
+The Isolation Forest is fitted on a uniform reservoir sample of
+``iforest_sample`` rows.  Each tree draws only 256 rows, and the ``auto``
+offset does not depend on the data.  When the table has at most that many
+rows, the sample is the whole table in order and the model matches the
+notebook's.
+
+    python -m airsense.anomaly_train --strip-rows 200000 --iforest-sample 100000
+
+Rows with a missing feature cannot be scored by either model.  They are
+labelled -1 and flagged by both.
+
+This is a separate job from the ``anomaly`` target of ``airsense.train``,
+which keeps the notebook's in-memory fit for tables that fit in memory.
+Both write the same files; run this one when that fit runs out of memory.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from airsense import snapshots
+from airsense.anomaly import ANOMALY_FEATURES
+from airsense.config import ANOMALIES_CSV, model_path
+from airsense.pipeline import QuantileSketch
+
+EPS, MIN_SAMPLES = 1.5, 5
+RANDOM_STATE = 42
+LAT = ANOMALY_FEATURES.index("latitude")
+
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_STRIP_ROWS = 250_000
+DEFAULT_EDGE_BATCH = 500_000
+DEFAULT_IFOREST_SAMPLE = 100_000
+
+_RESULT = np.dtype([("row", "<i8"), ("label", "<i8"), ("core", "?")])
+
+
+class _Reservoir:
+    """Uniform sample of ``size`` rows (algorithm R); the first ``size`` rows are kept in order."""
+
+    def __init__(self, size, n_features, seed=RANDOM_STATE):
+        self.rows = np.empty((size, n_features))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X):
+        size = len(self.rows)
+        fill = min(max(size - self.seen, 0), len(X))
+        self.rows[self.seen:self.seen + fill] = X[:fill]
+        rest = X[fill:]
+        if len(rest):
+            seen = self.seen + fill + np.arange(len(rest))
+            slot = (self.rng.random(len(rest)) * (seen + 1)).astype(np.int64)
+            keep = slot < size
+            self.rows[slot[keep]] = rest[keep]
+        self.seen += len(X)
+
+    def sample(self):
+        return self.rows[:min(self.seen, len(self.rows))]
+
+
+class _LabelForest:
+    """Union-find over provisional cluster ids, tracking each cluster's first row."""
+
+    def __init__(self):
+        self.parent = np.empty(0, dtype=np.int64)
+        self.first_row = np.empty(0, dtype=np.int64)
+
+    def add(self, first_rows):
+        start = len(self.parent)
+        self.parent = np.concatenate([self.parent, np.arange(start, start + len(first_rows))])
+        self.first_row = np.concatenate([self.first_row, first_rows])
+        return np.arange(start, start + len(first_rows))
+
+    def find(self, label):
+        parent = self.parent
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            a, b = (a, b) if self.first_row[a] <= self.first_row[b] else (b, a)
+            self.parent[b] = a
+        return a
+
+    def final_ids(self):
+        """Provisional id -> cluster number, clusters numbered by their first row."""
+        roots = np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+        unique = np.unique(roots)
+        rank = np.empty(len(self.parent), dtype=np.int64)
+        rank[unique[np.argsort(self.first_row[unique], kind="stable")]] = np.arange(len(unique))
+        return rank[roots]
+
+
+class _Strips:
+    """Feature rows spilled per latitude strip: ``row id`` plus the six features, in row order."""
+
+    def __init__(self, directory, edges):
+        self.directory = Path(directory)
+        self.edges = edges
+        self.n = len(edges) + 1
+        self._files = [open(self.path(i, "rows"), "wb") for i in range(self.n)]
+
+    def path(self, strip, kind):
+        return self.directory / f"strip-{strip:05d}.{kind}"
+
+    def bounds(self, strip):
+        lo = self.edges[strip - 1] if strip > 0 else -np.inf
+        hi = self.edges[strip] if strip < len(self.edges) else np.inf
+        return lo, hi
+
+    def write(self, rows, X):
+        strip = np.searchsorted(self.edges, X[:, LAT], side="right")
+        records = np.column_stack([rows.astype(np.float64), X])
+        for s in np.unique(strip):
+            records[strip == s].tofile(self._files[s])
+
+    def close(self):
+        for fh in self._files:
+            fh.close()
+
+    def load(self, strip):
+        """``(row ids, X)`` of one strip, or None outside the strip range."""
+        if strip < 0 or strip >= self.n:
+            return None
+        records = np.fromfile(self.path(strip, "rows"), dtype=np.float64).reshape(-1, 1 + len(ANOMALY_FEATURES))
+        return records[:, 0].astype(np.int64), np.ascontiguousarray(records[:, 1:])
+
+    def save(self, strip, kind, values):
+        values.tofile(self.path(strip, kind))
+
+    def read(self, strip, kind, dtype):
+        return np.fromfile(self.path(strip, kind), dtype=dtype)
+
+
+def _batches(weights, budget):
+    """Cut ``range(len(weights))`` into consecutive slices whose weight stays within ``budget``."""
+    start = 0
+    total = np.cumsum(weights)
+    while start < len(weights):
+        offset = total[start - 1] if start else 0
+        end = int(np.searchsorted(total, offset + budget, side="right"))
+        end = max(end, start + 1)
+        yield slice(start, end)
+        start = end
+
+
+def _pairs(query, tree, eps, weights, edge_batch):
+    """Yield ``(i, j)`` index arrays of all query/tree pairs within ``eps``, a bounded batch at a time."""
+    for part in _batches(weights, edge_batch):
+        found = cKDTree(query[part]).sparse_distance_matrix(tree, eps, output_type="ndarray")
+        yield found["i"] + part.start, found["j"]
+
+
+def _margin(X, lo, hi, eps):
+    """Rows of a neighbouring strip within ``eps`` of the latitude range ``[lo, hi)``."""
+    lat = X[:, LAT]
+    return (lat >= lo - eps) & (lat < hi + eps)
+
+
+def _core_flags(strips, eps, min_samples):
+    """Pass 3: core flag and neighbour count of every row, saved per strip."""
+    window = [None, strips.load(0), strips.load(1)]
+    n_core = 0
+    for s in range(strips.n):
+        lo, hi = strips.bounds(s)
+        _, X = window[1]
+        parts = [X] + [nb[1][_margin(nb[1], lo, hi, eps)] for nb in (window[0], window[2]) if nb is not None]
+        tree = cKDTree(np.concatenate(parts))
+        counts = tree.query_ball_point(X, eps, return_length=True).astype(np.int64)
+        core = counts >= min_samples
+        strips.save(s, "core", core)
+        strips.save(s, "degree", counts)
+        n_core += int(core.sum())
+        window = [window[1], window[2], strips.load(s + 2)]
+    return n_core
+
+
+def _components(strips, forest, eps, edge_batch):
+    """Pass 4: provisional cluster id of every core, visiting strips south to north."""
+    previous = None  # (X of cores, provisional labels) of the previous strip
+    for s in range(strips.n):
+        lo, hi = strips.bounds(s)
+        rows, X = strips.load(s)
+        core = strips.read(s, "core", bool)
+        degree = strips.read(s, "degree", np.int64)[core]
+        C, C_rows = X[core], rows[core]
+
+        if previous is not None:
+            near = _margin(previous[0], lo, hi, eps)
+            H, H_labels = previous[0][near], previous[1][near]
+        else:
+            H, H_labels = X[:0], np.empty(0, dtype=np.int64)
+
+        m, h = len(C), len(H)
+        comp = np.arange(m + h)
+        if m:
+            tree = cKDTree(np.concatenate([C, H]))
+            for i, j in _pairs(C, tree, eps, degree, edge_batch):
+                a, b = comp[i], comp[j]
+                keep = a != b
+                if not keep.any():
+                    continue
+                graph = coo_matrix((np.ones(keep.sum(), dtype=np.int8), (a[keep], b[keep])), shape=(m + h, m + h))
+                _, relabel = connected_components(graph, directed=False)
+                comp = relabel[comp]
+
+        unique, inverse = np.unique(comp[:m], return_inverse=True)
+        firsts = np.full(len(unique), np.iinfo(np.int64).max)
+        np.minimum.at(firsts, inverse, C_rows)
+        ids = np.full(len(unique), -1, dtype=np.int64)
+        # Components reaching into the previous strip join its clusters
+        if h:
+            for c, label in np.unique(np.column_stack([comp[m:], H_labels]), axis=0):
+                k = np.searchsorted(unique, c)
+                if k < len(unique) and unique[k] == c:
+                    ids[k] = forest.union(ids[k], label) if ids[k] >= 0 else forest.find(label)
+        new = ids < 0
+        ids[new] = forest.add(firsts[new])
+        for k in np.flatnonzero(~new):
+            root = forest.find(ids[k])
+            forest.first_row[root] = min(forest.first_row[root], firsts[k])
+        labels = ids[inverse]
+        strips.save(s, "labels", labels)
+        previous = (C, labels)
+
+
+def _assign(strips, final, eps, edge_batch):
+    """Pass 5: final label of every row; border rows take the smallest neighbouring cluster."""
+    def cores(strip):
+        loaded = strips.load(strip)
+        if loaded is None:
+            return None
+        core = strips.read(strip, "core", bool)
+        return loaded[1][core], final[strips.read(strip, "labels", np.int64)], loaded[0], core
+
+    window = [None, cores(0), cores(1)]
+    for s in range(strips.n):
+        lo, hi = strips.bounds(s)
+        C, C_labels, rows, core = window[1]
+        _, X = strips.load(s)
+        label = np.full(len(rows), -1, dtype=np.int64)
+        label[core] = C_labels
+
+        border = np.flatnonzero(~core)
+        parts = [(C, C_labels)] + [
+            (nb[0][near], nb[1][near]) for nb in (window[0], window[2]) if nb is not None
+            for near in [_margin(nb[0], lo, hi, eps)]
+        ]
+        candidates = np.concatenate([p[0] for p in parts])
+        if len(border) and len(candidates):
+            candidate_labels = np.concatenate([p[1] for p in parts])
+            degree = strips.read(s, "degree", np.int64)[border]
+            best = np.full(len(border), np.iinfo(np.int64).max)
+            for i, j in _pairs(X[border], cKDTree(candidates), eps, degree, edge_batch):
+                np.minimum.at(best, i, candidate_labels[j])
+            reached = best != np.iinfo(np.int64).max
+            label[border[reached]] = best[reached]
+
+        result = np.empty(len(rows), dtype=_RESULT)
+        result["row"], result["label"], result["core"] = rows, label, core
+        strips.save(s, "result", result)
+        window = [window[1], window[2], cores(s + 2)]
+
+
+class _ResultReader:
+    """Sequential reader of one strip's results (sorted by row id)."""
+
+    def __init__(self, path, block):
+        self.fh = open(path, "rb")
+        self.block = block
+        self.buffer = np.empty(0, dtype=_RESULT)
+
+    def take_until(self, end):
+        while True:
+            if len(self.buffer) and self.buffer["row"][-1] >= end:
+                break
+            more = np.fromfile(self.fh, dtype=_RESULT, count=self.block)
+            if not len(more):
+                break
+            self.buffer = np.concatenate([self.buffer, more])
+        cut = int(np.searchsorted(self.buffer["row"], end))
+        taken, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return taken
+
+    def close(self):
+        self.fh.close()
+
+
+class _NpyWriter:
+    """Appends rows to a ``.npy`` file of known final shape without holding it in memory."""
+
+    def __init__(self, path, dtype, shape):
+        self.path = path
+        self.fh = open(path, "wb")
+        np.lib.format.write_array_header_1_0(self.fh, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": shape,
+        })
+        self.dtype = dtype
+
+    def write(self, values):
+        self.fh.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+
+    def close(self):
+        self.fh.close()
+
+
+class AnomalyTrainResult:
+    def __init__(self, rows, n_core, n_clusters, n_strips, seconds, written):
+        self.rows = rows
+        self.n_core = n_core
+        self.n_clusters = n_clusters
+        self.n_strips = n_strips
+        self.seconds = seconds
+        self.written = written
+
+    def __repr__(self):
+        return (f"AnomalyTrainResult(rows={self.rows:,}, core={self.n_core:,}, clusters={self.n_clusters:,}, "
+                f"strips={self.n_strips}, seconds={self.seconds:.2f})")
+
+
+def _strip_edges(sketch, n_rows, strip_rows, eps):
+    """Latitude boundaries giving about ``strip_rows`` rows per strip, at least ``eps`` apart."""
+    n_strips = max(1, int(np.ceil(n_rows / strip_rows)))
+    edges = []
+    for q in np.arange(1, n_strips) / n_strips:
+        edge = sketch.quantile(q)
+        if edge - (edges[-1] if edges else -np.inf) >= eps:
+            edges.append(edge)
+    # The last strip must be eps wide too
+    top = sketch.quantile(1.0)
+    while edges and top - edges[-1] < eps:
+        edges.pop()
+    return np.array(edges)
+
+
+def train(eps=EPS, min_samples=MIN_SAMPLES, chunk_rows=DEFAULT_CHUNK_ROWS, strip_rows=DEFAULT_STRIP_ROWS,
+          edge_batch=DEFAULT_EDGE_BATCH, iforest_sample=DEFAULT_IFOREST_SAMPLE, work_dir=None, write=True):
+    """Fit DBSCAN and the Isolation Forest on the processed table and write the models and anomaly table."""
+    import joblib
+    from sklearn.cluster import DBSCAN
+    from sklearn.ensemble import IsolationForest
+
+    start = time.perf_counter()
+    tmp_dir = Path(tempfile.mkdtemp(prefix="airsense-anomaly-", dir=work_dir))
+    try:
+        # Pass 1: latitude quantiles, row count, Isolation Forest sample
+        sketch = QuantileSketch()
+        reservoir = _Reservoir(iforest_sample, len(ANOMALY_FEATURES))
+        n_rows = 0
+        for chunk in snapshots.iter_chunks("processed", ANOMALY_FEATURES, chunk_rows):
+            X = chunk[ANOMALY_FEATURES].to_numpy(dtype=np.float64)
+            X = X[~np.isnan(X).any(axis=1)]
+            sketch.add(X[:, LAT])
+            reservoir.add(X)
+            n_rows += len(chunk)
+
+        # Pass 2: spill feature rows per latitude strip
+        strips = _Strips(tmp_dir, _strip_edges(sketch, reservoir.seen, strip_rows, eps))
+        offset = 0
+        for chunk in snapshots.iter_chunks("processed", ANOMALY_FEATURES, chunk_rows):
+            X = chunk[ANOMALY_FEATURES].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(X).any(axis=1)
+            strips.write(offset + np.flatnonzero(valid), X[valid])
+            offset += len(chunk)
+        strips.close()
+
+        n_core = _core_flags(strips, eps, min_samples)
+        forest = _LabelForest()
+        _components(strips, forest, eps, edge_batch)
+        final = forest.final_ids()
+        _assign(strips, final, eps, edge_batch)
+        n_clusters = int(final.max()) + 1 if len(final) else 0
+
+        iforest = IsolationForest(n_estimators=100, contamination="auto", random_state=RANDOM_STATE)
+        iforest.fit(reservoir.sample())
+
+        # Pass 6: merge strip results in row order and write everything out
+        components = _NpyWriter(tmp_dir / "components.npy", np.float64, (n_core, len(ANOMALY_FEATURES)))
+        core_indices = _NpyWriter(tmp_dir / "core_sample_indices.npy", np.int64, (n_core,))
+        all_labels = _NpyWriter(tmp_dir / "labels.npy", np.int64, (n_rows,))
+        # The readers' buffers together stay around one chunk
+        block = max(1024, chunk_rows // strips.n)
+        readers = [_ResultReader(strips.path(s, "result"), block) for s in range(strips.n)]
+        csv_tmp = ANOMALIES_CSV.with_name(f".{ANOMALIES_CSV.name}.tmp")
+        if write:
+            ANOMALIES_CSV.parent.mkdir(parents=True, exist_ok=True)
+        out = open(csv_tmp, "w", newline="") if write else None
+        try:
+            offset = 0
+            for chunk in snapshots.iter_chunks("processed", None, chunk_rows):
+                end = offset + len(chunk)
+                label = np.full(len(chunk), -1, dtype=np.int64)
+                core = np.zeros(len(chunk), dtype=bool)
+                for reader in readers:
+                    taken = reader.take_until(end)
+                    label[taken["row"] - offset] = taken["label"]
+                    core[taken["row"] - offset] = taken["core"]
+
+                X = chunk[ANOMALY_FEATURES].to_numpy(dtype=np.float64)
+                valid = ~np.isnan(X).any(axis=1)
+                iso = np.full(len(chunk), -1, dtype=np.int64)
+                if valid.any():
+                    iso[valid] = iforest.predict(X[valid])
+
+                components.write(X[core])
+                core_indices.write(offset + np.flatnonzero(core))
+                all_labels.write(label)
+                if out is not None:
+                    chunk = chunk.reset_index(drop=True)
+                    chunk["iso_label"] = iso
+                    chunk["is_anomaly_iso"] = iso == -1
+                    chunk["dbscan_label"] = label
+                    chunk["is_anomaly_dbscan"] = label == -1
+                    chunk.to_csv(out, index=False, header=offset == 0)
+                offset = end
+        finally:
+            for writer in (components, core_indices, all_labels, *readers):
+                writer.close()
+            if out is not None:
+                out.close()
+
+        written = []
+        if write:
+            dbscan = DBSCAN(eps=eps, min_samples=min_samples, metric="euclidean")
+            # Views on the spilled arrays: joblib streams them into the pickle
+            dbscan.core_sample_indices_ = np.asarray(np.load(tmp_dir / "core_sample_indices.npy", mmap_mode="r"))
+            dbscan.components_ = np.asarray(np.load(tmp_dir / "components.npy", mmap_mode="r"))
+            dbscan.labels_ = np.asarray(np.load(tmp_dir / "labels.npy", mmap_mode="r"))
+            dbscan.n_features_in_ = len(ANOMALY_FEATURES)
+
+            staged = [(csv_tmp, ANOMALIES_CSV)]
+            for name, model in (("dbscan", dbscan), ("iforest", iforest)):
+                path = model_path(name)
+                tmp = path.with_name(f".{path.name}.tmp")
+                joblib.dump(model, tmp)
+                staged.append((tmp, path))
+            for tmp, path in staged:
+                os.replace(tmp, path)
+                written.append(path)
+        return AnomalyTrainResult(n_rows, n_core, n_clusters, strips.n, time.perf_counter() - start, written)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the anomaly detectors out of core")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--strip-rows", type=int, default=DEFAULT_STRIP_ROWS,
+                        help="rows per latitude strip (bounds the neighbourhood search)")
+    parser.add_argument("--edge-batch", type=int, default=DEFAULT_EDGE_BATCH,
+                        help="neighbour pairs materialized at a time")
+    parser.add_argument("--iforest-sample", type=int, default=DEFAULT_IFOREST_SAMPLE,
+                        help="rows sampled to fit the Isolation Forest")
+    parser.add_argument("--work-dir", help="where to spill strips (default: system temp dir)")
+    parser.add_argument("--dry-run", action="store_true", help="train but do not write anything")
+    args = parser.parse_args(argv)
+
+    result = train(chunk_rows=args.chunk_rows, strip_rows=args.strip_rows, edge_batch=args.edge_batch,
+                   iforest_sample=args.iforest_sample, work_dir=args.work_dir, write=not args.dry_run)
+    print(result)
+    for path in result.written:
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
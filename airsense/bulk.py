@@ -0,0 +1,158 @@
+"""Bulk pollution-index scoring for station exports.
+
+The input CSV is streamed through pyarrow's incremental reader in fixed-size
+blocks.  Each block is scored with one vectorized ``predict`` call, banded with
+``np.digitize`` and written out before the next block is read, so memory stays
+proportional to ``block_size`` rather than to the file.
+
+Uploads hold raw concentrations in µg/m³, but the index model was fitted on
+the processed table's standardized columns, so scoring needs the pipeline's
+``ReadingScaler`` (``--stats``, default ``AIRSENSE_PIPELINE_STATS``).  Rows
+missing a pollutant are not scored: their index and band are left empty.
+
+    python -m airsense.bulk stations.csv scored.csv --stats stats.json --block-mb 16
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from airsense.pollution_index import INDEX_FEATURES, INDEX_LABELS, classify
+
+# Short column names accepted in uploads
+COLUMN_ALIASES = {
+    "pm10": "pm10_concentration",
+    "pm25": "pm25_concentration",
+    "pm2.5": "pm25_concentration",
+    "no2": "no2_concentration",
+}
+
+DEFAULT_BLOCK_SIZE = 16 << 20
+
+
+class BulkStats:
+    def __init__(self, rows, seconds, incomplete=0):
+        self.rows = rows
+        self.seconds = seconds
+        self.incomplete = incomplete
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+    def __repr__(self):
+        return (f"BulkStats(rows={self.rows:,}, incomplete={self.incomplete:,}, seconds={self.seconds:.2f}, "
+                f"rows_per_sec={self.rows_per_sec:,.0f})")
+
+
+def _feature_positions(names):
+    canonical = [COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in names]
+    missing = [col for col in INDEX_FEATURES if col not in canonical]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+    return [canonical.index(col) for col in INDEX_FEATURES]
+
+
+def scored_schema(schema):
+    """``schema`` with the two columns ``score_batches`` appends."""
+    import pyarrow as pa
+
+    return schema.append(pa.field("predicted_pollution_index", pa.float32())).append(
+        pa.field("air_quality", pa.dictionary(pa.int8(), pa.string())))
+
+
+def score_batches(batches, model, scaler):
+    """Yield each record batch with ``predicted_pollution_index`` and ``air_quality`` appended.
+
+    Both are null for rows missing a pollutant.
+    """
+    import pyarrow as pa
+
+    positions = None
+    for batch in batches:
+        if positions is None:
+            positions = _feature_positions(batch.schema.names)
+        X = np.column_stack([
+            batch.column(i).to_numpy(zero_copy_only=False).astype(np.float64, copy=False) for i in positions
+        ])
+        incomplete = np.isnan(X).any(axis=1)
+        pred = scaler.predict_index(model, X).astype(np.float32)
+        labels = pa.DictionaryArray.from_arrays(
+            pa.array(classify(pred), type=pa.int8(), mask=incomplete), pa.array(INDEX_LABELS)
+        )
+        yield pa.RecordBatch.from_arrays(
+            batch.columns + [pa.array(pred, mask=incomplete), labels],
+            names=batch.schema.names + ["predicted_pollution_index", "air_quality"],
+        )
+
+
+def score_csv(src, dst, model=None, scaler=None, block_size=DEFAULT_BLOCK_SIZE, progress=None):
+    """Score the CSV ``src`` into ``dst`` (paths or binary file objects).
+
+    ``scaler`` defaults to the ``AIRSENSE_PIPELINE_STATS`` one; raises
+    ValueError when there is none.  ``progress`` is called with the running
+    row count after every block.  Returns a ``BulkStats``.
+    """
+    import pyarrow.csv as pacsv
+
+    if model is None:
+        from airsense.loaders import load_model
+
+        model = load_model("xgb")
+    if scaler is None:
+        from airsense.loaders import require_reading_scaler
+
+        scaler = require_reading_scaler()
+
+    if isinstance(src, (str, os.PathLike)):
+        # Arrow's native file reader prefetches the whole file; a Python file
+        # object is pulled one block at a time
+        with open(src, "rb") as fh:
+            return score_csv(fh, dst, model, scaler, block_size, progress)
+    if isinstance(dst, (str, os.PathLike)):
+        dst = os.fspath(dst)
+
+    rows = incomplete = 0
+    start = time.perf_counter()
+    reader = pacsv.open_csv(src, read_options=pacsv.ReadOptions(block_size=block_size, use_threads=False))
+    writer = None
+    try:
+        for batch in score_batches(reader, model, scaler):
+            if writer is None:
+                writer = pacsv.CSVWriter(dst, batch.schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            incomplete += batch.column(batch.num_columns - 1).null_count
+            if progress is not None:
+                progress(rows)
+        if writer is None:
+            # Header-only input: still check the columns and write the header row
+            _feature_positions(reader.schema.names)
+            writer = pacsv.CSVWriter(dst, scored_schema(reader.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return BulkStats(rows, time.perf_counter() - start, incomplete)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV of pm10/pm25/no2 readings")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--stats", help="pipeline --stats JSON (default: AIRSENSE_PIPELINE_STATS)")
+    parser.add_argument("--block-mb", type=int, default=DEFAULT_BLOCK_SIZE >> 20,
+                        help="input block size in MiB (bounds memory use)")
+    args = parser.parse_args(argv)
+
+    from airsense.loaders import require_reading_scaler
+
+    try:
+        scaler = require_reading_scaler(args.stats)
+    except ValueError as e:
+        parser.error(str(e))
+    print(score_csv(args.src, args.dst, scaler=scaler, block_size=args.block_mb << 20))
+
+
+if __name__ == "__main__":
+    main()
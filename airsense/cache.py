@@ -0,0 +1,123 @@
+"""Process-wide artifact cache.
+
+Streamlit re-executes ``app.py`` on every widget interaction, but imported
+modules live as long as the server process, so anything kept here is shared by
+every session and every rerun.  Each entry remembers the files it was built
+from.  A lookup costs one ``os.stat`` per source file; when the mtime or size
+changes the files are re-hashed and the entry is rebuilt only if the content
+actually differs.
+"""
+import hashlib
+import os
+import threading
+from collections import Counter
+
+from airsense import tracing
+
+_HASH_BLOCK = 1 << 20
+
+
+def file_signature(path):
+    """Cheap change detector: ``(mtime_ns, size)``."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _combine(hashes):
+    return hashlib.blake2b("|".join(hashes).encode(), digest_size=8).hexdigest()
+
+
+def sources_version(paths):
+    """Content digest over several files, used to name persisted derived tables."""
+    return _combine(content_hash(p) for p in paths)
+
+
+class _Entry:
+    __slots__ = ("value", "signatures", "hashes", "version")
+
+    def __init__(self, value, signatures, hashes):
+        self.value = value
+        self.signatures = signatures
+        self.hashes = hashes
+        self.version = _combine(hashes)
+
+
+class ArtifactCache:
+    """Thread-safe ``key -> value`` store invalidated by source-file changes."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.reloads = Counter()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key, sources, build):
+        """Return the cached value for ``key``, calling ``build()`` on a miss.
+
+        ``sources`` are the files the value is derived from.  Concurrent
+        callers asking for the same key wait for a single build.
+        """
+        sources = tuple(os.fspath(p) for p in sources)
+        with self._key_lock(key):
+            signatures = tuple(file_signature(p) for p in sources)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.signatures == signatures:
+                    self.hits[key] += 1
+                    return entry.value
+                # Touched but possibly unchanged (checkout, copy, rsync).
+                if tuple(content_hash(p) for p in sources) == entry.hashes:
+                    entry.signatures = signatures
+                    self.hits[key] += 1
+                    return entry.value
+                self.reloads[key] += 1
+
+            self.misses[key] += 1
+            with tracing.span(f"build.{key[0]}"):
+                value = build()
+            hashes = tuple(content_hash(p) for p in sources)
+            self._entries[key] = _Entry(value, signatures, hashes)
+            return value
+
+    def peek(self, key):
+        """Current value for ``key`` without validating its sources (None if not loaded)."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def version(self, key):
+        """Short content digest of the sources behind ``key`` (None if not loaded)."""
+        entry = self._entries.get(key)
+        return entry.version if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        keys = sorted(set(self.hits) | set(self.misses), key=str)
+        return {
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "reloads": sum(self.reloads.values()),
+            "entries": {
+                str(k): {"hits": self.hits[k], "misses": self.misses[k], "reloads": self.reloads[k]}
+                for k in keys
+            },
+        }
+
+
+CACHE = ArtifactCache()
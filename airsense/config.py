@@ -0,0 +1,48 @@
+"""Filesystem locations shared by the app and the offline tools.
+
+Paths default to the repository layout; ``AIRSENSE_DATA_DIR`` and
+``AIRSENSE_MODELS_DIR`` point the app at another copy (benchmarks, staging).
+"""
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(os.environ.get("AIRSENSE_DATA_DIR", ROOT / "data"))
+MODELS_DIR = Path(os.environ.get("AIRSENSE_MODELS_DIR", ROOT / "models"))
+
+RAW_XLSX = DATA_DIR / "raw" / "who_air_quality.xlsx"
+PROCESSED_CSV = DATA_DIR / "processed" / "processed_data.csv"
+ANOMALIES_CSV = DATA_DIR / "processed" / "processed_with_anomalies.csv"
+
+MODEL_FILES = {
+    "xgb": "xgb_pollution_index_model.pkl",
+    "kmeans": "city_pollution_model.pkl",
+    "severity_map": "severity_label_map.pkl",
+    "dbscan": "dbscan_pollution_anomaly.pkl",
+    "iforest": "isolation_forest_pollution.pkl",
+    "xgb_forecast": "xgb_pollution_forecast.pkl",
+    "lstm": "lstm_pollution_forecast.h5",
+}
+
+
+def model_path(name):
+    return MODELS_DIR / MODEL_FILES[name]
+
+# ``python -m airsense.pipeline --stats`` output: the scaling between raw
+# concentrations (µg/m³) and the processed columns the index model was fitted on
+PIPELINE_STATS = os.environ.get("AIRSENSE_PIPELINE_STATS")
+
+# Bulk upload on the Prediction page: Streamlit keeps both the upload and the
+# download in memory, so larger files go through ``python -m airsense.bulk``
+BULK_UPLOAD_MB = float(os.environ.get("AIRSENSE_BULK_UPLOAD_MB", 50))
+
+# Live ingestion (airsense.ingest): where the Live Monitor listens, and the
+# ``python -m airsense.pipeline --stats`` file that puts raw readings on the
+# processed scale.  The dashboard only starts the sources listed in
+# AIRSENSE_INGEST_SOURCES (comma-separated; default: the one source)
+INGEST_SOURCE = os.environ.get("AIRSENSE_INGEST_SOURCE", "tcp://127.0.0.1:8700")
+INGEST_SOURCES = [s.strip() for s in os.environ.get("AIRSENSE_INGEST_SOURCES", INGEST_SOURCE).split(",") if s.strip()]
+INGEST_STATS = os.environ.get("AIRSENSE_INGEST_STATS", os.environ.get("AIRSENSE_PIPELINE_STATS"))
+
+# Tables derived from the processed data and the models (severity, forecasts, ...)
+DERIVED_DIR = DATA_DIR / "derived"
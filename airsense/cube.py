@@ -0,0 +1,149 @@
+"""Materialized aggregates behind the Analytics page.
+
+``AnalyticsCube`` keeps, for each of city, country, year and WHO region, the
+sum and count of ``pollution_index``, the number of rows and the number of
+DBSCAN anomalies.  Means, top-N tables and totals are derived once per build
+or update, so every widget on the page reads a precomputed value.
+
+``update`` folds in new rows by aggregating only those rows and adding them to
+the stored sums and counts; ``refresh`` uses it automatically when a reloaded
+table is the previous one with rows appended.  The cube keeps the row hashes
+of the first and last ``CHECK_ROWS`` rows it has aggregated, and an append is
+only assumed when the reloaded table holds the same rows there.  The check
+hashes those rows and the new ones, never the whole table, so a refresh costs
+time proportional to what was appended.  Any other reload (fewer rows,
+reordered or rewritten rows at either end) means a rebuild.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ["city", "country_name", "year", "who_region"]
+CUBE_COLUMNS = DIMENSIONS + ["pollution_index"]
+CUBE_ANOMALY_COLUMNS = DIMENSIONS + ["is_anomaly_dbscan"]
+
+TOP_N = 10
+# Rows at each end of the aggregated prefix compared by ``refresh``
+CHECK_ROWS = 1024
+
+
+def _aggregate(rows, anomaly_rows):
+    """Partial aggregates of a slice of rows, one frame per dimension."""
+    parts = {}
+    for dim in DIMENSIONS:
+        frames = []
+        if rows is not None and dim in rows.columns and len(rows):
+            grouped = rows.groupby(dim, observed=True)["pollution_index"]
+            frames.append(pd.DataFrame({"sum": grouped.sum(), "count": grouped.count()}))
+        if anomaly_rows is not None and dim in anomaly_rows.columns and len(anomaly_rows):
+            grouped = anomaly_rows.groupby(dim, observed=True)["is_anomaly_dbscan"]
+            frames.append(pd.DataFrame({"records": grouped.size(), "anomalies": grouped.sum()}))
+        parts[dim] = pd.concat(frames, axis=1) if frames else pd.DataFrame()
+    return parts
+
+
+class AnalyticsCube:
+    def __init__(self, top_n=TOP_N):
+        self.top_n = top_n
+        self.groups = {dim: pd.DataFrame(columns=["sum", "count", "records", "anomalies"]) for dim in DIMENSIONS}
+        self.n_rows = 0
+        self.n_anomaly_rows = 0
+        self._fingerprints = (_fingerprint(None), _fingerprint(None))
+
+    @classmethod
+    def build(cls, df, anomaly_df=None, top_n=TOP_N):
+        cube = cls(top_n)
+        cube.update(df, anomaly_df)
+        return cube
+
+    def update(self, rows=None, anomaly_rows=None):
+        """Add newly arrived rows (processed and/or anomaly-flagged) to the aggregates."""
+        for dim, part in _aggregate(rows, anomaly_rows).items():
+            if part.empty:
+                continue
+            current = self.groups[dim]
+            self.groups[dim] = part if current.empty else current.add(part, fill_value=0)
+        if rows is not None:
+            self.n_rows += len(rows)
+        if anomaly_rows is not None:
+            self.n_anomaly_rows += len(anomaly_rows)
+        self._fingerprints = (_fingerprint(rows, self._fingerprints[0]),
+                              _fingerprint(anomaly_rows, self._fingerprints[1]))
+        self._materialize()
+        return self
+
+    def refresh(self, df, anomaly_df=None):
+        """Bring the cube in line with reloaded tables.
+
+        If both tables only grew and still start and end their old prefix
+        with the rows already aggregated, the new rows are treated as
+        appended and folded in; otherwise the cube is rebuilt from scratch.
+        The cube itself is left untouched (other sessions may be reading it);
+        a new one is returned.
+        """
+        appended = _extends(df, self.n_rows, self._fingerprints[0]) and (
+            anomaly_df is None or _extends(anomaly_df, self.n_anomaly_rows, self._fingerprints[1])
+        )
+        if not appended:
+            return AnalyticsCube.build(df, anomaly_df, self.top_n)
+        cube = copy.copy(self)
+        cube.groups = dict(self.groups)
+        return cube.update(
+            df.iloc[self.n_rows:],
+            anomaly_df.iloc[self.n_anomaly_rows:] if anomaly_df is not None else None,
+        )
+
+    def _materialize(self):
+        self.means = {}
+        self.top_means = {}
+        self.top_anomalies = {}
+        for dim, table in self.groups.items():
+            if table.empty:
+                self.means[dim] = pd.Series(dtype=float)
+                self.top_means[dim] = self.means[dim]
+                self.top_anomalies[dim] = pd.Series(dtype=int)
+                continue
+            if "count" in table:
+                means = (table["sum"] / table["count"]).dropna()
+                self.means[dim] = means.sort_index()
+                self.top_means[dim] = means.nlargest(self.top_n)
+            if "anomalies" in table:
+                counts = table["anomalies"].fillna(0).astype(int)
+                self.top_anomalies[dim] = counts[counts > 0].nlargest(self.top_n)
+
+        city = self.groups["city"]
+        total_count = city["count"].sum() if "count" in city else 0
+        self.mean_index = city["sum"].sum() / total_count if total_count else float("nan")
+        self.anomaly_count = int(city["anomalies"].sum()) if "anomalies" in city else 0
+        self.normal_count = self.n_anomaly_rows - self.anomaly_count
+        self.anomaly_rate = 100 * self.anomaly_count / self.n_anomaly_rows if self.n_anomaly_rows else 0.0
+        self.n_unique = {dim: len(table) for dim, table in self.groups.items()}
+
+
+def _row_hashes(rows):
+    if rows is None or not len(rows):
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy()
+
+
+def _fingerprint(rows, base=None):
+    """Hashes of the first and last ``CHECK_ROWS`` rows of ``base``'s rows followed by ``rows``."""
+    head, tail = base if base is not None else (_row_hashes(None), _row_hashes(None))
+    if rows is not None and len(rows):
+        # Only the rows that can end up in head or tail are hashed
+        needed = CHECK_ROWS - len(head)
+        if needed > 0:
+            head = np.concatenate([head, _row_hashes(rows.iloc[:needed])])
+        tail = np.concatenate([tail, _row_hashes(rows.iloc[-CHECK_ROWS:])])[-CHECK_ROWS:]
+    return head, tail
+
+
+def _extends(df, n_rows, fingerprint):
+    """Whether ``df`` grew from ``n_rows`` rows that start and end with the fingerprinted ones."""
+    head, tail = fingerprint
+    return (
+        len(df) >= n_rows
+        and np.array_equal(_row_hashes(df.iloc[:len(head)]), head)
+        and np.array_equal(_row_hashes(df.iloc[n_rows - len(tail):n_rows]), tail)
+    )
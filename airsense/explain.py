@@ -0,0 +1,257 @@
+"""Precomputed feature attributions for the XGBoost models.
+
+``attributions(model, X)`` returns XGBoost's ``pred_contribs`` (TreeSHAP)
+values: one column per model feature plus the bias, which add up to the
+model's output for each row.  ``pred_contribs`` costs about 1 ms per row and
+core for a 300-tree model, so the attributions are computed for the whole
+processed table in one batch and stored, and the pages only look them up.
+
+* The forecast model (15 features) goes through ``pred_contribs`` in chunks
+  of ``chunk_rows``, which XGBoost's own threads spread over every core.
+* For models over at most ``TABLE_FEATURES`` features, such as the index
+  model, the same values are computed exactly from tables.  TreeSHAP gives
+  the Shapley values of ``v(S)``, the tree's output with the features outside
+  ``S`` averaged out by node cover.  Each leaf contributes its value times
+  the cover ratios of the splits on features outside ``S``, for every row
+  inside its box on ``S``.  Feature values are replaced by their interval
+  between the model's split thresholds, so ``v`` of one or two features is a
+  vector or a matrix over intervals, summed over all leaves once.  ``v`` of
+  every feature is the prediction itself.  A row then costs a few table
+  lookups.
+
+``AttributionStore`` keeps a store's float32 values sorted by (city, year),
+with per-city offsets as in ``CitySeries``, so a city's years are one slice
+and a city-year is one binary search.
+
+    python -m airsense.explain      # build (or load) both stores
+"""
+import json
+from itertools import combinations
+from math import factorial
+
+import numpy as np
+import pandas as pd
+
+from airsense.pollution_index import model_features
+
+TABLE_FEATURES = 3
+CHUNK_ROWS = 16_384
+BIAS = "bias"
+
+
+def booster_of(model):
+    """The ``xgboost.Booster`` behind a fitted model, or None for other models."""
+    booster = getattr(model, "booster", None)
+    if booster is None and hasattr(model, "get_booster"):
+        booster = model.get_booster()
+    return booster
+
+
+def _trees(booster):
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    return learner["gradient_booster"]["model"]["trees"], base_score
+
+
+class _IntervalTables:
+    """``v(S)`` tables over split intervals for every ``S`` short of all features."""
+
+    def __init__(self, booster, n_features):
+        trees, self.base_score = _trees(booster)
+        self.n_features = n_features
+        inner = [np.asarray(t["left_children"]) != -1 for t in trees]
+        self.thresholds = [
+            np.unique(np.concatenate([
+                np.asarray(t["split_conditions"], dtype=np.float32)[mask & (np.asarray(t["split_indices"]) == f)]
+                for t, mask in zip(trees, inner)
+            ]))
+            for f in range(n_features)
+        ]
+        # Bins 0..len(thresholds) are intervals; the last one is a missing value
+        self.n_bins = [len(t) + 2 for t in self.thresholds]
+        values, ratios, masks = self._leaves(trees)
+
+        self.tables = {}
+        features = range(n_features)
+        for size in range(n_features):
+            for subset in combinations(features, size):
+                outside = [f for f in features if f not in subset]
+                weight = values * np.prod(ratios[:, outside], axis=1)
+                if size == 0:
+                    table = weight.sum()
+                elif size == 1:
+                    table = weight @ masks[subset[0]]
+                else:
+                    table = (masks[subset[0]] * weight[:, None]).T @ masks[subset[1]]
+                self.tables[subset] = table + self.base_score
+
+    def _leaves(self, trees):
+        """Value, per-feature cover ratio and per-feature bin mask of every leaf."""
+        values, ratios, masks = [], [], [[] for _ in range(self.n_features)]
+        for tree in trees:
+            left, right = tree["left_children"], tree["right_children"]
+            feature, condition = tree["split_indices"], tree["split_conditions"]
+            default_left, cover = tree["default_left"], tree["sum_hessian"]
+            start = (np.ones(self.n_features), [np.ones(n, dtype=bool) for n in self.n_bins])
+            stack = [(0, *start)]
+            while stack:
+                node, ratio, mask = stack.pop()
+                if left[node] == -1:
+                    values.append(condition[node])
+                    ratios.append(ratio)
+                    for f in range(self.n_features):
+                        masks[f].append(mask[f])
+                    continue
+                f = feature[node]
+                # x < thresholds[k] goes left: bins 0..k hold the values below it
+                k = np.searchsorted(self.thresholds[f], np.float32(condition[node]))
+                goes_left = np.arange(self.n_bins[f]) <= k
+                goes_left[-1] = bool(default_left[node])
+                for child, side in ((left[node], goes_left), (right[node], ~goes_left)):
+                    child_ratio = ratio.copy()
+                    child_ratio[f] *= cover[child] / cover[node] if cover[node] else 0.0
+                    child_mask = list(mask)
+                    child_mask[f] = mask[f] & side
+                    stack.append((child, child_ratio, child_mask))
+        return (np.asarray(values), np.asarray(ratios),
+                [np.asarray(m, dtype=np.float64) for m in masks])
+
+    def bins(self, X):
+        """Interval of every value of ``X``; missing values get the last bin."""
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(X.shape, dtype=np.int64)
+        for f in range(self.n_features):
+            out[:, f] = np.searchsorted(self.thresholds[f], X[:, f], side="right")
+            out[np.isnan(X[:, f]), f] = self.n_bins[f] - 1
+        return out
+
+    def value(self, subset, bins):
+        table = self.tables[subset]
+        if not subset:
+            return np.full(len(bins), table)
+        return table[tuple(bins[:, f] for f in subset)]
+
+    def shap(self, X, margin):
+        """``pred_contribs``-shaped values for ``X``, given the model's raw ``margin`` for each row."""
+        bins = self.bins(X)
+        n = self.n_features
+        full = tuple(range(n))
+        v = {subset: self.value(subset, bins) for subset in self.tables}
+        v[full] = np.asarray(margin, dtype=np.float64)
+        out = np.zeros((len(X), n + 1))
+        for f in range(n):
+            others = [g for g in range(n) if g != f]
+            for size in range(n):
+                weight = factorial(size) * factorial(n - size - 1) / factorial(n)
+                for subset in combinations(others, size):
+                    with_f = tuple(sorted(subset + (f,)))
+                    out[:, f] += weight * (v[with_f] - v[subset])
+        out[:, n] = v[()]
+        return out.astype(np.float32)
+
+
+def attributions(model, X, chunk_rows=CHUNK_ROWS):
+    """float32 ``(rows, features + 1)`` SHAP values of ``model`` on ``X``; the last column is the bias."""
+    import xgboost as xgb
+
+    booster = booster_of(model)
+    X = np.asarray(X, dtype=np.float32)
+    if booster.num_features() <= TABLE_FEATURES:
+        tables = _IntervalTables(booster, booster.num_features())
+        return tables.shap(X, booster.inplace_predict(X, predict_type="margin"))
+    out = np.empty((len(X), X.shape[1] + 1), dtype=np.float32)
+    for start in range(0, len(X), chunk_rows):
+        chunk = X[start:start + chunk_rows]
+        out[start:start + len(chunk)] = booster.predict(xgb.DMatrix(chunk, feature_names=booster.feature_names), pred_contribs=True)
+    return out
+
+
+def _table(keys, features, values):
+    table = keys[["city", "year"]].reset_index(drop=True)
+    for i, name in enumerate(features + [BIAS]):
+        table[name] = values[:, i]
+    return table
+
+
+def build_index_attributions(df, model):
+    """``city, year``, one column per ``INDEX_FEATURES`` column and ``bias``, per processed row."""
+    features = model_features(model)
+    df = df.dropna(subset=["city", "year"])
+    return _table(df, features, attributions(model, df[features].to_numpy(np.float32)))
+
+
+def build_forecast_attributions(df, model):
+    """Same, over ``FORECAST_FEATURES``, for every fitted and forecast row of the forecast table."""
+    from airsense.forecast import FORECAST_FEATURES, forecast_inputs
+
+    keys, X = forecast_inputs(df, model)
+    return _table(keys, FORECAST_FEATURES, attributions(model, X))
+
+
+class AttributionStore:
+    """float32 attributions by city and year."""
+
+    def __init__(self, columns, cities, offsets, years, values):
+        self.columns = columns
+        self.features = [c for c in columns if c != BIAS]
+        self.cities = cities
+        self.offsets = offsets
+        self.years = years
+        self.values = values
+        self._position = {city: i for i, city in enumerate(cities)}
+        for array in (offsets, years, values):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, table):
+        """Index a ``build_*_attributions`` table; rows without a city or year are left out."""
+        columns = [c for c in table.columns if c not in ("city", "year")]
+        table = table.dropna(subset=["city", "year"])
+        city = pd.Categorical(table["city"])
+        names = np.asarray(city.categories, dtype=object)
+        codes = np.asarray(city.codes, dtype=np.int64)
+        years = table["year"].to_numpy(dtype=np.int64)
+        order = np.lexsort((years, codes))
+        counts = np.bincount(codes, minlength=len(names))
+        present = counts > 0
+        offsets = np.concatenate([[0], np.cumsum(counts[present])]).astype(np.int64)
+        values = np.ascontiguousarray(table[columns].to_numpy(dtype=np.float32)[order])
+        return cls(columns, list(names[present]), offsets, np.ascontiguousarray(years[order]), values)
+
+    def __len__(self):
+        return len(self.years)
+
+    def __contains__(self, city):
+        return city in self._position
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.years.nbytes + self.offsets.nbytes
+
+    def city(self, city):
+        """``(years, values)`` of ``city`` in year order; empty arrays for an unknown city."""
+        i = self._position.get(city)
+        if i is None:
+            return self.years[:0], self.values[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.years[start:end], self.values[start:end]
+
+    def get(self, city, year):
+        """``{column: value}`` for one city-year (the first, if repeated), or None."""
+        years, values = self.city(city)
+        i = np.searchsorted(years, int(year))
+        if i == len(years) or years[i] != int(year):
+            return None
+        return dict(zip(self.columns, values[i].tolist()))
+
+
+if __name__ == "__main__":
+    import time
+
+    from airsense.loaders import load_forecast_attributions, load_index_attributions
+
+    for name, load in (("index", load_index_attributions), ("forecast", load_forecast_attributions)):
+        start = time.perf_counter()
+        store = load()
+        print(f"{name}: {len(store):,} city-years, {len(store.cities):,} cities, "
+              f"{store.nbytes / 2**20:.1f} MB, {time.perf_counter() - start:.1f}s")
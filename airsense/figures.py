@@ -0,0 +1,123 @@
+"""Process-wide cache of built plotly figures.
+
+Building a ``go.Figure`` validates every property it is given, which costs
+several milliseconds per chart and used to happen for every chart on every
+rerun.  ``FigureCache.get(key, sources, build)`` returns the figure built for
+``key`` as long as the ``sources`` files are unchanged (same ``os.stat``
+check as ``ArtifactCache``).  ``key`` names the chart and its parameters, such
+as the selected city.
+
+Entries are sized by their serialized JSON, and the least recently used ones
+are evicted beyond ``AIRSENSE_FIGURE_CACHE_MB`` (default 32).  The cache keeps
+the ``Figure`` rather than its JSON: ``st.plotly_chart`` serializes a
+``Figure`` directly, but rebuilds and re-validates one from a dict or JSON.
+Cached figures are shared by every session, so do not modify them; copy with
+``go.Figure(fig)`` first.
+
+``downsample`` thins long series to per-bucket minima and maxima before they
+are plotted, so peaks survive and the figure stays small.
+"""
+import os
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+MAX_POINTS = 2_000
+FIGURE_CACHE_BYTES = int(float(os.environ.get("AIRSENSE_FIGURE_CACHE_MB", 32)) * 2**20)
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    """At most about ``max_points`` of ``(x, y)``: each bucket's first, min, max and last points, in order."""
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    n_buckets = max(1, max_points // 4)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:] - 1
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # Sorted by (bucket, value), a bucket's minimum lands on its first slot and
+    # its maximum on its last; NaNs are pushed away from both
+    values = y.astype(np.float64)
+    low = np.lexsort((np.where(np.isnan(values), np.inf, values), bucket))[starts]
+    high = np.lexsort((np.where(np.isnan(values), -np.inf, values), bucket))[ends]
+    keep = np.unique(np.concatenate([starts, ends, low, high]))
+    return x[keep], y[keep]
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _Entry:
+    __slots__ = ("figure", "signatures", "nbytes")
+
+    def __init__(self, figure, signatures, nbytes):
+        self.figure = figure
+        self.signatures = signatures
+        self.nbytes = nbytes
+
+
+class FigureCache:
+    """Thread-safe LRU of figures, bounded by their total serialized size."""
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+
+    def get(self, key, sources, build):
+        """Cached figure for ``key``; ``build()`` runs when it is missing or ``sources`` changed."""
+        signatures = tuple(_signature(os.fspath(p)) for p in sources)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signatures == signatures:
+                self._entries.move_to_end(key)
+                self.hits[key[0]] += 1
+                return entry.figure
+
+        # Built outside the lock; two sessions racing on one key both build it
+        figure = build()
+        nbytes = self.sizeof(figure)
+        with self._lock:
+            self.misses[key[0]] += 1
+            self._remove(key)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = _Entry(figure, signatures, nbytes)
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return figure
+
+    def sizeof(self, figure):
+        return len(figure.to_json(validate=False))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self.nbytes, "evictions": self.evictions,
+                "hits": sum(self.hits.values()), "misses": sum(self.misses.values()),
+            }
+
+
+FIGURES = FigureCache()
@@ -0,0 +1,97 @@
+"""Batch multi-year forecasts with the lag-feature XGBoost model.
+
+``xgb_pollution_forecast.pkl`` (``notebooks/timeseries_pollu_pred_model.ipynb``)
+predicts a city's pollution index from the previous three years of index and
+concentrations plus population and location.  ``build_forecast_table`` builds
+those lags for every city at once with a grouped shift and scores:
+
+* every historical city-year that has three prior years (``kind="fitted"``);
+* ``horizon`` future years for every city, one batched ``predict`` per step.
+  Each step feeds the predicted index back in as the newest lag; the
+  concentrations have no model of their own and are carried forward from the
+  last observed year.
+"""
+import numpy as np
+import pandas as pd
+
+LAG_SOURCES = ["pollution_index", "pm10_concentration", "pm25_concentration", "no2_concentration"]
+N_LAGS = 3
+STATIC_FEATURES = ["population", "latitude", "longitude"]
+LAG_FEATURES = [f"{f}_lag{lag}" for f in LAG_SOURCES for lag in range(1, N_LAGS + 1)]
+FORECAST_FEATURES = LAG_FEATURES + STATIC_FEATURES
+FORECAST_INPUT_COLUMNS = ["city", "year"] + LAG_SOURCES + STATIC_FEATURES
+
+DEFAULT_HORIZON = 3
+
+
+def add_lag_features(df):
+    """Sort by (city, year) and add ``<source>_lag<k>`` columns for every city at once."""
+    df = df.sort_values(["city", "year"], kind="stable").reset_index(drop=True)
+    grouped = df.groupby("city", sort=False, observed=True)[LAG_SOURCES]
+    shifted = {lag: grouped.shift(lag) for lag in range(1, N_LAGS + 1)}
+    lags = pd.DataFrame({
+        f"{source}_lag{lag}": shifted[lag][source]
+        for source in LAG_SOURCES
+        for lag in range(1, N_LAGS + 1)
+    })
+    return pd.concat([df, lags], axis=1)
+
+
+def _history(df):
+    """Last ``N_LAGS`` observations of each city as a (cities, lags, sources) array."""
+    tail = df.groupby("city", sort=False, observed=True).tail(N_LAGS)
+    counts = tail.groupby("city", sort=False, observed=True).size()
+    tail = tail[tail["city"].isin(counts.index[counts == N_LAGS])]
+    last = tail.groupby("city", sort=False, observed=True).tail(1)
+    history = tail[LAG_SOURCES].to_numpy(dtype=np.float32).reshape(-1, N_LAGS, len(LAG_SOURCES))
+    return last, history
+
+
+def _lag_matrix(history, static):
+    # history[:, -k] is the value k years back; column order matches FORECAST_FEATURES
+    lagged = [history[:, -lag, s] for s in range(len(LAG_SOURCES)) for lag in range(1, N_LAGS + 1)]
+    return np.column_stack(lagged + [static])
+
+
+def forecast_inputs(df, model, horizon=DEFAULT_HORIZON):
+    """``(keys, X)``: ``city, year, kind`` and the ``FORECAST_FEATURES`` row of every fitted and future year.
+
+    Future rows lag on earlier predictions, so ``model`` is run once per step.
+    """
+    df = add_lag_features(df[FORECAST_INPUT_COLUMNS].dropna(subset=["city", "year"]))
+
+    complete = df[LAG_FEATURES].notna().all(axis=1)
+    keys = [df.loc[complete, ["city", "year"]].assign(kind="fitted")]
+    inputs = [df.loc[complete, FORECAST_FEATURES].to_numpy(np.float32)]
+
+    last, history = _history(df)
+    static = last[STATIC_FEATURES].to_numpy(dtype=np.float32)
+    base_year = last["year"].to_numpy(dtype=np.int64)
+    for step in range(1, horizon + 1):
+        X = _lag_matrix(history, static)
+        pred = model.predict(X).astype(np.float32)
+        keys.append(pd.DataFrame({"city": last["city"].to_numpy(), "year": base_year + step, "kind": "forecast"}))
+        inputs.append(X)
+        newest = history[:, -1].copy()
+        newest[:, 0] = pred
+        history = np.concatenate([history[:, 1:], newest[:, None]], axis=1)
+
+    keys = pd.concat(keys, ignore_index=True)
+    keys["year"] = keys["year"].astype(np.int64)
+    return keys, np.concatenate(inputs).astype(np.float32, copy=False)
+
+
+def build_forecast_table(df, model, horizon=DEFAULT_HORIZON):
+    """``city, year, predicted_pollution_index, kind`` for fitted and future years."""
+    keys, X = forecast_inputs(df, model, horizon)
+    table = keys[["city", "year"]].assign(
+        predicted_pollution_index=np.asarray(model.predict(X), dtype=np.float32), kind=keys["kind"])
+    return table.sort_values(["city", "year"], kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    from airsense.loaders import load_forecast_table
+
+    table = load_forecast_table()
+    print(f"{table.index.nunique():,} cities, {len(table):,} rows")
+    print(table.groupby("kind").size().to_string())
@@ -0,0 +1,162 @@
+"""Spatial index over the stations of the anomaly table.
+
+A station is one distinct (latitude, longitude) of the table; its readings
+are every city-year recorded there, and it is a hotspot when at least one of
+them is an ``is_anomaly_dbscan`` hit.  ``StationIndex`` keeps the stations,
+their readings grouped by station (offsets into a row order, as in
+``CitySeries``), and two KD-trees: one over every station and one over the
+hotspots.
+
+Stations are stored as points on the unit sphere.  The straight-line (chord)
+distance between two such points grows with their great-circle distance, so
+a radius in km becomes a chord length and the KD-trees answer haversine
+radius and nearest-neighbour queries exactly, without scanning the table.
+Every query takes arrays of points and is answered in one tree call.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def unit_vectors(lat, lon):
+    """``(n, 3)`` points on the unit sphere for latitudes and longitudes in degrees."""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1).reshape(-1, 3)
+
+
+def chord_of(km):
+    """Chord length on the unit sphere of a great-circle distance in km."""
+    return 2.0 * np.sin(np.minimum(np.asarray(km, dtype=np.float64), np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+def km_of(chord):
+    """Great-circle distance in km of a chord length on the unit sphere."""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2.0, 0.0, 1.0))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, element-wise."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class StationIndex:
+    """Stations of the anomaly table with radius and nearest-hotspot queries."""
+
+    def __init__(self, lat, lon, city, country, offsets, rows, readings, anomalies):
+        from scipy.spatial import cKDTree
+
+        self.lat = lat
+        self.lon = lon
+        self.city = city
+        self.country = country
+        self.offsets = offsets
+        self.rows = rows
+        self.readings = readings
+        self.anomalies = anomalies
+        self.hotspots = np.flatnonzero(anomalies > 0)
+        points = unit_vectors(lat, lon)
+        self.tree = cKDTree(points)
+        self.hotspot_tree = cKDTree(points[self.hotspots])
+        self._by_city = {}
+        for i, name in enumerate(city):
+            self._by_city.setdefault(name, []).append(i)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Index a frame with ``latitude``, ``longitude``, ``city``, ``country_name`` and ``is_anomaly_dbscan``.
+
+        ``rows`` holds positions into ``df``; rows without a position are left out.
+        """
+        lat = df["latitude"].to_numpy(dtype=np.float64)
+        lon = df["longitude"].to_numpy(dtype=np.float64)
+        located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        positions, station = np.unique(np.stack([lat[located], lon[located]], axis=1), axis=0, return_inverse=True)
+        station = station.ravel()
+        order = np.argsort(station, kind="stable")
+        rows = located[order]
+        counts = np.bincount(station, minlength=len(positions))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        anomaly = df["is_anomaly_dbscan"].to_numpy(dtype=bool, na_value=False)[located]
+        anomalies = np.bincount(station, weights=anomaly, minlength=len(positions)).astype(np.int64)
+        first = rows[offsets[:-1]]
+        return cls(
+            positions[:, 0], positions[:, 1],
+            df["city"].to_numpy(dtype=object)[first], df["country_name"].to_numpy(dtype=object)[first],
+            offsets, rows, counts, anomalies,
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def cities(self):
+        return sorted(self._by_city)
+
+    @property
+    def nbytes(self):
+        arrays = (self.lat, self.lon, self.offsets, self.rows, self.readings, self.anomalies, self.hotspots)
+        # The trees keep their own copy of the points plus about as much again in nodes
+        return sum(a.nbytes for a in arrays) + 2 * 2 * 3 * 8 * (len(self) + len(self.hotspots))
+
+    def stations_of(self, city):
+        """Station ids recorded for ``city`` (empty for an unknown city)."""
+        return np.asarray(self._by_city.get(city, []), dtype=np.int64)
+
+    def within(self, lat, lon, radius_km, hotspots_only=False):
+        """Stations within ``radius_km`` of each point.
+
+        Returns one ``(ids, km)`` pair per point, nearest first.
+        """
+        tree, ids = (self.hotspot_tree, self.hotspots) if hotspots_only else (self.tree, None)
+        points = unit_vectors(lat, lon)
+        found = tree.query_ball_point(points, chord_of(radius_km) * (1 + 1e-12))
+        out = []
+        for point, hits in zip(points, found):
+            hits = np.asarray(hits, dtype=np.int64)
+            km = km_of(np.linalg.norm(tree.data[hits] - point, axis=1))
+            order = np.argsort(km, kind="stable")
+            out.append(((ids[hits] if ids is not None else hits)[order], km[order]))
+        return out
+
+    def count_within(self, lat, lon, radius_km, hotspots_only=False):
+        """Number of stations (or hotspots) within ``radius_km`` of each point."""
+        tree = self.hotspot_tree if hotspots_only else self.tree
+        return np.asarray(tree.query_ball_point(unit_vectors(lat, lon), chord_of(radius_km) * (1 + 1e-12),
+                                                return_length=True), dtype=np.int64)
+
+    def nearest_hotspots(self, lat, lon, k=5, exclude=None):
+        """``(ids, km)`` of the ``k`` nearest hotspots of each point, both ``(points, k)``.
+
+        Missing neighbours (fewer than ``k`` hotspots) get id -1 and distance
+        inf.  ``exclude`` is one station id per point left out of its own
+        result, e.g. the hotspot a query starts from.
+        """
+        points = unit_vectors(lat, lon)
+        ids = np.full((len(points), k), -1, dtype=np.int64)
+        km = np.full((len(points), k), np.inf)
+        n = min(k + (exclude is not None), len(self.hotspots))
+        if n == 0:
+            return ids, km
+        chord, hits = self.hotspot_tree.query(points, k=n)
+        chord, hits = chord.reshape(len(points), n), self.hotspots[hits.reshape(len(points), n)]
+        if exclude is not None:
+            # Move each point's excluded station to the end of its row
+            order = np.argsort(hits == np.asarray(exclude, dtype=np.int64).reshape(-1, 1), axis=1, kind="stable")
+            hits, chord = np.take_along_axis(hits, order, 1), np.take_along_axis(chord, order, 1)
+        n = min(n, k)
+        ids[:, :n] = hits[:, :n]
+        km[:, :n] = km_of(chord[:, :n])
+        if exclude is not None:
+            # Fewer than k + 1 hotspots: the last kept slot may still be the excluded one
+            dropped = ids == np.asarray(exclude, dtype=np.int64).reshape(-1, 1)
+            ids[dropped], km[dropped] = -1, np.inf
+        return ids, km
+
+    def station_rows(self, ids):
+        """Positions in the indexed frame of every reading at the given stations."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return self.rows[:0]
+        return np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in ids])
@@ -0,0 +1,671 @@
+"""Streaming ingestion of live station readings.
+
+Readings are newline-delimited JSON objects, one per reading::
+
+    {"city": "Delhi", "ts": 1760000000.0, "pm10_concentration": 80.0, "pm25_concentration": 45.0,
+     "no2_concentration": 30.0, "latitude": 28.61, "longitude": 77.21}
+
+``ts`` (epoch seconds) is optional and defaults to the arrival time.  They are
+read from a TCP socket (``tcp://host:port``), a unix socket (``unix:///path``)
+or a file that is tailed as it grows (``file:///path`` or a plain path).
+
+``Ingestor`` runs one asyncio event loop.  Readers split incoming bytes into
+lines and put them on a bounded queue a block at a time, and a single scorer
+takes blocks off it until ``max_batch`` readings are waiting or the oldest has
+waited ``max_wait_ms``.  When scoring falls behind, the queue fills, readers
+stop reading and the kernel's socket buffers push back on the senders (a
+tailed file is simply read later).  Memory stays bounded by ``queue_blocks``
+blocks of at most ``READ_BYTES``, plus a ``SOCKET_BUFFER_BYTES`` receive
+buffer per connection.
+
+Every micro-batch goes through the XGBoost index model and both anomaly
+scorers.  Those were fitted on the processed table, so an ``Ingestor`` needs
+the ``--stats`` JSON of ``python -m airsense.pipeline``: ``ReadingScaler``
+standardizes the raw concentrations and derives ``pollution_index`` the way
+the pipeline does, and maps the index model's standardized output back to
+index units, where the air-quality bands apply.
+
+Scores go into per-city windows bounded by ``window`` readings and
+``horizon_s`` seconds, for at most ``max_cities`` cities (the least recently
+updated is dropped first).  After each batch the touched cities' rolling
+aggregates are published, and ``snapshot()`` copies them from any thread
+without reading a file.  ``start_background`` runs one ingestor per source on
+a daemon thread, which is how the dashboard's Live Monitor polls it.
+
+    python -m airsense.ingest listen tcp://127.0.0.1:8700 --stats stats.json
+    python -m airsense.ingest replay tcp://127.0.0.1:8700 --rate 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from operator import itemgetter
+from urllib.parse import urlparse
+
+import numpy as np
+
+from airsense.anomaly import ANOMALY_FEATURES
+from airsense.pollution_index import INDEX_FEATURES, INDEX_LABELS, classify, predict_index
+from airsense.service import LatencyStats
+
+READING_FIELDS = INDEX_FEATURES + ["latitude", "longitude"]
+
+READ_BYTES = 64 * 1024
+# Fixed receive buffer: with autotuning the kernel would queue up to
+# net.ipv4.tcp_rmem[2] bytes (often 32 MiB) before a sender saw backpressure
+SOCKET_BUFFER_BYTES = 256 * 1024
+MAX_LINE_BYTES = 4096
+RATE_WINDOW_S = 10.0
+TAIL_POLL_S = 0.2
+
+
+def parse_source(source):
+    """``(kind, address)`` for a ``tcp://``, ``unix://`` or ``file://`` source, or a plain path."""
+    parsed = urlparse(source)
+    if parsed.scheme == "tcp":
+        if not parsed.hostname or parsed.port is None:
+            raise ValueError(f"expected tcp://host:port, got {source!r}")
+        return "tcp", (parsed.hostname, parsed.port)
+    if parsed.scheme in ("unix", "file"):
+        return parsed.scheme, parsed.netloc + parsed.path
+    if parsed.scheme:
+        raise ValueError(f"unsupported source {source!r}")
+    return "file", source
+
+
+class ReadingScaler:
+    """Maps raw readings onto the processed table's scale, from ``FittedStats.to_dict()``.
+
+    The index model was fitted on standardized concentrations and a
+    standardized ``pollution_index``; ``concentrations`` and ``index`` convert
+    its inputs and output.
+    """
+
+    def __init__(self, pca_mean, pca_axis, scale_mean, scale_std):
+        self.pca_mean = np.asarray(pca_mean, dtype=np.float64)
+        self.pca_axis = np.asarray(pca_axis, dtype=np.float64)
+        self.mean = np.array([scale_mean[c] for c in INDEX_FEATURES + ["pollution_index"]])
+        self.std = np.array([scale_std[c] for c in INDEX_FEATURES + ["pollution_index"]])
+
+    @classmethod
+    def from_stats(cls, stats):
+        if stats.get("pca_axis") is None:
+            raise ValueError("the fitted statistics have no pollution_index axis")
+        return cls(stats["pca_mean"], stats["pca_axis"], stats["scale_mean"], stats["scale_std"])
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as fh:
+            return cls.from_stats(json.load(fh))
+
+    def concentrations(self, X):
+        """Standardized ``INDEX_FEATURES`` columns for raw concentrations in µg/m³."""
+        return (np.asarray(X, dtype=np.float64) - self.mean[:3]) / self.std[:3]
+
+    def concentration(self, name, values):
+        """Standardized values of one ``INDEX_FEATURES`` column."""
+        i = INDEX_FEATURES.index(name)
+        return (np.asarray(values, dtype=np.float64) - self.mean[i]) / self.std[i]
+
+    def index(self, z):
+        """``pollution_index`` in index units for standardized model output."""
+        return np.asarray(z, dtype=np.float64) * self.std[3] + self.mean[3]
+
+    def predict_index(self, model, X):
+        """Index of the index model, in index units, for raw ``INDEX_FEATURES`` rows in µg/m³."""
+        return self.index(predict_index(model, self.concentrations(X)))
+
+    def transform(self, X):
+        """``ANOMALY_FEATURES`` matrix for rows of ``READING_FIELDS``."""
+        out = np.empty((len(X), len(ANOMALY_FEATURES)))
+        out[:, :3] = X[:, :3]
+        out[:, 3] = (X[:, :3] - self.pca_mean) @ self.pca_axis
+        out[:, :4] -= self.mean
+        out[:, :4] /= self.std
+        out[:, 4:] = X[:, 3:5]
+        return out
+
+
+def _records(records, fields):
+    """``(cities, ts, X)`` from decoded readings; the fast path assumes every one is valid."""
+    getter = itemgetter("city", *fields)
+    try:
+        rows = [getter(record) for record in records]
+        ts = np.array([record.get("ts", np.nan) for record in records], dtype=np.float64)
+        X = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(fields))
+        cities = [row[0] for row in rows]
+        if all(isinstance(city, str) for city in cities):
+            return cities, ts, X
+    except (KeyError, TypeError, ValueError, AttributeError):
+        pass
+    cities, ts, rows = [], [], []
+    for record in records:
+        try:
+            row = [float(record[name]) for name in fields]
+            t = float(record.get("ts", np.nan))
+            city = record["city"]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        if isinstance(city, str):
+            cities.append(city)
+            ts.append(t)
+            rows.append(row)
+    return cities, np.array(ts, dtype=np.float64), np.array(rows, dtype=np.float64).reshape(len(rows), len(fields))
+
+
+def _parse(lines, fields):
+    """``(cities, ts, X, rejected)`` for raw NDJSON lines; bad ones are counted, not raised."""
+    try:
+        # One decode for the whole batch; a bad line sends it down the slow path
+        records = json.loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+    cities, ts, X = _records(records, fields)
+    finite = np.isfinite(X).all(axis=1)
+    if not finite.all():
+        cities = [c for c, ok in zip(cities, finite) if ok]
+        X, ts = X[finite], ts[finite]
+    return cities, ts, X, len(lines) - len(cities)
+
+
+class _Window:
+    __slots__ = ("entries", "index_sum", "dbscan", "iso", "total", "newest")
+
+    def __init__(self):
+        self.entries = deque()
+        self.index_sum = 0.0
+        self.dbscan = 0
+        self.iso = 0
+        self.total = 0
+        self.newest = -np.inf
+
+    def pop(self):
+        _, index, dbscan, iso = self.entries.popleft()
+        self.index_sum -= index
+        self.dbscan -= dbscan
+        self.iso -= iso
+
+
+class CityWindows:
+    """Bounded rolling windows of scored readings, with running sums per city."""
+
+    def __init__(self, size=120, horizon_s=None, max_cities=10_000):
+        self.size = size
+        self.horizon_s = horizon_s
+        self.max_cities = max_cities
+        self._windows = OrderedDict()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def update(self, cities, ts, index, dbscan, iso):
+        """Append one batch; returns ``(touched, evicted)`` city names."""
+        windows = self._windows
+        touched = set()
+        for city, t, p, d, i in zip(cities, ts.tolist(), index.tolist(), dbscan.tolist(), iso.tolist()):
+            window = windows.get(city)
+            if window is None:
+                window = windows[city] = _Window()
+            window.entries.append((t, p, d, i))
+            window.index_sum += p
+            window.dbscan += d
+            window.iso += i
+            window.total += 1
+            if t > window.newest:
+                window.newest = t
+            if len(window.entries) > self.size:
+                window.pop()
+            touched.add(city)
+
+        evicted = []
+        for city in touched:
+            window = windows[city]
+            windows.move_to_end(city)
+            if self.horizon_s is not None:
+                cutoff = window.newest - self.horizon_s
+                while window.entries and window.entries[0][0] < cutoff:
+                    window.pop()
+                if not window.entries:
+                    del windows[city]
+                    evicted.append(city)
+        while len(windows) > self.max_cities:
+            evicted.append(windows.popitem(last=False)[0])
+        touched.difference_update(evicted)
+        return touched, evicted
+
+    def aggregate(self, city):
+        window = self._windows[city]
+        n = len(window.entries)
+        last_ts, last_index, _, _ = window.entries[-1]
+        mean_index = window.index_sum / n
+        return {
+            "city": city,
+            "window": n,
+            "total": window.total,
+            "mean_index": mean_index,
+            "last_index": last_index,
+            "air_quality": str(INDEX_LABELS[classify(mean_index)]),
+            "dbscan_rate": window.dbscan / n,
+            "iso_rate": window.iso / n,
+            "last_ts": last_ts,
+        }
+
+
+class Ingestor:
+    """Read, micro-batch, score and aggregate readings from one source."""
+
+    def __init__(self, source, models=None, scorers=None, scaler=None, queue_blocks=64, max_batch=2048,
+                 max_wait_ms=50.0, window=120, horizon_s=None, max_cities=10_000, from_end=False):
+        self.kind, self.address = parse_source(source)
+        self.source = source
+        if models is None:
+            from airsense.loaders import load_models
+
+            models = load_models("xgb")
+        if scorers is None:
+            from airsense.loaders import load_anomaly_scorers
+
+            scorers = load_anomaly_scorers()
+        if scaler is None:
+            from airsense.config import INGEST_STATS
+            from airsense.loaders import load_reading_scaler
+
+            scaler = load_reading_scaler(INGEST_STATS)
+        if scaler is None:
+            raise ValueError("ingestion needs the pipeline's fitted statistics: run "
+                             "`python -m airsense.pipeline --stats-only --stats stats.json` and pass --stats "
+                             "(or set AIRSENSE_INGEST_STATS)")
+        self.models = models
+        self.scorers = scorers
+        self.scaler = scaler
+        self.fields = READING_FIELDS
+        self.queue_blocks = queue_blocks
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.from_end = from_end
+        self.windows = CityWindows(window, horizon_s, max_cities)
+
+        self.stats = LatencyStats()
+        self.readings = 0
+        self.rejected = 0
+        self.batches = 0
+        self.queue_peak = 0
+        self._recent = deque()
+        self._aggregates = {}
+        self._lock = threading.Lock()
+
+        self.started = None
+        self.error = None
+        self.ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._queue = None
+        self._thread = None
+
+    # ---------------------------------------------------------------- readers
+
+    async def _put(self, lines):
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            await self._queue.put((time.perf_counter(), lines))
+            self.queue_peak = max(self.queue_peak, self._queue.qsize())
+
+    async def _read_stream(self, reader, writer):
+        tail = b""
+        try:
+            while True:
+                data = await reader.read(READ_BYTES)
+                if not data:
+                    break
+                lines = (tail + data).split(b"\n")
+                tail = lines.pop()
+                if len(tail) > MAX_LINE_BYTES:
+                    tail = b""
+                    self.rejected += 1
+                # Blocks while the queue is full, which stops the reads
+                await self._put(lines)
+            await self._put([tail])
+        except asyncio.CancelledError:
+            # Shut down with the sender still connected; returning normally
+            # keeps asyncio's stream server from logging the cancellation
+            pass
+        finally:
+            writer.close()
+
+    async def _tail(self, path):
+        fh, tail = None, b""
+        try:
+            while True:
+                if fh is None:
+                    try:
+                        fh = open(path, "rb")
+                    except FileNotFoundError:
+                        await asyncio.sleep(TAIL_POLL_S)
+                        continue
+                    if self.from_end:
+                        fh.seek(0, os.SEEK_END)
+                    self.ready.set()
+                data = fh.read(READ_BYTES)
+                if data:
+                    lines = (tail + data).split(b"\n")
+                    tail = lines.pop()
+                    if len(tail) > MAX_LINE_BYTES:
+                        tail = b""
+                        self.rejected += 1
+                    await self._put(lines)
+                    continue
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    st = None
+                if st is None or st.st_ino != os.fstat(fh.fileno()).st_ino or st.st_size < fh.tell():
+                    # Rotated or truncated: start over on the new file
+                    fh.close()
+                    fh, tail = None, b""
+                    self.from_end = False
+                    continue
+                await asyncio.sleep(TAIL_POLL_S)
+        finally:
+            if fh is not None:
+                fh.close()
+
+    # ---------------------------------------------------------------- scoring
+
+    async def _next_batch(self):
+        blocks = [await self._queue.get()]
+        n = len(blocks[0][1])
+        deadline = blocks[0][0] + self.max_wait
+        while n < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    block = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    block = self._queue.get_nowait()
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            blocks.append(block)
+            n += len(block[1])
+        return blocks
+
+    async def _score_loop(self):
+        while True:
+            blocks = await self._next_batch()
+            # Scoring runs on the loop thread: while it does, nothing is read
+            self.score_blocks(blocks)
+
+    def score_blocks(self, blocks):
+        lines = [line for _, block in blocks for line in block]
+        cities, ts, X, rejected = _parse(lines, self.fields)
+        published, evicted = {}, []
+        if cities:
+            ts[np.isnan(ts)] = time.time()
+            features = self.scaler.transform(X)
+            # The index model takes the standardized concentrations
+            index = self.scaler.index(predict_index(self.models["xgb"], features[:, :3]))
+            dbscan = self.scorers["dbscan"].is_anomaly(features)
+            iso = self.scorers["iforest"].score_samples(features) < self.scorers["iforest"].offset
+            touched, evicted = self.windows.update(cities, ts, np.asarray(index, dtype=np.float64),
+                                                   dbscan.astype(np.int64), iso.astype(np.int64))
+            published = {city: self.windows.aggregate(city) for city in touched}
+
+        done = time.perf_counter()
+        latencies = np.repeat([done - received for received, _ in blocks], [len(b) for _, b in blocks])
+        self.stats.record_batch(len(lines), latencies.tolist())
+        with self._lock:
+            for city in evicted:
+                self._aggregates.pop(city, None)
+            self._aggregates.update(published)
+            self.readings += len(cities)
+            self.rejected += rejected
+            self.batches += 1
+            self._recent.append((done, len(cities)))
+            while self._recent and self._recent[0][0] < done - RATE_WINDOW_S:
+                self._recent.popleft()
+
+    # -------------------------------------------------------------- lifecycle
+
+    async def run(self):
+        """Serve until ``stop()``; raises if the source cannot be opened."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._queue = asyncio.Queue(self.queue_blocks)
+        self.started = time.perf_counter()
+        server = None
+        tasks = [asyncio.create_task(self._score_loop())]
+        try:
+            if self.kind == "tcp":
+                server = await asyncio.start_server(self._read_stream, *self.address, limit=READ_BYTES)
+                self.address = server.sockets[0].getsockname()[:2]
+            elif self.kind == "unix":
+                server = await asyncio.start_unix_server(self._read_stream, self.address, limit=READ_BYTES)
+            else:
+                tasks.append(asyncio.create_task(self._tail(self.address)))
+            if server is not None:
+                for sock in server.sockets:
+                    # Inherited by accepted connections
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_BYTES)
+                self.ready.set()
+            await self._stop.wait()
+        finally:
+            if server is not None:
+                server.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run_thread(self):
+        try:
+            asyncio.run(self.run())
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.ready.set()
+
+    def start(self, timeout=10.0):
+        """Run on a daemon thread; returns once the source is open."""
+        self._thread = threading.Thread(target=self._run_thread, name=f"ingest-{self.source}", daemon=True)
+        self._thread.start()
+        # A tailed file that does not exist yet is waited for in the background
+        if self.kind != "file":
+            self.ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout=5.0):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # -------------------------------------------------------------- publishing
+
+    def snapshot(self):
+        """``{"cities": [aggregate, ...], "metrics": {...}}``; safe to call from any thread."""
+        with self._lock:
+            cities = list(self._aggregates.values())
+            recent = sum(n for _, n in self._recent)
+            readings, rejected, batches = self.readings, self.rejected, self.batches
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            "cities": cities,
+            "metrics": {
+                "source": self.source,
+                "running": self.running,
+                "readings": readings,
+                "rejected": rejected,
+                "batches": batches,
+                "readings_per_sec": round(recent / max(min(elapsed, RATE_WINDOW_S), 1e-9), 1),
+                "queue_blocks": self._queue.qsize() if self._queue is not None else 0,
+                "queue_peak": self.queue_peak,
+                "cities": len(cities),
+                **{k: v for k, v in self.stats.snapshot().items() if k != "requests"},
+            },
+        }
+
+
+_RUNNING = {}
+_RUNNING_LOCK = threading.Lock()
+
+
+def start_background(source, **options):
+    """The running ingestor for ``source``, started on first use (one per process)."""
+    with _RUNNING_LOCK:
+        ingestor = _RUNNING.get(source)
+        if ingestor is None or not ingestor.running:
+            ingestor = _RUNNING[source] = Ingestor(source, **options).start()
+        return ingestor
+
+
+def running_sources():
+    with _RUNNING_LOCK:
+        return [source for source, ingestor in _RUNNING.items() if ingestor.running]
+
+
+# ------------------------------------------------------------------- replay
+
+def replay_cities(n=None, seed=0):
+    """``(names, latitudes, longitudes)`` of the processed table's cities, or synthetic ones."""
+    try:
+        from airsense import snapshots
+
+        frame = snapshots.read("processed", ["city_raw", "latitude", "longitude"])
+        frame = frame.dropna().drop_duplicates("city_raw")
+        names = frame["city_raw"].astype(str).tolist()
+        lat, lon = frame["latitude"].to_numpy(np.float64), frame["longitude"].to_numpy(np.float64)
+    except (FileNotFoundError, KeyError, ValueError):
+        names, lat, lon = [], np.empty(0), np.empty(0)
+    if n is not None and n > len(names):
+        rng = np.random.default_rng(seed)
+        extra = n - len(names)
+        names += [f"Station {i}" for i in range(extra)]
+        lat = np.concatenate([lat, rng.uniform(-60, 70, extra)])
+        lon = np.concatenate([lon, rng.uniform(-180, 180, extra)])
+    return names[:n], lat[:n], lon[:n]
+
+
+def replay_lines(cities, n, rng):
+    """``n`` synthetic NDJSON readings (bytes) spread over ``cities``; concentrations in µg/m³."""
+    names, lat, lon = cities
+    pick = rng.integers(0, len(names), n)
+    # Log-normal around typical WHO annual means, with a rare tenfold spike
+    conc = rng.lognormal(np.log([35.0, 18.0, 22.0]), 0.5, (n, 3))
+    conc[rng.random(n) < 0.001] *= 10
+    now = time.time()
+    return b"".join(
+        (f'{{"city": {json.dumps(names[k])}, "ts": {now:.3f}, "pm10_concentration": {a:.2f}, '
+         f'"pm25_concentration": {b:.2f}, "no2_concentration": {c:.2f}, '
+         f'"latitude": {lat[k]:.5f}, "longitude": {lon[k]:.5f}}}\n').encode()
+        for k, (a, b, c) in zip(pick.tolist(), conc.tolist())
+    )
+
+
+async def replay(target, rate=0.0, seconds=None, count=None, n_cities=None, block=256, seed=0):
+    """Send readings to ``target`` (``rate`` per second, 0 for as fast as accepted); returns the count sent."""
+    kind, address = parse_source(target)
+    cities = replay_cities(n_cities, seed)
+    rng = np.random.default_rng(seed)
+    if kind == "tcp":
+        _, writer = await asyncio.open_connection(*address)
+    elif kind == "unix":
+        _, writer = await asyncio.open_unix_connection(address)
+    else:
+        writer = None
+        fh = open(address, "ab")
+    sent, start = 0, time.perf_counter()
+    try:
+        while (count is None or sent < count) and (seconds is None or time.perf_counter() - start < seconds):
+            n = block if count is None else min(block, count - sent)
+            data = replay_lines(cities, n, rng)
+            if writer is not None:
+                writer.write(data)
+                # Waits while the ingestor is not reading
+                await writer.drain()
+            else:
+                fh.write(data)
+                fh.flush()
+            sent += n
+            if rate > 0:
+                ahead = sent / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+    finally:
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+        else:
+            fh.close()
+    return sent
+
+
+def _ingestor_options(args):
+    return {
+        "scaler": ReadingScaler.from_json(args.stats),
+        "queue_blocks": args.queue_blocks,
+        "max_batch": args.max_batch,
+        "max_wait_ms": args.max_wait_ms,
+        "window": args.window,
+        "horizon_s": args.horizon_s,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest and score live station readings (NDJSON)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    listen = sub.add_parser("listen", help="score readings from a source and print rolling metrics")
+    listen.add_argument("source", help="tcp://host:port, unix:///path or a file to tail")
+    listen.add_argument("--stats", required=True,
+                        help="pipeline --stats JSON, to score raw readings on the processed scale")
+    listen.add_argument("--queue-blocks", type=int, default=64)
+    listen.add_argument("--max-batch", type=int, default=2048)
+    listen.add_argument("--max-wait-ms", type=float, default=50.0)
+    listen.add_argument("--window", type=int, default=120, help="readings kept per city")
+    listen.add_argument("--horizon-s", type=float, help="also drop readings older than this")
+    listen.add_argument("--from-end", action="store_true", help="tail a file from its current end")
+    listen.add_argument("--interval", type=float, default=5.0, help="seconds between metric lines")
+
+    send = sub.add_parser("replay", help="send synthetic readings to a source")
+    send.add_argument("target", help="tcp://host:port, unix:///path or a file to append to")
+    send.add_argument("--rate", type=float, default=0.0, help="readings per second (0: as fast as accepted)")
+    send.add_argument("--seconds", type=float)
+    send.add_argument("--count", type=int)
+    send.add_argument("--cities", type=int, help="number of cities (default: the processed table's)")
+    send.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        sent = asyncio.run(replay(args.target, args.rate, args.seconds, args.count, args.cities, seed=args.seed))
+        print(f"sent {sent:,} readings")
+        return
+
+    ingestor = Ingestor(args.source, from_end=args.from_end, **_ingestor_options(args)).start()
+    print(f"AirSense ingestion from {args.source}")
+    try:
+        while ingestor.running:
+            time.sleep(args.interval)
+            print(json.dumps(ingestor.snapshot()["metrics"]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.stop()
+    if ingestor.error is not None:
+        raise ingestor.error
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Cached loaders for the datasets and models used by the app pages.
+
+Tables are read through ``airsense.snapshots``.  The processed and anomaly
+tables are kept once per process as compact ``airsense.table.CompactTable``s
+and pages get zero-copy DataFrame views of the columns listed in
+``PAGE_COLUMNS``.  Frames returned here share memory between sessions: treat
+them as read-only and copy before modifying.
+"""
+import os
+
+import pandas as pd
+
+from airsense import snapshots
+from airsense.cache import CACHE, sources_version
+from airsense.config import DERIVED_DIR, model_path
+
+PAGE_COLUMNS = {
+    "home": ["city", "country_name", "year"],
+    "severity": ["country_name", "city", "year", "pm10_concentration", "pm25_concentration",
+                 "no2_concentration", "pollution_per_person"],
+    "anomaly_map": ["city", "latitude", "longitude", "pollution_index", "is_anomaly_dbscan"],
+    "trend": ["city", "year", "pollution_index"],
+    "analytics": ["city", "country_name", "year", "who_region", "pollution_index"],
+    "analytics_anomalies": ["city", "country_name", "year", "who_region", "is_anomaly_dbscan"],
+    "hotspots": ["city", "country_name", "year", "latitude", "longitude", "pollution_index", "is_anomaly_dbscan"],
+}
+
+
+def _load_table(name, columns=None):
+    path = snapshots.source_path(name)
+    key = (name, path.name, tuple(columns) if columns is not None else None)
+    return CACHE.get(key, [path], lambda: snapshots.read(name, columns))
+
+
+def load_raw(columns=None):
+    return _load_table("raw", columns)
+
+
+def load_compact(name):
+    """Shared ``CompactTable`` of ``"processed"`` or ``"anomalies"`` (see ``airsense.table``).
+
+    The anomaly table shares every column it has in common with the processed
+    one, so it is rebuilt when either source changes.
+    """
+    from airsense.table import CompactTable
+
+    path = snapshots.source_path(name)
+    base_path = snapshots.source_path("processed") if name == "anomalies" else None
+    if base_path is None or not base_path.exists():
+        return CACHE.get(("compact", name, path.name), [path], lambda: CompactTable.from_frame(snapshots.read(name)))
+    return CACHE.get(
+        ("compact", name, path.name, base_path.name), [path, base_path],
+        lambda: CompactTable.from_frame(snapshots.read(name), base=load_compact("processed")),
+    )
+
+
+def load_processed(columns=None):
+    return load_compact("processed").frame(columns)
+
+
+def load_anomalies(columns=None):
+    return load_compact("anomalies").frame(columns)
+
+
+def load_city_index():
+    """``CityIndex`` over the rows returned by ``load_processed(PAGE_COLUMNS["severity"])``."""
+    from airsense.lookup import CityIndex
+
+    path = snapshots.source_path("processed")
+    return CACHE.get(
+        ("city_index", path.name), [path],
+        lambda: CityIndex.from_frame(load_processed(PAGE_COLUMNS["severity"])),
+    )
+
+
+def load_city_series():
+    """``CitySeries`` of the pollution index over the rows of ``load_processed(PAGE_COLUMNS["trend"])``."""
+    from airsense.timeseries import CitySeries
+
+    path = snapshots.source_path("processed")
+    return CACHE.get(
+        ("city_series", path.name), [path],
+        lambda: CitySeries.from_frame(load_processed(PAGE_COLUMNS["trend"])),
+    )
+
+
+def _persisted_path(name, sources):
+    return DERIVED_DIR / f"{name}-{sources_version(sources)}.parquet"
+
+
+def _persisted(name, sources, build):
+    """Load ``data/derived/<name>-<version>.parquet`` or build and write it.
+
+    The version is a digest of ``sources``, so a new model or dataset gets a
+    new file and older versions are removed.
+    """
+    path = _persisted_path(name, sources)
+    if path.exists():
+        return pd.read_parquet(path)
+
+    table = build()
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    for stale in DERIVED_DIR.glob(f"{name}-*.parquet"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return table
+
+
+def load_severity_table():
+    """Cluster and severity for every processed row (see ``airsense.severity``)."""
+    from airsense.severity import build_severity_table
+
+    data = snapshots.source_path("processed")
+    sources = [data, model_path("kmeans"), model_path("severity_map")]
+
+    def build():
+        return build_severity_table(
+            load_processed(PAGE_COLUMNS["severity"]), load_model("kmeans"), load_model("severity_map")
+        )
+
+    return CACHE.get(("severity_table", data.name), sources, lambda: _persisted("severity", sources, build))
+
+
+def load_forecast_table():
+    """Fitted and forecast pollution index per city-year, indexed by city (see ``airsense.forecast``)."""
+    from airsense.forecast import FORECAST_INPUT_COLUMNS, build_forecast_table
+
+    data = snapshots.source_path("processed")
+    sources = [data, model_path("xgb_forecast")]
+
+    def build():
+        return build_forecast_table(load_processed(FORECAST_INPUT_COLUMNS), load_model("xgb_forecast"))
+
+    return CACHE.get(
+        ("forecast_table", data.name), sources,
+        lambda: _persisted("forecast", sources, build).set_index("city"),
+    )
+
+
+def load_index_attributions():
+    """``AttributionStore`` of the index model for every processed row (see ``airsense.explain``)."""
+    from airsense.explain import AttributionStore, build_index_attributions
+    from airsense.pollution_index import INDEX_FEATURES
+
+    data = snapshots.source_path("processed")
+    sources = [data, model_path("xgb")]
+
+    def build():
+        return build_index_attributions(load_processed(["city", "year"] + INDEX_FEATURES), load_model("xgb"))
+
+    return CACHE.get(
+        ("index_attributions", data.name), sources,
+        lambda: AttributionStore.from_frame(_persisted("index_attributions", sources, build)),
+    )
+
+
+def load_forecast_attributions(build=True):
+    """``AttributionStore`` of the forecast model for every row of ``load_forecast_table``.
+
+    ``pred_contribs`` over the forecast model takes minutes on a full table,
+    so with ``build=False`` this returns None instead of building a store
+    that is not already persisted (``python -m airsense.explain``).
+    """
+    from airsense.explain import AttributionStore, build_forecast_attributions
+    from airsense.forecast import FORECAST_INPUT_COLUMNS
+
+    data = snapshots.source_path("processed")
+    sources = [data, model_path("xgb_forecast")]
+    key = ("forecast_attributions", data.name)
+    if not build and CACHE.peek(key) is None and not _persisted_path("forecast_attributions", sources).exists():
+        return None
+
+    def build_table():
+        return build_forecast_attributions(load_processed(FORECAST_INPUT_COLUMNS), load_model("xgb_forecast"))
+
+    return CACHE.get(
+        key, sources,
+        lambda: AttributionStore.from_frame(_persisted("forecast_attributions", sources, build_table)),
+    )
+
+
+def load_analytics_cube():
+    """``AnalyticsCube`` for the Analytics page (see ``airsense.cube``).
+
+    When a source file changes the previous cube is refreshed, which only
+    aggregates the new rows if the tables were appended to.
+    """
+    from airsense.cube import AnalyticsCube
+
+    data, anomalies = snapshots.source_path("processed"), snapshots.source_path("anomalies")
+    key = ("analytics_cube", data.name, anomalies.name)
+
+    def build():
+        df = load_processed(PAGE_COLUMNS["analytics"])
+        anomaly_df = load_anomalies(PAGE_COLUMNS["analytics_anomalies"])
+        previous = CACHE.peek(key)
+        if previous is None:
+            return AnalyticsCube.build(df, anomaly_df)
+        return previous.refresh(df, anomaly_df)
+
+    return CACHE.get(key, [data, anomalies], build)
+
+
+def load_anomaly_map(cell_deg):
+    """Folium map for the Anomaly Detection page, built once per data version and detail level."""
+    from airsense.maps import build_anomaly_map
+
+    path = snapshots.source_path("anomalies")
+    return CACHE.get(
+        ("anomaly_map", path.name, cell_deg), [path],
+        lambda: build_anomaly_map(load_anomalies(PAGE_COLUMNS["anomaly_map"]), cell_deg),
+    )
+
+
+def load_station_index():
+    """``StationIndex`` of the anomaly table (see ``airsense.geo``), built once per data version.
+
+    Its row positions refer to ``load_anomalies(PAGE_COLUMNS["hotspots"])``.
+    """
+    from airsense.geo import StationIndex
+
+    path = snapshots.source_path("anomalies")
+    return CACHE.get(
+        ("station_index", path.name), [path],
+        lambda: StationIndex.from_frame(load_anomalies(PAGE_COLUMNS["hotspots"])),
+    )
+
+
+def load_figure(key, build, tables=(), models=(), files=()):
+    """Plotly figure ``build()`` cached under ``key`` until a table, model or other file it shows changes."""
+    from airsense.figures import FIGURES
+
+    sources = [snapshots.source_path(name) for name in tables] + [model_path(name) for name in models] + list(files)
+    return FIGURES.get(key, sources, build)
+
+
+def load_surface(spec):
+    """What-if ``Surface`` of the index model over ``spec`` (see ``airsense.whatif``).
+
+    Cached per model file and ``AIRSENSE_PIPELINE_STATS`` file; raises
+    ValueError when no statistics are configured.
+    """
+    from airsense.config import PIPELINE_STATS
+    from airsense.whatif import SURFACES, evaluate, split_points
+
+    scaler = require_reading_scaler()
+    model, path = load_model("xgb"), model_path("xgb")
+    splits = CACHE.get(("split_points", "xgb"), [path], lambda: split_points(model))
+    return SURFACES.get(("surface", spec, PIPELINE_STATS), [path, PIPELINE_STATS],
+                        lambda: evaluate(model, spec, splits, scaler))
+
+
+def load_anomaly_scorers():
+    """``{"dbscan": CoreSampleScorer, "iforest": IsolationForestScorer}`` for new readings."""
+    from airsense.anomaly import CoreSampleScorer, IsolationForestScorer
+
+    dbscan_path, iforest_path = model_path("dbscan"), model_path("iforest")
+    return {
+        # Only the core samples are kept, not the fitted DBSCAN's labels
+        "dbscan": _registered("dbscan") or CACHE.get(
+            ("scorer", "dbscan"), [dbscan_path], lambda: CoreSampleScorer.from_dbscan(_unpickle(dbscan_path))),
+        "iforest": _registered("iforest") or CACHE.get(
+            ("scorer", "iforest"), [iforest_path], lambda: IsolationForestScorer.from_model(_unpickle(iforest_path))),
+    }
+
+
+def _unpickle(path):
+    import joblib
+
+    return joblib.load(path)
+
+
+def _registered(name):
+    """``name`` loaded from the model registry, or None to fall back to the pickle."""
+    from airsense import registry
+
+    if not registry.MANIFEST.exists():
+        return None
+    manifest = CACHE.get(("registry_manifest",), [registry.MANIFEST], registry.read_manifest)
+    found = registry.entry(name, manifest)
+    if found is None:
+        return None
+    return CACHE.get(("registry", name, found["version"]), registry.artifact_paths(name, found),
+                     lambda: registry.load(name, found))
+
+
+def load_model(name):
+    registered = _registered(name)
+    if registered is not None:
+        return registered
+    path = model_path(name)
+    if name == "lstm":
+        # Keras file read with h5py; see airsense.lstm
+        from airsense.lstm import LSTMForecaster
+
+        return CACHE.get(("model", name), [path], lambda: LSTMForecaster.from_h5(path))
+    return CACHE.get(("model", name), [path], lambda: _unpickle(path))
+
+
+def load_models(*names):
+    return {name: load_model(name) for name in names}
+
+
+def load_reading_scaler(path=None):
+    """``ingest.ReadingScaler`` from a pipeline ``--stats`` file (default ``AIRSENSE_PIPELINE_STATS``), or None."""
+    from airsense.config import PIPELINE_STATS
+    from airsense.ingest import ReadingScaler
+
+    path = path or PIPELINE_STATS
+    if not path:
+        return None
+    return CACHE.get(("reading_scaler", str(path)), [path], lambda: ReadingScaler.from_json(path))
+
+
+def require_reading_scaler(path=None, setting="AIRSENSE_PIPELINE_STATS"):
+    """``load_reading_scaler(path)``; raises ValueError naming ``setting`` when no statistics are configured."""
+    scaler = load_reading_scaler(path)
+    if scaler is None:
+        raise ValueError("no pipeline statistics: run "
+                         f"`python -m airsense.pipeline --stats-only --stats stats.json` and set {setting}")
+    return scaler
+
+
+def load_ingestor(source=None):
+    """The process-wide ``Ingestor`` for ``source`` (default ``AIRSENSE_INGEST_SOURCE``), started on first use.
+
+    Only sources listed in ``AIRSENSE_INGEST_SOURCES`` are started; raises
+    ValueError for others, or when no pipeline statistics are configured.
+    """
+    from airsense import ingest
+    from airsense.config import INGEST_SOURCE, INGEST_SOURCES, INGEST_STATS
+
+    source = source or INGEST_SOURCE
+    if source not in INGEST_SOURCES:
+        raise ValueError(f"{source!r} is not one of the configured ingestion sources")
+    scaler = require_reading_scaler(INGEST_STATS, "AIRSENSE_INGEST_STATS")
+    return ingest.start_background(source, models=load_models("xgb"), scorers=load_anomaly_scorers(),
+                                   scaler=scaler)
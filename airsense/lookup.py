@@ -0,0 +1,87 @@
+"""Normalized (country, city) index for the City Severity page.
+
+Names are casefolded, stripped of accents and whitespace-collapsed once at
+build time, so a lookup is a single dict probe instead of a full-column string
+comparison, and ``difflib`` handles near-miss typos.
+"""
+import difflib
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+
+def normalize(text):
+    if text is None or text != text:  # None / NaN
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+class CityIndex:
+    def __init__(self, countries, cities):
+        positions = defaultdict(list)
+        display = {}
+        for pos, (country, city) in enumerate(zip(countries, cities)):
+            key = (normalize(country), normalize(city))
+            if not key[0] or not key[1]:
+                continue
+            positions[key].append(pos)
+            display.setdefault(key, (str(country).strip(), str(city).strip()))
+
+        self._rows = {key: np.asarray(pos, dtype=np.int64) for key, pos in positions.items()}
+        self._display = display
+
+        self._country_display = {}
+        self._cities = defaultdict(list)
+        for (country_key, city_key), (country, city) in display.items():
+            self._country_display.setdefault(country_key, country)
+            self._cities[country_key].append((city_key, city))
+        for entries in self._cities.values():
+            entries.sort()
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df["country_name"].to_numpy(), df["city"].to_numpy())
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def countries(self):
+        return sorted(self._country_display.values(), key=normalize)
+
+    def cities(self, country):
+        """Display names of the cities recorded for ``country``."""
+        return [city for _, city in self._cities.get(normalize(country), [])]
+
+    def _match_country(self, country):
+        key = normalize(country)
+        if key in self._country_display:
+            return key
+        close = difflib.get_close_matches(key, list(self._country_display), n=1, cutoff=0.8)
+        return close[0] if close else None
+
+    def resolve(self, country, city):
+        """Best ``(country, city)`` display pair for user input, or None.
+
+        Exact normalized matches are O(1); otherwise the closest city name
+        within the (also fuzzily matched) country is used.  The country is
+        spelled as in ``countries``.
+        """
+        country_key = self._match_country(country)
+        if country_key is None:
+            return None
+        city_key = normalize(city)
+        if (country_key, city_key) not in self._rows:
+            candidates = [key for key, _ in self._cities[country_key]]
+            close = difflib.get_close_matches(city_key, candidates, n=1, cutoff=0.8)
+            if not close:
+                return None
+            city_key = close[0]
+        return self._country_display[country_key], self._display[(country_key, city_key)][1]
+
+    def rows(self, country, city):
+        """Row positions for an exact normalized (country, city) match."""
+        return self._rows.get((normalize(country), normalize(city)), np.empty(0, dtype=np.int64))
@@ -0,0 +1,139 @@
+"""NumPy inference for the Keras LSTM forecaster.
+
+``lstm_pollution_forecast.h5`` (``notebooks/timeseries_pollu_pred_model.ipynb``)
+is ``LSTM(64, activation="relu") -> Dropout(0.2) -> Dense(1)`` over the 15
+``FORECAST_FEATURES``, fed as ``(samples, 1 timestep, features)``.  Serving it
+through Keras means importing TensorFlow.  ``LSTMForecaster.from_h5`` instead
+reads the weights and layer settings with h5py, and ``predict`` runs the
+forward pass on every row at once.  For each timestep, that is one matrix
+product for the input and one for the recurrent state (skipped at the first
+step, where the state is zero), followed by the gates in Keras order (input,
+forget, cell, output).  Dropout does nothing at inference.
+
+``predict`` takes the same 2-D feature matrix as the XGBoost forecaster (one
+timestep) and returns one value per row, so ``forecast.build_forecast_table``
+can score every city with it.  ``python -m airsense.registry export lstm``
+stores the arrays as ``.npy`` files.
+"""
+import json
+
+import numpy as np
+
+
+def _sigmoid(x, out=None):
+    # Same value as 1 / (1 + exp(-x)) without overflow for large |x|
+    out = np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    out += 1
+    out *= 0.5
+    return out
+
+
+_ACTIVATIONS = {
+    "linear": lambda x, out=None: np.positive(x, out=out),
+    "relu": lambda x, out=None: np.maximum(x, 0, out=out),
+    "tanh": lambda x, out=None: np.tanh(x, out=out),
+    "sigmoid": _sigmoid,
+}
+
+
+def _activation(name):
+    if name not in _ACTIVATIONS:
+        raise ValueError(f"unsupported activation {name!r}")
+    return _ACTIVATIONS[name]
+
+
+def _layer_weights(group):
+    names = [n.decode() if isinstance(n, bytes) else str(n) for n in group.attrs["weight_names"]]
+    return [np.asarray(group[name]) for name in names]
+
+
+class LSTMForecaster:
+    """Single LSTM layer plus a dense output, as saved by Keras."""
+
+    ARRAYS = ["kernel", "recurrent_kernel", "bias", "dense_kernel", "dense_bias"]
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+                 activation="tanh", recurrent_activation="sigmoid", dense_activation="linear"):
+        self.kernel = kernel
+        self.recurrent_kernel = recurrent_kernel
+        self.bias = bias
+        self.dense_kernel = dense_kernel
+        self.dense_bias = dense_bias
+        self.activation = activation
+        self.recurrent_activation = recurrent_activation
+        self.dense_activation = dense_activation
+        self._act = _activation(activation)
+        self._gate = _activation(recurrent_activation)
+        self._out = _activation(dense_activation)
+
+    @classmethod
+    def from_h5(cls, path):
+        """Weights and activations of a Keras ``Sequential([LSTM, (Dropout), Dense])`` file."""
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            config = json.loads(f.attrs["model_config"])
+            layers = {layer["class_name"]: layer["config"] for layer in config["config"]["layers"]}
+            if set(layers) - {"InputLayer", "LSTM", "Dropout", "Dense"}:
+                raise ValueError(f"unsupported layers: {sorted(layers)}")
+            lstm, dense = layers["LSTM"], layers["Dense"]
+            if lstm.get("return_sequences") or lstm.get("go_backwards") or lstm.get("stateful"):
+                raise ValueError("only a forward, last-output LSTM is supported")
+            weights = f["model_weights"]
+            kernel, recurrent_kernel, bias = _layer_weights(weights[lstm["name"]])
+            dense_kernel, dense_bias = _layer_weights(weights[dense["name"]])
+        return cls(kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+                   activation=lstm["activation"], recurrent_activation=lstm["recurrent_activation"],
+                   dense_activation=dense["activation"])
+
+    @property
+    def units(self):
+        return self.recurrent_kernel.shape[0]
+
+    @property
+    def n_features_in_(self):
+        return self.kernel.shape[0]
+
+    def arrays(self):
+        return {role: getattr(self, role) for role in self.ARRAYS}
+
+    def params(self):
+        return {"units": int(self.units), "activation": self.activation,
+                "recurrent_activation": self.recurrent_activation, "dense_activation": self.dense_activation}
+
+    def predict(self, X, chunk_rows=4096):
+        """One prediction per row of ``X``, shaped ``(n, features)`` or ``(n, timesteps, features)``."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 2:
+            X = X[:, None, :]
+        out = np.empty(len(X), dtype=np.float32)
+        # Chunks small enough for the gate matrix to stay in cache
+        for start in range(0, len(X), chunk_rows):
+            chunk = X[start:start + chunk_rows]
+            out[start:start + len(chunk)] = self._forward(chunk)
+        return out
+
+    def _forward(self, X):
+        units = self.units
+        i, f, g, o = (slice(k * units, (k + 1) * units) for k in range(4))
+        h = c = None
+        for t in range(X.shape[1]):
+            z = X[:, t] @ self.kernel
+            z += self.bias
+            if h is not None:
+                z += h @ self.recurrent_kernel
+            # Gates are computed in place in z
+            self._gate(z[:, i], out=z[:, i])
+            self._gate(z[:, o], out=z[:, o])
+            candidate = self._act(z[:, g], out=z[:, g])
+            candidate *= z[:, i]
+            if c is None:
+                # The state starts at zero, so the forget gate has nothing to scale
+                c = candidate.copy()
+            else:
+                c *= self._gate(z[:, f], out=z[:, f])
+                c += candidate
+            h = self._act(c, out=z[:, g])
+            h *= z[:, o]
+        return self._out(h @ self.dense_kernel + self.dense_bias)[:, 0]
@@ -0,0 +1,91 @@
+"""Folium map for the Anomaly Detection page.
+
+Normal readings are binned server-side into a lat/lon grid and drawn as one
+circle per occupied cell, so the layer size depends on the cell size rather
+than on the number of readings.  Anomalies stay individual points.  Both
+layers are single ``GeoJson`` objects assembled from numpy columns instead of
+one ``CircleMarker`` per row.
+"""
+import numpy as np
+
+NORMAL_COLOR = "#0068c9"
+ANOMALY_COLOR = "#dc3545"
+
+# Cell sizes offered on the page, in degrees (coarse -> fine)
+DETAIL_LEVELS = {"Low": 5.0, "Medium": 2.0, "High": 0.5}
+
+
+def grid_aggregate(lat, lon, values, cell_deg):
+    """Mean position, count and mean value of the points in each grid cell."""
+    rows = np.floor((np.asarray(lat) + 90.0) / cell_deg).astype(np.int64)
+    cols = np.floor((np.asarray(lon) + 180.0) / cell_deg).astype(np.int64)
+    n_cols = int(np.ceil(360.0 / cell_deg)) + 1
+    _, cell, counts = np.unique(rows * n_cols + cols, return_inverse=True, return_counts=True)
+
+    def cell_mean(x):
+        return np.bincount(cell, weights=x, minlength=len(counts)) / counts
+
+    return cell_mean(lat), cell_mean(lon), counts, cell_mean(values)
+
+
+def _feature_collection(lat, lon, properties):
+    names = list(properties)
+    columns = [np.asarray(properties[name]).tolist() for name in names]
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": dict(zip(names, props)),
+            }
+            for y, x, *props in zip(np.round(lat, 4).tolist(), np.round(lon, 4).tolist(), *columns)
+        ],
+    }
+
+
+def build_anomaly_map(df, cell_deg=DETAIL_LEVELS["Medium"]):
+    """Map of grid-aggregated normal readings plus individual anomalies."""
+    import folium
+
+    lat = df["latitude"].to_numpy(dtype=np.float64)
+    lon = df["longitude"].to_numpy(dtype=np.float64)
+    index = df["pollution_index"].to_numpy(dtype=np.float64)
+    anomalous = df["is_anomaly_dbscan"].to_numpy(dtype=bool)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+
+    m = folium.Map(
+        location=[float(np.nanmean(lat)), float(np.nanmean(lon))],
+        zoom_start=3,
+        tiles="CartoDB positron"
+    )
+
+    normal = located & ~anomalous
+    if normal.any():
+        c_lat, c_lon, counts, mean_index = grid_aggregate(lat[normal], lon[normal], index[normal], cell_deg)
+        radius = np.clip(3 + 2 * np.log10(counts), 3, 12)
+        folium.GeoJson(
+            _feature_collection(c_lat, c_lon, {
+                "readings": counts,
+                "mean_index": np.round(mean_index, 1),
+                "radius": np.round(radius, 1),
+            }),
+            name="Normal",
+            marker=folium.CircleMarker(fill=True, color=NORMAL_COLOR, fill_opacity=0.6, weight=1),
+            style_function=lambda feature: {"radius": feature["properties"]["radius"]},
+            popup=folium.GeoJsonPopup(fields=["readings", "mean_index"], aliases=["Readings", "Mean index"]),
+        ).add_to(m)
+
+    flagged = located & anomalous
+    if flagged.any():
+        folium.GeoJson(
+            _feature_collection(lat[flagged], lon[flagged], {
+                "city": df["city"].to_numpy()[flagged].astype(str),
+                "index": np.round(index[flagged], 1),
+            }),
+            name="Anomalies",
+            marker=folium.CircleMarker(radius=4, fill=True, color=ANOMALY_COLOR, fill_opacity=0.8, weight=1),
+            popup=folium.GeoJsonPopup(fields=["city", "index"], aliases=["City", "Index"]),
+        ).add_to(m)
+
+    return m
@@ -0,0 +1,558 @@
+"""Raw WHO export -> processed table, out of core.
+
+This is the preprocessing from ``notebooks/01_eda.ipynb`` as a chunked
+pipeline, so exports larger than memory can be processed.
+
+Fit passes read the input in chunks and keep only fixed-size state:
+
+1. Quantile sketches give the medians used for the fills and the population
+   quartiles.  Category sets are collected for the encoders, along with row
+   counts per city.
+2. Exact streaming moments are accumulated.  The concentration covariance
+   gives the one-component PCA behind ``pollution_index``.  The mean and
+   variance of every scaled column feed a ``StandardScaler`` via
+   ``partial_fit``.
+
+The transform pass cleans each chunk in file order.  Backward fills that run
+past the end of a chunk are carried into the next one.  Rows are spilled to
+Arrow files in contiguous ranges of the sorted city list.  Each range is then
+sorted by (city, year) in memory, which is enough to compute the per-city
+yearly change.  Ranges are scaled and appended to the output in order, so the
+result is sorted like the notebook's.
+
+    python -m airsense.pipeline data/raw/who_air_quality.xlsx data/processed/processed_data.csv
+
+``--stats-only`` runs just the fit passes and writes the statistics JSON
+(the scaling the app needs to score raw readings) without touching ``dst``:
+
+    python -m airsense.pipeline --stats-only --stats stats.json
+
+Notebook behaviours kept on purpose, because the shipped models were trained
+on their output:
+
+* Only ``population`` is IQR-clipped.  The notebook computes the bounds for
+  every numeric column, but the ``clip`` cell sits outside the loop.
+* ``pollution_index_yearly_change`` is computed before scaling.
+* ``who_region`` and ``iso3`` hold only the first one-hot column: the
+  indicator of the alphabetically first category.
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from airsense.config import PROCESSED_CSV, RAW_XLSX
+
+DROP_COLUMNS = ["version", "reference", "web_link", "population_source"]
+NUMERIC_COLUMNS = [
+    "year", "pm10_concentration", "pm25_concentration", "no2_concentration",
+    "pm10_tempcov", "pm25_tempcov", "no2_tempcov", "population", "latitude", "longitude",
+]
+CONCENTRATIONS = ["pm10_concentration", "pm25_concentration", "no2_concentration"]
+FILL_COLUMNS = CONCENTRATIONS + ["population", "pm10_tempcov", "pm25_tempcov", "no2_tempcov"]
+CLIP_COLUMNS = ["population"]
+BACKFILL_COLUMNS = ["year", "type_of_stations"]
+ONE_HOT_COLUMNS = ["who_region", "iso3"]
+SCALE_COLUMNS = [
+    "pm10_concentration", "pm25_concentration", "no2_concentration",
+    "pm10_tempcov", "pm25_tempcov", "no2_tempcov", "population", "pollution_per_person", "pollution_index",
+]
+
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_BUCKET_ROWS = 1_000_000
+SKETCH_CAPACITY = 1 << 18
+
+
+class QuantileSketch:
+    """Mergeable weighted quantile sketch.
+
+    Holds values exactly up to ``capacity`` items, which is enough for the WHO
+    database, so its quantiles match ``Series.quantile``.  Beyond that, the
+    most common weight is compacted: neighbouring items of that weight are
+    merged pairwise into items of double weight.  Each compaction adds at most
+    one item's weight of rank error.  Items of different weights are never
+    paired, so a heavy item cannot keep absorbing light neighbours.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY, seed=0):
+        self.capacity = capacity
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values, weight=1.0):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.values = np.concatenate([self.values, values])
+        self.weights = np.concatenate([self.weights, np.full(len(values), float(weight))])
+        while len(self.values) > self.capacity:
+            self._compact()
+
+    def _compact(self):
+        levels, counts = np.unique(self.weights, return_counts=True)
+        if counts.max() < 2:
+            self._compact_mixed()
+            return
+        level = levels[counts.argmax()]
+        same = self.weights == level
+        values = np.sort(self.values[same])
+        n = len(values) // 2 * 2
+        # Keep the first or second value of every pair, with one coin for the level
+        kept = values[:n].reshape(-1, 2)[:, int(self._rng.integers(2))]
+        self.values = np.concatenate([self.values[~same], kept, values[n:]])
+        self.weights = np.concatenate([
+            self.weights[~same], np.full(len(kept), 2 * level), np.full(len(values) - n, level),
+        ])
+
+    def _compact_mixed(self):
+        order = np.argsort(self.values, kind="stable")
+        values, weights = self.values[order], self.weights[order]
+        n = len(values) // 2 * 2
+        # Keep one value of each adjacent pair, chosen in proportion to weight
+        pairs_v, pairs_w = values[:n].reshape(-1, 2), weights[:n].reshape(-1, 2)
+        pick = self._rng.random(len(pairs_v)) * pairs_w.sum(axis=1) >= pairs_w[:, 0]
+        self.values = np.concatenate([pairs_v[np.arange(len(pairs_v)), pick.astype(int)], values[n:]])
+        self.weights = np.concatenate([pairs_w.sum(axis=1), weights[n:]])
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def quantile(self, q):
+        """Linear interpolation between ranks, as in ``numpy.quantile``."""
+        if not len(self.values):
+            return float("nan")
+        order = np.argsort(self.values, kind="stable")
+        values, ends = self.values[order], np.cumsum(self.weights[order])
+        rank = q * (ends[-1] - 1)
+        lo, hi = np.floor(rank), np.ceil(rank)
+        v_lo = values[min(np.searchsorted(ends, lo, side="right"), len(values) - 1)]
+        v_hi = values[min(np.searchsorted(ends, hi, side="right"), len(values) - 1)]
+        return float(v_lo + (v_hi - v_lo) * (rank - lo))
+
+
+class Moments:
+    """Streaming column means and covariance (Chan et al. pairwise update)."""
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros((n_features, n_features))
+
+    def partial_fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if not len(X):
+            return self
+        n_b, mean_b = len(X), X.mean(axis=0)
+        centered = X - mean_b
+        m2_b = centered.T @ centered
+        delta = mean_b - self.mean
+        n = self.n + n_b
+        self.m2 += m2_b + np.outer(delta, delta) * self.n * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+        return self
+
+    @property
+    def covariance(self):
+        return self.m2 / max(self.n - 1, 1)
+
+
+def principal_axis(moments):
+    """First principal component, signed like sklearn's ``PCA`` (largest loading positive)."""
+    eigenvalues, eigenvectors = np.linalg.eigh(moments.covariance)
+    axis = eigenvectors[:, np.argmax(eigenvalues)]
+    return axis * np.sign(axis[np.argmax(np.abs(axis))])
+
+
+def _split_part(series, sep, part, strip=False):
+    """``series.str.split(sep).str[part]``, computed once per distinct value."""
+    def split(value):
+        pieces = value.split(sep)
+        if len(pieces) <= part:
+            return np.nan
+        return pieces[part].strip() if strip else pieces[part]
+
+    return series.map({value: split(value) for value in series.dropna().unique()})
+
+
+def read_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the raw table in ``chunk_rows`` pieces from .xlsx, .csv or .parquet."""
+    path = Path(path)
+    if path.suffix == ".xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h) for h in next(rows)]
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunk_rows:
+                    yield _coerce(pd.DataFrame(batch, columns=header))
+                    batch = []
+            if batch:
+                yield _coerce(pd.DataFrame(batch, columns=header))
+        finally:
+            workbook.close()
+    elif path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _coerce(batch.to_pandas())
+    else:
+        dtype = defaultdict(lambda: str, {col: np.float64 for col in NUMERIC_COLUMNS})
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=dtype)
+
+
+def _coerce(chunk):
+    """Fixed dtypes per column, so every chunk (and every input format) agrees."""
+    chunk = chunk.reset_index(drop=True)
+    for col in chunk.columns:
+        if col in NUMERIC_COLUMNS:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype(np.float64)
+        else:
+            values = chunk[col].astype(object)
+            chunk[col] = values.map({v: str(v) for v in values.dropna().unique()})
+    return chunk
+
+
+def _clean(chunk):
+    """Column drops and string splits (notebook cells 10-14)."""
+    chunk = chunk.drop(columns=[c for c in DROP_COLUMNS if c in chunk.columns]).reset_index(drop=True)
+    if "city" in chunk:
+        chunk["city"] = _split_part(chunk["city"], "/", 0)
+    if "type_of_stations" in chunk:
+        chunk["type_of_stations"] = _split_part(chunk["type_of_stations"], ",", 0, strip=True)
+    if "who_region" in chunk:
+        chunk["who_region"] = _split_part(chunk["who_region"], "_", 1)
+    return chunk
+
+
+class FittedStats:
+    """Everything the transform pass needs, produced by ``fit``."""
+
+    def __init__(self):
+        self.medians = {}
+        self.clip_bounds = {}
+        self.first_category = {}
+        self.station_labels = []
+        self.city_counts = {}
+        self.pca_mean = None
+        self.pca_axis = None
+        self.scale_mean = {}
+        self.scale_std = {}
+        self.rows = 0
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "medians": self.medians,
+            "clip_bounds": self.clip_bounds,
+            "first_category": self.first_category,
+            "station_labels": self.station_labels,
+            "pca_mean": self.pca_mean.tolist() if self.pca_mean is not None else None,
+            "pca_axis": self.pca_axis.tolist() if self.pca_axis is not None else None,
+            "scale_mean": self.scale_mean,
+            "scale_std": self.scale_std,
+            "cities": len(self.city_counts),
+        }
+
+    def fill(self, chunk):
+        """Median fills, population clip and the derived pollution columns (cells 19-29)."""
+        for col, median in self.medians.items():
+            chunk[col] = chunk[col].fillna(median)
+        for col, (lower, upper) in self.clip_bounds.items():
+            chunk[col] = chunk[col].clip(lower=lower, upper=upper)
+        if self.pca_axis is not None:
+            chunk["pollution_index"] = (chunk[CONCENTRATIONS].to_numpy(np.float64) - self.pca_mean) @ self.pca_axis
+        if {"population", *CONCENTRATIONS} <= set(chunk.columns):
+            population = chunk["population"]
+            chunk["pollution_per_person"] = (chunk["pm10_concentration"] / population +
+                                             chunk["pm25_concentration"] / population +
+                                             chunk["no2_concentration"]) / population
+        return chunk
+
+
+def fit(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Run both statistics passes over ``path``."""
+    stats = FittedStats()
+
+    # Pass 1: medians, quartiles and categories
+    sketches = {}
+    missing = {}
+    categories = {col: set() for col in ONE_HOT_COLUMNS + ["type_of_stations"]}
+    city_counts = {}
+    for chunk in read_chunks(path, chunk_rows):
+        chunk = _clean(chunk)
+        stats.rows += len(chunk)
+        for col in FILL_COLUMNS:
+            if col in chunk:
+                sketches.setdefault(col, QuantileSketch()).add(chunk[col].to_numpy())
+                missing[col] = missing.get(col, 0) + int(chunk[col].isna().sum())
+        for col, seen in categories.items():
+            if col in chunk:
+                seen.update(chunk[col].dropna().unique())
+        if "city" in chunk:
+            for city, n in chunk["city"].value_counts(dropna=False).items():
+                city_counts[city] = city_counts.get(city, 0) + int(n)
+
+    for col, sketch in sketches.items():
+        stats.medians[col] = sketch.quantile(0.5)
+    for col in CLIP_COLUMNS:
+        if col in sketches:
+            # Quartiles of the column after the median fill
+            sketch = copy.deepcopy(sketches[col])
+            if missing[col]:
+                sketch.values = np.append(sketch.values, stats.medians[col])
+                sketch.weights = np.append(sketch.weights, float(missing[col]))
+            q1, q3 = sketch.quantile(0.25), sketch.quantile(0.75)
+            stats.clip_bounds[col] = (q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))
+    stats.first_category = {col: min(categories[col]) for col in ONE_HOT_COLUMNS if categories[col]}
+    stats.station_labels = sorted(categories["type_of_stations"])
+    stats.city_counts = city_counts
+
+    # Pass 2: PCA and scaler moments on filled, clipped values
+    from sklearn.preprocessing import StandardScaler
+
+    pca_moments = Moments(len(CONCENTRATIONS))
+    scaler = StandardScaler()
+    scaled = None
+    for chunk in read_chunks(path, chunk_rows):
+        chunk = stats.fill(_clean(chunk))
+        if set(CONCENTRATIONS) <= set(chunk.columns):
+            pca_moments.partial_fit(chunk[CONCENTRATIONS].to_numpy(np.float64))
+        scaled = [c for c in SCALE_COLUMNS if c in chunk.columns]
+        if len(chunk):
+            scaler.partial_fit(chunk[scaled].to_numpy(np.float64))
+
+    if pca_moments.n:
+        stats.pca_mean = pca_moments.mean
+        stats.pca_axis = principal_axis(pca_moments)
+    if scaled:
+        stats.scale_mean = dict(zip(scaled, scaler.mean_.tolist()))
+        stats.scale_std = dict(zip(scaled, scaler.scale_.tolist()))
+    if stats.pca_axis is not None:
+        # pollution_index is centered by construction; its variance is the
+        # explained variance with ddof=0, as StandardScaler would measure it
+        variance = float(stats.pca_axis @ (pca_moments.m2 / pca_moments.n) @ stats.pca_axis)
+        stats.scale_mean["pollution_index"] = 0.0
+        stats.scale_std["pollution_index"] = np.sqrt(variance) if variance > 0 else 1.0
+    return stats
+
+
+def _city_ranges(city_counts, bucket_rows):
+    """Upper-bound city of each spill bucket, cutting the sorted city list by row count."""
+    cities = sorted(c for c in city_counts if isinstance(c, str))
+    bounds, filled = [], 0
+    for city in cities:
+        filled += city_counts[city]
+        if filled >= bucket_rows:
+            bounds.append(city)
+            filled = 0
+    return bounds
+
+
+class _Spill:
+    """One Arrow stream per city range in a temporary directory."""
+
+    def __init__(self, directory, n_buckets):
+        self.directory = Path(directory)
+        self.paths = [self.directory / f"bucket-{i:05d}.arrow" for i in range(n_buckets)]
+        self.writers = [None] * n_buckets
+        self.schema = None
+
+    def write(self, bucket, frame):
+        import pyarrow as pa
+
+        if self.schema is None:
+            self.schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            self.schema = pa.schema([
+                pa.field(f.name, pa.string() if frame[f.name].dtype == object else f.type)
+                for f in self.schema
+            ])
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        if self.writers[bucket] is None:
+            self.writers[bucket] = pa.ipc.new_stream(str(self.paths[bucket]), self.schema)
+        self.writers[bucket].write_table(table)
+
+    def close(self):
+        for writer in self.writers:
+            if writer is not None:
+                writer.close()
+
+    def read(self, bucket):
+        import pyarrow as pa
+
+        if self.writers[bucket] is None:
+            return None
+        with pa.memory_map(str(self.paths[bucket]), "r") as source:
+            return pa.ipc.open_stream(source).read_all().to_pandas()
+
+
+def _backfill(chunk, carry, last_station, final):
+    """Backward-fill ``year``/``type_of_stations`` across chunk boundaries.
+
+    Rows whose next non-null value lies beyond this chunk are held back and
+    returned as the new carry.  On the final chunk, ``type_of_stations`` is
+    also forward-filled, as in cell 17.
+    """
+    if carry is not None:
+        chunk = pd.concat([carry, chunk], ignore_index=True)
+    columns = [c for c in BACKFILL_COLUMNS if c in chunk]
+    raw, chunk = chunk, chunk.copy()
+    for col in columns:
+        chunk[col] = chunk[col].bfill()
+    carry = None
+    if not final and columns:
+        # Rows up to the last value every column has are complete; the rest
+        # are held back unfilled and re-filled with the next chunk
+        resolved = min(raw[c].last_valid_index() if raw[c].notna().any() else -1 for c in columns)
+        if resolved < len(raw) - 1:
+            carry = raw.iloc[resolved + 1:]
+            chunk = chunk.iloc[:resolved + 1]
+    if "type_of_stations" in chunk:
+        if final:
+            chunk["type_of_stations"] = chunk["type_of_stations"].ffill()
+            if last_station is not None:
+                chunk["type_of_stations"] = chunk["type_of_stations"].fillna(last_station)
+        if chunk["type_of_stations"].notna().any():
+            last_station = chunk["type_of_stations"].dropna().iloc[-1]
+    return chunk, carry, last_station
+
+
+def _encode(chunk, stats):
+    """Label-encode station types and keep the first one-hot column (cell 35)."""
+    if "type_of_stations" in chunk:
+        chunk["type_of_stations"] = chunk["type_of_stations"].map(
+            {label: code for code, label in enumerate(stats.station_labels)}
+        ).astype(np.float64)
+    for col, first in stats.first_category.items():
+        chunk[col] = (chunk[col] == first).astype(np.float64)
+    return chunk
+
+
+def _finish(frame, stats):
+    """Sort a city range, add the yearly change, scale and append the raw name copies."""
+    frame = frame.sort_values(["city", "year"], kind="stable").reset_index(drop=True)
+    if "pollution_index" in frame:
+        frame["pollution_index_yearly_change"] = frame.groupby("city")["pollution_index"].diff().fillna(0)
+    for col, mean in stats.scale_mean.items():
+        frame[col] = (frame[col] - mean) / stats.scale_std[col]
+    if "country_name" in frame:
+        frame["country_name_raw"] = frame["country_name"]
+    if "city" in frame:
+        frame["city_raw"] = frame["city"]
+    if "year" in frame:
+        frame["year"] = frame["year"].astype("Int64")
+    return frame
+
+
+class PipelineResult:
+    def __init__(self, rows, seconds, stats):
+        self.rows = rows
+        self.seconds = seconds
+        self.stats = stats
+
+    def __repr__(self):
+        return f"PipelineResult(rows={self.rows:,}, seconds={self.seconds:.2f})"
+
+
+def transform(src, dst, stats, chunk_rows=DEFAULT_CHUNK_ROWS, bucket_rows=DEFAULT_BUCKET_ROWS, work_dir=None):
+    """Chunked transform pass writing the processed CSV to ``dst``."""
+    upper = np.array(_city_ranges(stats.city_counts, bucket_rows), dtype=object)
+    n_buckets = len(upper) + 2  # ranges + the tail range + rows without a city
+    tmp_dir = tempfile.mkdtemp(prefix="airsense-pipeline-", dir=work_dir)
+    spill = _Spill(tmp_dir, n_buckets)
+    try:
+        carry, last_station = None, None
+        chunks = read_chunks(src, chunk_rows)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            following = next(chunks, None)
+            cleaned, carry, last_station = _backfill(_clean(chunk), carry, last_station, following is None)
+            cleaned = _encode(stats.fill(cleaned), stats)
+            bucket = np.zeros(len(cleaned), dtype=np.int64)
+            if "city" in cleaned:
+                named = cleaned["city"].notna().to_numpy()
+                bucket[named] = np.searchsorted(upper, cleaned["city"].to_numpy()[named], side="left")
+                bucket[~named] = n_buckets - 1
+            for b in np.unique(bucket):
+                spill.write(int(b), cleaned[bucket == b])
+            chunk = following
+        spill.close()
+
+        dst = Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".tmp")
+        rows, header = 0, True
+        with open(tmp, "w", newline="") as out:
+            for b in range(n_buckets):
+                frame = spill.read(b)
+                if frame is None:
+                    continue
+                frame = _finish(frame, stats)
+                frame.to_csv(out, index=False, header=header)
+                rows += len(frame)
+                header = False
+        os.replace(tmp, dst)
+        return rows
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run(src=RAW_XLSX, dst=PROCESSED_CSV, chunk_rows=DEFAULT_CHUNK_ROWS, bucket_rows=DEFAULT_BUCKET_ROWS,
+        work_dir=None):
+    start = time.perf_counter()
+    stats = fit(src, chunk_rows)
+    rows = transform(src, dst, stats, chunk_rows, bucket_rows, work_dir)
+    return PipelineResult(rows, time.perf_counter() - start, stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocess a raw WHO air quality export")
+    parser.add_argument("src", nargs="?", default=str(RAW_XLSX), help=".xlsx, .csv or .parquet export")
+    parser.add_argument("dst", nargs="?", default=str(PROCESSED_CSV))
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--bucket-rows", type=int, default=DEFAULT_BUCKET_ROWS,
+                        help="rows per on-disk city range (bounds memory of the sort step)")
+    parser.add_argument("--work-dir", help="where to spill city ranges (default: system temp dir)")
+    parser.add_argument("--stats", help="also write the fitted statistics as JSON")
+    parser.add_argument("--stats-only", action="store_true",
+                        help="only fit and write --stats; leave dst untouched")
+    parser.add_argument("--snapshot", action="store_true", help="refresh the processed Arrow/Parquet snapshot")
+    args = parser.parse_args(argv)
+
+    if args.snapshot and Path(args.dst).resolve() != PROCESSED_CSV.resolve():
+        parser.error("--snapshot needs dst to be the app's processed CSV")
+    if args.stats_only:
+        if not args.stats:
+            parser.error("--stats-only needs --stats")
+        if args.snapshot:
+            parser.error("--stats-only does not write the processed table to snapshot")
+        Path(args.stats).write_text(json.dumps(fit(args.src, args.chunk_rows).to_dict(), indent=2) + "\n")
+        print(args.stats)
+        return
+
+    result = run(args.src, args.dst, args.chunk_rows, args.bucket_rows, args.work_dir)
+    print(result)
+    if args.stats:
+        Path(args.stats).write_text(json.dumps(result.stats.to_dict(), indent=2) + "\n")
+    if args.snapshot:
+        from airsense import snapshots
+
+        for path in snapshots.convert(["processed"]):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
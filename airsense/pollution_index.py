@@ -0,0 +1,37 @@
+"""Pollution index prediction and air-quality banding.
+
+The XGBoost index model was fitted on a DataFrame whose columns were ordered
+``pm10, no2, pm25``; ``predict_index`` reorders inputs to match the model
+instead of relying on positional order.
+"""
+import numpy as np
+
+INDEX_FEATURES = ["pm10_concentration", "pm25_concentration", "no2_concentration"]
+
+# Upper bounds of every band but the last; np.digitize maps values to 0..3
+INDEX_BANDS = np.array([50.0, 100.0, 150.0])
+INDEX_LABELS = np.array(["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy"])
+INDEX_COLORS = np.array(["#28a745", "#ffc107", "#fd7e14", "#dc3545"])
+
+
+def model_features(model):
+    names = getattr(model, "feature_names_in_", None)
+    return list(names) if names is not None else list(INDEX_FEATURES)
+
+
+def predict_index(model, features):
+    """Predict the index for a frame holding the ``INDEX_FEATURES`` columns.
+
+    A 2-D array is taken to be in ``INDEX_FEATURES`` order.
+    """
+    if isinstance(features, np.ndarray):
+        order = [INDEX_FEATURES.index(name) for name in model_features(model)]
+        X = np.asarray(features[:, order], dtype=np.float32)
+    else:
+        X = features[model_features(model)].to_numpy(dtype=np.float32)
+    return model.predict(X)
+
+
+def classify(values):
+    """Band code (0 = Good .. 3 = Unhealthy) for each predicted index."""
+    return np.digitize(values, INDEX_BANDS)
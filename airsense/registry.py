@@ -0,0 +1,320 @@
+"""Versioned model store with native, fast-loading formats.
+
+``python -m airsense.registry export`` converts the joblib pickles in
+``models/`` to formats that load without unpickling and do not depend on the
+library versions they were trained with:
+
+* XGBoost models -> the booster's own UBJSON file;
+* KMeans -> its centroids as ``.npy``;
+* DBSCAN -> its core samples as ``.npy`` plus ``eps`` (all the anomaly
+  scorer needs);
+* Isolation Forest -> the flattened node arrays of ``IsolationForestScorer``;
+* the severity label map -> JSON;
+* the Keras ``.h5`` LSTM forecaster -> its weight matrices as ``.npy``, run
+  by ``airsense.lstm.LSTMForecaster`` without TensorFlow.
+
+Files live in ``models/registry/<name>/<version>/``, where the version is a
+digest of their content.  ``manifest.json`` records, per artifact, the
+checksums and sizes of the files, the feature list, model parameters, the
+pickle it came from, the training data version and the library versions at
+export time.  Arrays are memory-mapped on load, so pages are only read when a
+prediction touches them.
+
+``airsense.loaders`` prefers a registry entry and falls back to the pickle when
+there is none or when the pickle changed after the export.
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+from importlib import metadata
+
+import numpy as np
+
+from airsense.cache import content_hash, file_signature, sources_version
+from airsense.config import MODEL_FILES, MODELS_DIR, PROCESSED_CSV
+
+REGISTRY_DIR = MODELS_DIR / "registry"
+MANIFEST = REGISTRY_DIR / "manifest.json"
+MANIFEST_FORMAT = 1
+
+ARTIFACT_KINDS = {
+    "xgb": "xgboost",
+    "xgb_forecast": "xgboost",
+    "kmeans": "centroids",
+    "severity_map": "label_map",
+    "dbscan": "core_samples",
+    "iforest": "isolation_forest",
+    "lstm": "lstm",
+}
+
+_LIBRARIES = ["numpy", "scikit-learn", "xgboost", "h5py"]
+
+
+class BoosterModel:
+    """``XGBRegressor.predict`` on a bare booster, without the sklearn wrapper."""
+
+    def __init__(self, booster, feature_names=None):
+        self.booster = booster
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object) if feature_names else None
+        self.n_features_in_ = booster.num_features()
+
+    def predict(self, X):
+        if hasattr(X, "columns") and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        return self.booster.inplace_predict(np.asarray(X, dtype=np.float32))
+
+
+class CentroidModel:
+    """``KMeans.predict`` from the centroids alone."""
+
+    def __init__(self, cluster_centers, feature_names=None):
+        self.cluster_centers_ = cluster_centers
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object) if feature_names else None
+        self._center_norms = np.einsum("ij,ij->i", cluster_centers, cluster_centers)
+
+    def predict(self, X, chunk_rows=65_536):
+        if hasattr(X, "columns") and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float64)
+        labels = np.empty(len(X), dtype=np.int32)
+        for start in range(0, len(X), chunk_rows):
+            chunk = X[start:start + chunk_rows]
+            # ||x - c||^2 up to the per-row constant ||x||^2, as in sklearn
+            labels[start:start + len(chunk)] = np.argmin(self._center_norms - 2.0 * chunk @ self.cluster_centers_.T,
+                                                         axis=1)
+        return labels
+
+
+def _source_path(name):
+    return MODELS_DIR / MODEL_FILES[name]
+
+
+def _feature_names(model):
+    names = getattr(model, "feature_names_in_", None)
+    return [str(n) for n in names] if names is not None else None
+
+
+def _library_versions():
+    versions = {"python": sys.version.split()[0]}
+    for lib in _LIBRARIES:
+        try:
+            versions[lib] = metadata.version(lib)
+        except metadata.PackageNotFoundError:
+            pass
+    return versions
+
+
+def _write_arrays(directory, arrays):
+    for role, array in arrays.items():
+        np.save(directory / f"{role}.npy", np.ascontiguousarray(array))
+    return [f"{role}.npy" for role in arrays]
+
+
+def _export_files(name, source, directory):
+    """Write the native files for ``name`` into ``directory``; return (files, features, params)."""
+    kind = ARTIFACT_KINDS[name]
+    if kind == "lstm":
+        from airsense.forecast import FORECAST_FEATURES
+        from airsense.lstm import LSTMForecaster
+
+        model = LSTMForecaster.from_h5(source)
+        files = _write_arrays(directory, model.arrays())
+        return files, FORECAST_FEATURES, model.params()
+
+    import joblib
+
+    model = joblib.load(source)
+    if kind == "xgboost":
+        booster = model.get_booster()
+        booster.save_model(str(directory / "model.ubj"))
+        features = _feature_names(model) or booster.feature_names
+        return ["model.ubj"], features, {"n_features": booster.num_features(),
+                                         "rounds": booster.num_boosted_rounds()}
+    if kind == "centroids":
+        files = _write_arrays(directory, {"cluster_centers": model.cluster_centers_})
+        return files, _feature_names(model), {"n_clusters": int(len(model.cluster_centers_))}
+    if kind == "label_map":
+        (directory / "labels.json").write_text(json.dumps({str(k): v for k, v in model.items()}, indent=2))
+        return ["labels.json"], None, {}
+    if kind == "core_samples":
+        files = _write_arrays(directory, {"core_samples": model.components_})
+        return files, _feature_names(model), {"eps": float(model.eps), "min_samples": int(model.min_samples),
+                                              "metric": model.metric, "n_core": int(len(model.components_))}
+    if kind == "isolation_forest":
+        from airsense.anomaly import IsolationForestScorer
+
+        scorer = IsolationForestScorer.from_model(model)
+        files = _write_arrays(directory, scorer.arrays())
+        return files, _feature_names(model), {"max_depth": scorer.max_depth, "max_samples": scorer.max_samples,
+                                              "offset": scorer.offset, "n_trees": int(len(scorer.roots))}
+    raise ValueError(f"unknown artifact kind {kind!r}")
+
+
+def read_manifest():
+    if not MANIFEST.exists():
+        return {"format": MANIFEST_FORMAT, "artifacts": {}}
+    return json.loads(MANIFEST.read_text())
+
+
+def _write_manifest(manifest):
+    tmp = MANIFEST.with_name(MANIFEST.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    os.replace(tmp, MANIFEST)
+
+
+def export(names=None, data_path=PROCESSED_CSV):
+    """Convert ``names`` (default: every model with a source file) and record them in the manifest."""
+    manifest = read_manifest()
+    data_version = content_hash(data_path) if data_path and os.path.exists(data_path) else None
+    exported = []
+    for name in names or ARTIFACT_KINDS:
+        source = _source_path(name)
+        if not source.exists():
+            continue
+        staging = REGISTRY_DIR / name / ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        files, features, params = _export_files(name, source, staging)
+
+        checksums = {f: content_hash(staging / f) for f in files}
+        version = sources_version([staging / f for f in files])
+        target = REGISTRY_DIR / name / version
+        if target.exists():
+            shutil.rmtree(staging)
+        else:
+            os.replace(staging, target)
+
+        mtime_ns, size = file_signature(source)
+        record = {
+            "kind": ARTIFACT_KINDS[name],
+            "version": version,
+            "files": {f: {"blake2b": checksums[f], "bytes": (target / f).stat().st_size} for f in files},
+            "features": features,
+            "params": params,
+            "source": {"file": source.name, "blake2b": content_hash(source), "mtime_ns": mtime_ns, "bytes": size},
+            "data_version": data_version,
+            "libraries": _library_versions(),
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        history = manifest["artifacts"].get(name, {}).get("history", [])
+        record["history"] = [v for v in history if v != version] + [version]
+        manifest["artifacts"][name] = record
+        exported.append((name, record))
+
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    _write_manifest(manifest)
+    return exported
+
+
+def entry(name, manifest=None):
+    """Manifest entry for ``name`` if it is usable, else None.
+
+    An entry is skipped when its files are missing or the pickle it was
+    exported from has changed since (a retrained model not yet re-exported).
+    """
+    manifest = manifest if manifest is not None else read_manifest()
+    found = manifest.get("artifacts", {}).get(name)
+    if found is None:
+        return None
+    directory = REGISTRY_DIR / name / found["version"]
+    for f, info in found["files"].items():
+        path = directory / f
+        if not path.exists() or path.stat().st_size != info["bytes"]:
+            return None
+    source = _source_path(name)
+    if source.exists() and file_signature(source) != (found["source"]["mtime_ns"], found["source"]["bytes"]):
+        if content_hash(source) != found["source"]["blake2b"]:
+            return None
+    return found
+
+
+def artifact_paths(name, found):
+    directory = REGISTRY_DIR / name / found["version"]
+    return [directory / f for f in found["files"]]
+
+
+def verify(name, found):
+    """Names of files whose checksum no longer matches the manifest."""
+    directory = REGISTRY_DIR / name / found["version"]
+    return [f for f, info in found["files"].items() if content_hash(directory / f) != info["blake2b"]]
+
+
+def _array(directory, role):
+    return np.load(directory / f"{role}.npy", mmap_mode="r")
+
+
+def load(name, found):
+    """Object the app uses for ``name``, built from the registry files.
+
+    Models for ``xgb``, ``xgb_forecast``, ``kmeans``, ``severity_map`` and
+    ``lstm``; scorers for ``dbscan`` and ``iforest``.
+    """
+    directory = REGISTRY_DIR / name / found["version"]
+    kind, params = found["kind"], found["params"]
+    if kind == "xgboost":
+        import xgboost as xgb
+
+        booster = xgb.Booster()
+        booster.load_model(str(directory / "model.ubj"))
+        return BoosterModel(booster, found["features"])
+    if kind == "centroids":
+        return CentroidModel(np.asarray(_array(directory, "cluster_centers")), found["features"])
+    if kind == "label_map":
+        return {int(k): v for k, v in json.loads((directory / "labels.json").read_text()).items()}
+    if kind == "core_samples":
+        from airsense.anomaly import CoreSampleScorer
+
+        return CoreSampleScorer(_array(directory, "core_samples"), params["eps"])
+    if kind == "isolation_forest":
+        from airsense.anomaly import IsolationForestScorer
+
+        arrays = {role: _array(directory, role) for role in IsolationForestScorer.ARRAYS}
+        return IsolationForestScorer(**arrays, max_depth=params["max_depth"],
+                                     max_samples=params["max_samples"], offset=params["offset"])
+    if kind == "lstm":
+        from airsense.lstm import LSTMForecaster
+
+        arrays = {role: np.asarray(_array(directory, role)) for role in LSTMForecaster.ARRAYS}
+        return LSTMForecaster(**arrays, activation=params["activation"],
+                              recurrent_activation=params["recurrent_activation"],
+                              dense_activation=params["dense_activation"])
+    raise ValueError(f"unknown artifact kind {kind!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the AirSense model registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="convert pickles to native formats and record them")
+    export_cmd.add_argument("names", nargs="*", help=f"models: {', '.join(ARTIFACT_KINDS)} (default: all)")
+    export_cmd.add_argument("--data", default=str(PROCESSED_CSV), help="training data to record the version of")
+    sub.add_parser("list", help="show the current entries")
+    sub.add_parser("verify", help="re-hash every registered file")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        unknown = set(args.names) - set(ARTIFACT_KINDS)
+        if unknown:
+            parser.error(f"unknown model(s): {', '.join(sorted(unknown))}")
+        for name, found in export(args.names or None, args.data):
+            size = sum(info["bytes"] for info in found["files"].values())
+            print(f"{name:<13} {found['kind']:<17} {found['version']}  {size / 1e6:.2f} MB")
+        return
+
+    manifest = read_manifest()
+    failed = False
+    for name, found in sorted(manifest["artifacts"].items()):
+        if args.command == "list":
+            usable = "ok" if entry(name, manifest) is not None else "stale"
+            print(f"{name:<13} {found['kind']:<17} {found['version']}  {found['created']}  {usable}")
+        else:
+            bad = verify(name, found)
+            failed = failed or bool(bad)
+            print(f"{name:<13} {'CHECKSUM MISMATCH: ' + ', '.join(bad) if bad else 'ok'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Headless inference service.
+
+``InferenceService`` loads the models once and puts a ``MicroBatcher`` in
+front of each one.  Requests from many threads are queued and drained into a
+single vectorized ``predict`` call as soon as ``max_batch`` rows are waiting or
+the oldest request has waited ``max_wait_ms``.  ``serve`` exposes the service
+over HTTP on localhost:
+
+    python -m airsense.service --port 8600 --max-wait-ms 5 --stats stats.json
+
+    POST /predict/index     {"pm10_concentration": 40, "pm25_concentration": 22, "no2_concentration": 18}
+    POST /predict/severity  {... SEVERITY_FEATURES ...}
+    POST /predict/anomaly   {... ANOMALY_FEATURES ...}
+    GET  /metrics           latency percentiles and batch-size histogram
+
+``/predict/index`` takes raw concentrations in µg/m³ and answers in index
+units, where the air-quality bands apply.  The index model was fitted on the
+processed table's standardized columns, so the service needs the pipeline's
+``ReadingScaler`` (``--stats``, default ``AIRSENSE_PIPELINE_STATS``) to
+convert both ways.  The KMeans and anomaly models were fitted on the same
+table and are served as-is: ``/predict/severity`` and ``/predict/anomaly``
+take rows as they appear in ``processed_data.csv`` (standardized
+concentrations and ``pollution_index``, raw latitude and longitude), not raw
+readings.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from airsense.anomaly import ANOMALY_FEATURES
+from airsense.pollution_index import INDEX_FEATURES, INDEX_LABELS, classify
+from airsense.severity import SEVERITY_FEATURES
+
+_LATENCY_WINDOW = 10_000
+REQUEST_TIMEOUT_S = 10.0
+
+
+class LatencyStats:
+    """Recent request latencies and a power-of-two batch-size histogram."""
+
+    def __init__(self, window=_LATENCY_WINDOW):
+        self._latencies = deque(maxlen=window)
+        self._batches = Counter()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def record_batch(self, size, latencies):
+        bucket = 1 << (size - 1).bit_length()
+        with self._lock:
+            self._batches[bucket] += 1
+            self._latencies.extend(latencies)
+            self.requests += size
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+            batches = dict(sorted(self._batches.items()))
+            requests = self.requests
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        return {
+            "requests": requests,
+            "p50_ms": round(p50 * 1e3, 3),
+            "p99_ms": round(p99 * 1e3, 3),
+            "batch_size_histogram": {f"<={k}": v for k, v in batches.items()},
+            "mean_batch_size": round(requests / max(sum(batches.values()), 1), 2),
+        }
+
+
+class MicroBatcher:
+    """Coalesce single-row requests into batched calls of ``fn(X) -> sequence``."""
+
+    def __init__(self, fn, max_batch=256, max_wait_ms=5.0, name="batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=np.float64), time.perf_counter(), future))
+        return future
+
+    def __call__(self, row, timeout=None):
+        return self.submit(row).result(timeout)
+
+    def _drain(self):
+        items = [self._queue.get()]
+        deadline = items[0][1] + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            X = np.vstack([row for row, _, _ in items])
+            try:
+                results = self.fn(X)
+            except Exception as exc:
+                for _, _, future in items:
+                    future.set_exception(exc)
+                continue
+            done = time.perf_counter()
+            for (_, _, future), result in zip(items, results):
+                future.set_result(result)
+            self.stats.record_batch(len(items), [done - submitted for _, submitted, _ in items])
+
+
+class InferenceService:
+    """Index, severity and anomaly predictors behind per-model micro-batchers."""
+
+    def __init__(self, models=None, scorers=None, scaler=None, max_batch=256, max_wait_ms=5.0):
+        if models is None:
+            from airsense.loaders import load_models
+
+            models = load_models("xgb", "kmeans", "severity_map")
+        if scorers is None:
+            from airsense.loaders import load_anomaly_scorers
+
+            scorers = load_anomaly_scorers()
+        if scaler is None:
+            from airsense.loaders import require_reading_scaler
+
+            scaler = require_reading_scaler()
+        self.models = models
+        self.scorers = scorers
+        self.scaler = scaler
+        self.features = {
+            "index": INDEX_FEATURES,
+            "severity": SEVERITY_FEATURES,
+            "anomaly": ANOMALY_FEATURES,
+        }
+        handlers = {
+            "index": self._predict_index,
+            "severity": self._predict_severity,
+            "anomaly": self._predict_anomaly,
+        }
+        self.batchers = {
+            kind: MicroBatcher(handler, max_batch, max_wait_ms, name=f"batch-{kind}")
+            for kind, handler in handlers.items()
+        }
+
+    def _predict_index(self, X):
+        pred = self.scaler.predict_index(self.models["xgb"], X)
+        labels = INDEX_LABELS[classify(pred)]
+        return [{"pollution_index": float(p), "air_quality": str(l)} for p, l in zip(pred, labels)]
+
+    def _predict_severity(self, X):
+        import pandas as pd
+
+        clusters = self.models["kmeans"].predict(pd.DataFrame(X, columns=SEVERITY_FEATURES))
+        label_map = self.models["severity_map"]
+        return [{"cluster": int(c), "severity": label_map.get(int(c))} for c in clusters]
+
+    def _predict_anomaly(self, X):
+        dbscan = self.scorers["dbscan"].is_anomaly(X)
+        iso_scores = self.scorers["iforest"].score_samples(X)
+        iso = iso_scores < self.scorers["iforest"].offset
+        return [
+            {"is_anomaly_dbscan": bool(d), "is_anomaly_iso": bool(i), "iso_score": float(s)}
+            for d, i, s in zip(dbscan, iso, iso_scores)
+        ]
+
+    def row(self, kind, record):
+        """Feature values of one record (a mapping of feature name to value) for ``kind``."""
+        features = self.features[kind]
+        missing = [name for name in features if name not in record]
+        if missing:
+            raise ValueError(f"missing feature(s): {', '.join(missing)}")
+        return [float(record[name]) for name in features]
+
+    def predict(self, kind, record, timeout=REQUEST_TIMEOUT_S):
+        """Score one record; raises ``concurrent.futures.TimeoutError`` after ``timeout`` seconds."""
+        return self.batchers[kind](self.row(kind, record), timeout)
+
+    def metrics(self):
+        return {kind: batcher.stats.snapshot() for kind, batcher in self.batchers.items()}
+
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without TCP_NODELAY the
+        # body waits on the client's delayed ACK (~40 ms per request)
+        disable_nagle_algorithm = True
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send(200, service.metrics())
+            elif self.path == "/health":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            kind = self.path.rsplit("/", 1)[-1]
+            if not self.path.startswith("/predict/") or kind not in service.batchers:
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                row = service.row(kind, json.loads(self.rfile.read(length)))
+            except (ValueError, TypeError) as exc:
+                self._send(400, {"error": str(exc)})
+                return
+            # Model errors come back through the batcher's future, whatever their type
+            try:
+                self._send(200, service.batchers[kind](row, REQUEST_TIMEOUT_S))
+            except FutureTimeout:
+                self._send(503, {"error": "prediction timed out"})
+            except Exception as exc:
+                self._send(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8600, service=None, **options):
+    """Build the HTTP server (call ``serve_forever`` on the result).
+
+    ``options`` go to ``InferenceService`` when no ``service`` is given.
+    """
+    service = service or InferenceService(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve AirSense models over HTTP with request micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--stats", help="pipeline --stats JSON (default: AIRSENSE_PIPELINE_STATS)")
+    args = parser.parse_args(argv)
+
+    from airsense.loaders import require_reading_scaler
+
+    try:
+        scaler = require_reading_scaler(args.stats)
+    except ValueError as e:
+        parser.error(str(e))
+    server = serve(args.host, args.port, scaler=scaler, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"AirSense inference service on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
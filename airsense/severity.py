@@ -0,0 +1,56 @@
+"""Batch severity classification for every city-year.
+
+The KMeans model is applied to the whole processed feature matrix in one
+``predict`` call.  Row ``i`` of the resulting table corresponds to row ``i`` of
+the processed data, so positions from ``CityIndex.rows`` index it directly.
+"""
+import numpy as np
+import pandas as pd
+
+SEVERITY_FEATURES = ["pm10_concentration", "pm25_concentration", "no2_concentration", "pollution_per_person"]
+SEVERITY_LEVELS = ["Low", "Moderate", "High", "Critical"]
+SEVERITY_COLORS = {
+    "Low": "#28a745",
+    "Moderate": "#ffc107",
+    "High": "#fd7e14",
+    "Critical": "#dc3545",
+}
+
+
+def build_severity_table(df, kmeans, label_map):
+    """``country_name, city, year, cluster, severity`` for every row of ``df``.
+
+    Rows with missing features get cluster -1 and no severity.
+    """
+    features = df[SEVERITY_FEATURES]
+    valid = features.notna().all(axis=1).to_numpy()
+
+    clusters = np.full(len(df), -1, dtype=np.int16)
+    if valid.any():
+        # The centroids are float64; the compact processed table stores float32
+        clusters[valid] = kmeans.predict(features[valid].astype(np.float64))
+
+    # The trailing None is what cluster -1 indexes
+    lookup = np.array([label_map.get(c) for c in range(len(kmeans.cluster_centers_))] + [None], dtype=object)
+    severity = pd.Categorical(lookup[clusters], categories=SEVERITY_LEVELS, ordered=True)
+
+    return pd.DataFrame({
+        "country_name": df["country_name"].reset_index(drop=True),
+        "city": df["city"].reset_index(drop=True),
+        "year": df["year"].reset_index(drop=True),
+        "cluster": clusters,
+        "severity": severity,
+    })
+
+
+def severity_distribution(table):
+    """Row count per severity level, in severity order."""
+    return table["severity"].value_counts(sort=False).reindex(SEVERITY_LEVELS, fill_value=0)
+
+
+if __name__ == "__main__":
+    from airsense.loaders import load_severity_table
+
+    table = load_severity_table()
+    print(f"{len(table):,} city-years classified")
+    print(severity_distribution(table).to_string())
@@ -0,0 +1,170 @@
+"""Columnar snapshots of the raw and processed tables.
+
+``python -m airsense.snapshots`` converts the WHO workbook and the processed
+CSVs into typed Arrow IPC files (uncompressed, so they can be memory-mapped
+without a copy) and zstd Parquet files under ``data/snapshots``.  ``read``
+prefers the Arrow file, then Parquet, and falls back to the original CSV/XLSX
+when no up-to-date snapshot exists.  Only the requested columns are
+materialized.
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from airsense.config import ANOMALIES_CSV, DATA_DIR, PROCESSED_CSV, RAW_XLSX
+
+SNAPSHOT_DIR = DATA_DIR / "snapshots"
+
+# Record batch size of written Arrow snapshots, so they can be read in pieces
+BATCH_ROWS = 65_536
+
+SOURCES = {
+    "raw": RAW_XLSX,
+    "processed": PROCESSED_CSV,
+    "anomalies": ANOMALIES_CSV,
+}
+
+
+def snapshot_path(name, fmt):
+    return SNAPSHOT_DIR / f"{name}.{fmt}"
+
+
+def _is_fresh(snapshot, source):
+    if not snapshot.exists():
+        return False
+    return not source.exists() or snapshot.stat().st_mtime_ns >= source.stat().st_mtime_ns
+
+
+def source_path(name):
+    """The file ``read(name)`` will load from."""
+    source = SOURCES[name]
+    for fmt in ("arrow", "parquet"):
+        path = snapshot_path(name, fmt)
+        if _is_fresh(path, source):
+            return path
+    return source
+
+
+def _read_source(path, columns=None):
+    if path.suffix == ".xlsx":
+        return pd.read_excel(path, usecols=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def read(name, columns=None):
+    path = source_path(name)
+    columns = list(columns) if columns is not None else None
+
+    if path.suffix == ".arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            return table.to_pandas()
+
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    return _read_source(path, columns)
+
+
+def iter_chunks(name, columns=None, chunk_rows=BATCH_ROWS):
+    """Yield ``read(name, columns)`` in row order, at most ``chunk_rows`` rows at a time.
+
+    Files are read with ordinary reads rather than a memory map, so memory use
+    is bounded by the chunk (or, for Arrow, the snapshot's record batch) size.
+    """
+    path = source_path(name)
+    columns = list(columns) if columns is not None else None
+
+    if path.suffix == ".arrow":
+        import pyarrow as pa
+
+        with pa.OSFile(str(path), "rb") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+    elif path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif path.suffix == ".xlsx":
+        df = _read_source(path, columns)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def _typed(df):
+    df = df.copy()
+    if "year" in df.columns:
+        df["year"] = df["year"].astype("Int64")
+    for col in df.columns:
+        if df[col].dtype == object:
+            # Mixed str/float columns (city names with NaN) become nullable strings
+            df[col] = df[col].astype("string")
+    return df
+
+
+def _atomic_write(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def convert(names=None, formats=("arrow", "parquet")):
+    """Write snapshots for ``names`` (default: every source that exists)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name in names or SOURCES:
+        source = SOURCES[name]
+        if not source.exists():
+            continue
+        table = pa.Table.from_pandas(_typed(_read_source(source)), preserve_index=False)
+
+        if "arrow" in formats:
+            def write_arrow(tmp):
+                with pa.OSFile(str(tmp), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table, max_chunksize=BATCH_ROWS)
+
+            _atomic_write(snapshot_path(name, "arrow"), write_arrow)
+            written.append(snapshot_path(name, "arrow"))
+        if "parquet" in formats:
+            _atomic_write(
+                snapshot_path(name, "parquet"),
+                lambda tmp: pq.write_table(table, tmp, compression="zstd"),
+            )
+            written.append(snapshot_path(name, "parquet"))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert AirSense tables to Arrow/Parquet snapshots")
+    parser.add_argument("names", nargs="*", help=f"tables to convert: {', '.join(SOURCES)} (default: all)")
+    parser.add_argument("--format", action="append", choices=["arrow", "parquet"], dest="formats")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(SOURCES)
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(sorted(unknown))}")
+
+    for path in convert(args.names or None, tuple(args.formats or ("arrow", "parquet"))):
+        print(f"{path}  {path.stat().st_size / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Compact, shared, read-only copies of the processed tables.
+
+Every page reads slices of ``processed_data.csv``.  The Anomaly and Analytics
+views also read ``processed_with_anomalies.csv``, which is the same table plus
+four model columns.  ``CompactTable`` holds each table once per process:
+
+* names and the region/country columns as categoricals (``int16`` codes
+  instead of a Python string per row);
+* measurements as float32 (coordinates stay float64 for the map grid);
+* integers downcast to the narrowest type that fits;
+* boolean flags bit-packed, eight rows per byte.
+
+A table built with ``base=`` reuses the base's stored column for every column
+whose values are identical, so the anomaly table only stores its model
+columns.
+
+``frame(columns)`` wraps the stored arrays in a DataFrame without copying
+them; only bit-packed flags are unpacked, and only when requested.  The arrays
+are read-only and shared by every session, so do not modify them in place.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = ["city", "country_name", "iso3", "who_region", "city_raw", "country_name_raw"]
+FLOAT64_COLUMNS = ["latitude", "longitude"]
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class PackedFlags:
+    """Boolean column stored as ``np.packbits`` output."""
+
+    __slots__ = ("bits", "n")
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=bool)
+        self.bits = np.packbits(values)
+        self.bits.flags.writeable = False
+        self.n = len(values)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def count(self):
+        """Number of set flags, counted on the packed bytes."""
+        # packbits zero-pads the last byte, so padding never counts
+        return int(_POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def to_numpy(self):
+        return np.unpackbits(self.bits, count=self.n).view(bool)
+
+    def equals(self, other):
+        return isinstance(other, PackedFlags) and self.n == other.n and np.array_equal(self.bits, other.bits)
+
+
+def _readonly(values):
+    values.flags.writeable = False
+    return values
+
+
+def compact_column(name, series):
+    """Stored form of one column: ``pd.Categorical``, ``PackedFlags`` or a read-only array."""
+    dtype = series.dtype
+    if name in CATEGORY_COLUMNS or dtype == object or pd.api.types.is_string_dtype(dtype):
+        return pd.Categorical(series)
+    if pd.api.types.is_bool_dtype(dtype) and not series.isna().any():
+        return PackedFlags(series.to_numpy(dtype=bool))
+    if pd.api.types.is_float_dtype(dtype):
+        return _readonly(series.to_numpy(dtype=np.float64 if name in FLOAT64_COLUMNS else np.float32))
+    if pd.api.types.is_integer_dtype(dtype) and not series.isna().any():
+        return _readonly(pd.to_numeric(series.to_numpy(dtype=np.int64), downcast="integer"))
+    return series.array
+
+
+def _same(a, b):
+    if isinstance(a, pd.Categorical) or isinstance(b, pd.Categorical):
+        return (isinstance(a, pd.Categorical) and isinstance(b, pd.Categorical)
+                and a.categories.equals(b.categories) and np.array_equal(a.codes, b.codes))
+    if isinstance(a, PackedFlags):
+        return a.equals(b)
+    if isinstance(b, PackedFlags) or a.dtype != b.dtype or a.shape != b.shape:
+        return False
+    if not isinstance(a, np.ndarray):
+        return pd.Series(a).equals(pd.Series(b))
+    return np.array_equal(a, b, equal_nan=a.dtype.kind == "f")
+
+
+def _nbytes(column):
+    if isinstance(column, pd.Categorical):
+        return column.codes.nbytes + column.categories.memory_usage(deep=True)
+    return column.nbytes
+
+
+class CompactTable:
+    def __init__(self, columns, n_rows, shared=()):
+        self._columns = columns
+        self.n_rows = n_rows
+        self.shared = frozenset(shared)
+
+    @classmethod
+    def from_frame(cls, df, base=None):
+        """Compact ``df``; columns equal to ``base``'s (same rows, same values) are shared with it."""
+        aligned = base is not None and len(base) == len(df)
+        columns, shared = {}, []
+        for name in df.columns:
+            column = compact_column(name, df[name])
+            if aligned and name in base._columns and _same(column, base._columns[name]):
+                column = base._columns[name]
+                shared.append(name)
+            columns[name] = column
+        return cls(columns, len(df), shared)
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def count(self, flag):
+        """Number of True values in the boolean column ``flag``."""
+        column = self._columns[flag]
+        return column.count() if isinstance(column, PackedFlags) else int(np.count_nonzero(column))
+
+    def frame(self, columns=None):
+        """DataFrame view of ``columns`` (all by default) over the stored arrays."""
+        names = list(self._columns) if columns is None else list(columns)
+        missing = [name for name in names if name not in self._columns]
+        if missing:
+            raise KeyError(f"columns not in table: {missing}")
+        data = {}
+        for name in names:
+            column = self._columns[name]
+            data[name] = column.to_numpy() if isinstance(column, PackedFlags) else column
+        return pd.DataFrame(data, index=pd.RangeIndex(self.n_rows), copy=False)
+
+    def memory_usage(self):
+        """Bytes held per column; columns shared with a base table count as 0."""
+        return pd.Series({
+            name: 0 if name in self.shared else _nbytes(column) for name, column in self._columns.items()
+        }, dtype=np.int64)
@@ -0,0 +1,68 @@
+"""Per-city yearly series for the Yearly Trend Forecast page.
+
+``CitySeries`` stores one value column sorted by (city, year), with an
+``offsets`` array as in a CSR matrix: city ``i``'s rows are
+``offsets[i]:offsets[i + 1]``.  A city's years and values are then views into
+two arrays, so switching cities costs a dict probe and two slices however
+large the table is.  The sorted city list and the summary statistics shown
+under the chart are computed once at build time.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CitySeries:
+    def __init__(self, cities, offsets, years, values, stats):
+        self.cities = cities
+        self.offsets = offsets
+        self.years = years
+        self.values = values
+        self._stats = stats
+        self._position = {city: i for i, city in enumerate(cities)}
+        for array in (offsets, years, values):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, df, value="pollution_index"):
+        """Index ``df[value]`` by ``df["city"]`` and ``df["year"]``; rows without a city are left out."""
+        city = pd.Categorical(df["city"])
+        # Categoricals sort their categories, so codes follow the sorted names
+        names = np.asarray(city.categories, dtype=object)
+        codes = np.asarray(city.codes, dtype=np.int64)
+        year = df["year"]
+        years = year.to_numpy(dtype=np.float64, na_value=np.nan) if year.isna().any() else year.to_numpy()
+        values = df[value].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        keep = codes >= 0
+        codes, years, values = codes[keep], years[keep], values[keep]
+        # Stable, with missing years last, as ``sort_values("year")`` within a city
+        order = np.lexsort((years, codes))
+        codes, years, values = codes[order], np.ascontiguousarray(years[order]), values[order]
+
+        counts = np.bincount(codes, minlength=len(names))
+        present = counts > 0
+        offsets = np.concatenate([[0], np.cumsum(counts[present])]).astype(np.int64)
+        stats = pd.Series(values).groupby(codes).agg(["mean", "max", "min", "std"])
+        return cls(list(names[present]), offsets, years, values, stats.to_numpy())
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __contains__(self, city):
+        return city in self._position
+
+    def series(self, city):
+        """``(years, values)`` of ``city`` in year order; empty arrays for an unknown city."""
+        i = self._position.get(city)
+        if i is None:
+            return self.years[:0], self.values[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.years[start:end], self.values[start:end]
+
+    def stats(self, city):
+        """``{"mean", "max", "min", "std"}`` of ``city``'s values (NaN-skipping, sample std)."""
+        i = self._position.get(city)
+        if i is None:
+            return dict.fromkeys(["mean", "max", "min", "std"], np.nan)
+        mean, high, low, std = self._stats[i]
+        return {"mean": mean, "max": high, "min": low, "std": std}
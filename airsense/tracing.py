@@ -0,0 +1,297 @@
+"""Per-stage timings for the app pages.
+
+Tracing is off unless ``AIRSENSE_TRACE`` is set.  While it is off, ``span()``
+returns a shared no-op object, so a wrapped stage costs one function call.
+
+    AIRSENSE_TRACE=1        wall time and rows per stage
+    AIRSENSE_TRACE=memory   also the tracemalloc peak over each stage; this
+                            slows allocation-heavy code, so use it to profile
+                            and not in production
+
+``begin_run(page, session)`` at the top of ``app.py`` counts reruns per
+session, and tags the spans that follow with the page.  Each finished span is
+added to per-(page, stage) totals.  Those totals can be exported three ways:
+
+* ``AIRSENSE_TRACE_FILE``: every span is appended to this file as a JSON line;
+* ``AIRSENSE_TRACE_PROM``: the totals are written here in Prometheus text
+  format after every rerun (for node_exporter's textfile collector);
+* ``AIRSENSE_TRACE_PORT``: ``GET /metrics`` on this port returns the same
+  Prometheus text.
+
+    with tracing.span("severity.lookup") as s:
+        history = ...
+        s.rows = len(history)
+
+Memory peaks come from the process-wide tracemalloc counter.  When several
+sessions run at once, a stage's peak can include allocations made by other
+threads during that stage.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_MAX_SESSIONS = 1000
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _StageStats:
+    __slots__ = ("count", "seconds", "max_seconds", "rows", "peak_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.peak_bytes = 0
+
+
+class Span:
+    """One timed stage; set ``rows`` inside the block to record throughput."""
+
+    __slots__ = ("tracer", "stage", "rows", "start", "mem_start", "mem_peak")
+
+    def __init__(self, tracer, stage):
+        self.tracer = tracer
+        self.stage = stage
+        self.rows = None
+
+    def __enter__(self):
+        if self.tracer.memory:
+            self.mem_start = self.tracer._push(self)
+            self.mem_peak = self.mem_start
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.tracer.memory:
+            self.tracer._pop()
+            peak = self.mem_peak - self.mem_start
+        self.tracer._record(self, seconds, peak, exc_type)
+        return False
+
+
+class Tracer:
+    """Collects spans from every session of the server process."""
+
+    def __init__(self, memory=False, trace_file=None, prom_file=None):
+        self.memory = memory
+        self.prom_file = prom_file
+        self._log = open(trace_file, "a", buffering=1) if trace_file else None
+        self._stats = {}
+        self._runs = Counter()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin_run(self, page, session=None):
+        """Start a script run for ``session``; return its rerun number."""
+        with self._lock:
+            self._runs[page] += 1
+            rerun = self._sessions.pop(session, 0) + 1
+            self._sessions[session] = rerun
+            if len(self._sessions) > _MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        local = self._local
+        local.page, local.session, local.rerun = page, session, rerun
+        return rerun
+
+    def end_run(self):
+        if self.prom_file:
+            tmp = f"{self.prom_file}.tmp"
+            with open(tmp, "w") as fh:
+                fh.write(self.prometheus_text())
+            os.replace(tmp, self.prom_file)
+
+    def span(self, stage):
+        return Span(self, stage)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _lift(self, stack):
+        # tracemalloc keeps a single peak, so before it is reset the peak so
+        # far is credited to every stage still open on this thread
+        current, peak = tracemalloc.get_traced_memory()
+        for open_span in stack:
+            open_span.mem_peak = max(open_span.mem_peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def _push(self, span):
+        stack = self._stack()
+        current = self._lift(stack)
+        stack.append(span)
+        return current
+
+    def _pop(self):
+        stack = self._stack()
+        self._lift(stack)
+        stack.pop()
+
+    def _record(self, span, seconds, peak, exc_type):
+        local = self._local
+        page = getattr(local, "page", None)
+        with self._lock:
+            stats = self._stats.get((page, span.stage))
+            if stats is None:
+                stats = self._stats[(page, span.stage)] = _StageStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if span.rows is not None:
+                stats.rows += span.rows
+            if peak is not None:
+                stats.peak_bytes = max(stats.peak_bytes, peak)
+            if self._log is not None:
+                record = {
+                    "ts": round(time.time(), 3), "session": getattr(local, "session", None),
+                    "rerun": getattr(local, "rerun", None), "page": page, "stage": span.stage,
+                    "seconds": round(seconds, 6), "rows": span.rows,
+                }
+                if peak is not None:
+                    record["peak_bytes"] = peak
+                if exc_type is not None:
+                    record["error"] = exc_type.__name__
+                self._log.write(json.dumps(record) + "\n")
+
+    def snapshot(self):
+        """Per-stage totals as a list of dicts, slowest total first."""
+        with self._lock:
+            rows = [
+                {"page": page, "stage": stage, "count": s.count, "seconds": s.seconds,
+                 "mean_ms": s.seconds / s.count * 1e3, "max_ms": s.max_seconds * 1e3, "rows": s.rows,
+                 "peak_mb": s.peak_bytes / 2**20}
+                for (page, stage), s in self._stats.items()
+            ]
+        return sorted(rows, key=lambda r: -r["seconds"])
+
+    def prometheus_text(self):
+        with self._lock:
+            stats = sorted(self._stats.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+            runs = sorted(self._runs.items(), key=lambda item: str(item[0]))
+            sessions = list(self._sessions.items())
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        def stage_labels(page, stage):
+            return {"page": page or "", "stage": stage}
+
+        metric("airsense_stage_seconds", "summary", "Wall time spent in a page stage.", [
+            sample for (page, stage), s in stats for sample in (
+                ("_count", stage_labels(page, stage), s.count),
+                ("_sum", stage_labels(page, stage), repr(s.seconds)),
+            )
+        ])
+        metric("airsense_stage_max_seconds", "gauge", "Slowest run of a page stage.",
+               [("", stage_labels(page, stage), repr(s.max_seconds)) for (page, stage), s in stats])
+        metric("airsense_stage_rows_total", "counter", "Rows processed by a page stage.",
+               [("", stage_labels(page, stage), s.rows) for (page, stage), s in stats])
+        if self.memory:
+            metric("airsense_stage_peak_memory_bytes", "gauge", "Largest traced memory peak over a page stage.",
+                   [("", stage_labels(page, stage), s.peak_bytes) for (page, stage), s in stats])
+        metric("airsense_reruns_total", "counter", "Script runs per page.",
+               [("", {"page": page or ""}, count) for page, count in runs])
+        metric("airsense_session_reruns", "gauge", "Script runs per session (most recent sessions).",
+               [("", {"session": session or ""}, count) for session, count in sessions])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve ``GET /metrics`` from a daemon thread; return the server."""
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="airsense-metrics", daemon=True).start()
+        return server
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _from_env():
+    mode = os.environ.get("AIRSENSE_TRACE", "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return None
+    tracer = Tracer(
+        memory=mode == "memory",
+        trace_file=os.environ.get("AIRSENSE_TRACE_FILE"),
+        prom_file=os.environ.get("AIRSENSE_TRACE_PROM"),
+    )
+    port = os.environ.get("AIRSENSE_TRACE_PORT")
+    if port:
+        try:
+            tracer.serve(int(port))
+        except OSError:
+            # Another server process already exports on this port
+            pass
+    return tracer
+
+
+TRACER = _from_env()
+ENABLED = TRACER is not None
+
+
+def span(stage):
+    """Context manager timing ``stage`` (a shared no-op when tracing is off)."""
+    if TRACER is None:
+        return _NOOP
+    return TRACER.span(stage)
+
+
+def begin_run(page, session=None):
+    if TRACER is not None:
+        TRACER.begin_run(page, session)
+
+
+def end_run():
+    if TRACER is not None:
+        TRACER.end_run()
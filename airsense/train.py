@@ -0,0 +1,337 @@
+"""Retrain the models from the processed snapshot.
+
+This runs the training code from the four model notebooks as one job graph:
+
+    python -m airsense.train                       # everything, one worker per core
+    python -m airsense.train severity --k 7 --jobs 4
+
+* ``index`` (``pollution_ind_pred``): one XGBoost fit per point of
+  ``INDEX_GRID`` on the notebook's 80/20 split.  ``xgb`` is the fit with the
+  lowest validation MSE.
+* ``severity`` (``city_severity_model``): the k = 2..``k_max`` elbow sweep.
+  ``kmeans`` is the k=``k`` fit, and ``severity_map`` ranks its clusters by
+  mean ``pollution_index``.
+* ``anomaly`` (``anomaly_det_model``): ``dbscan`` and ``iforest``, plus
+  ``processed_with_anomalies.csv`` with both detectors' labels.  These are
+  the notebook's in-memory fits, kept on purpose: they run alongside the
+  other jobs and are written with the other outputs, and the Isolation
+  Forest sees the whole table.  ``python -m airsense.anomaly_train`` is the
+  separate out-of-core path for tables too large for that; its DBSCAN gives
+  the same labels and core samples.
+* ``forecast`` (``timeseries_pollu_pred_model``): the lag-feature
+  ``xgb_forecast`` model.
+
+A job is submitted to the process pool once the jobs it depends on have
+finished.  Sweep points and grid points are separate jobs, so with N workers
+they run N at a time.  Each worker reads the processed snapshot once (Arrow
+snapshots are memory-mapped) and limits its BLAS/OpenMP threads to its share
+of the cores.  Nothing is written until every job has succeeded; each output
+is then replaced atomically.  The LSTM is not retrained, because TensorFlow is
+not a dependency and the app does not use it.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from airsense import snapshots
+from airsense.anomaly import ANOMALY_FEATURES
+from airsense.config import ANOMALIES_CSV, model_path
+from airsense.severity import SEVERITY_FEATURES, SEVERITY_LEVELS
+
+INDEX_TRAIN_FEATURES = ["pm10_concentration", "no2_concentration", "pm25_concentration"]
+INDEX_GRID = {"n_estimators": [300], "learning_rate": [0.05, 0.1], "max_depth": [3, 5, 7]}
+DEFAULT_K, DEFAULT_K_MAX = 7, 7
+RANDOM_STATE = 42
+
+# Outputs written by each target; "anomaly_table" is processed_with_anomalies.csv
+TARGETS = {
+    "index": ["xgb"],
+    "severity": ["kmeans", "severity_map"],
+    "anomaly": ["dbscan", "iforest", "anomaly_table"],
+    "forecast": ["xgb_forecast"],
+}
+
+_THREADS = 1
+_PROCESSED = None
+
+
+def _init_worker(threads):
+    global _THREADS
+    from threadpoolctl import threadpool_limits
+
+    _THREADS = threads
+    threadpool_limits(threads)
+
+
+def _processed():
+    global _PROCESSED
+    if _PROCESSED is None:
+        _PROCESSED = snapshots.read("processed")
+    return _PROCESSED
+
+
+# --------------------------- Jobs ---------------------------
+# Module-level functions so the pool can pickle them; each reads its inputs
+# from the worker's copy of the processed table.
+
+def fit_index(params):
+    from sklearn.model_selection import train_test_split
+    from xgboost import XGBRegressor
+
+    df = _processed()
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[INDEX_TRAIN_FEATURES], df["pollution_index"], test_size=0.2, random_state=RANDOM_STATE
+    )
+    model = XGBRegressor(**params, n_jobs=_THREADS)
+    model.fit(X_train, y_train)
+    mse = float(np.mean((model.predict(X_test) - y_test.to_numpy()) ** 2))
+    return {"params": params, "val_mse": mse, "model": model}
+
+
+def select_index(*fits):
+    return min(fits, key=lambda fit: fit["val_mse"])["model"]
+
+
+def fit_kmeans(k):
+    from sklearn.cluster import KMeans
+
+    model = KMeans(n_clusters=k, random_state=RANDOM_STATE, n_init=10)
+    model.fit(_processed()[SEVERITY_FEATURES])
+    return {"k": k, "inertia": float(model.inertia_), "model": model}
+
+
+def pick_kmeans(fit):
+    return fit["model"]
+
+
+def severity_map(kmeans):
+    import pandas as pd
+
+    means = pd.Series(_processed()["pollution_index"].to_numpy()).groupby(kmeans.labels_).mean()
+    order = means.sort_values().index.tolist()
+    return {int(cluster): SEVERITY_LEVELS[min(i, len(SEVERITY_LEVELS) - 1)] for i, cluster in enumerate(order)}
+
+
+def fit_dbscan():
+    from sklearn.cluster import DBSCAN
+
+    model = DBSCAN(eps=1.5, min_samples=5, metric="euclidean")
+    model.fit(_processed()[ANOMALY_FEATURES].to_numpy())
+    return model
+
+
+def fit_iforest():
+    from sklearn.ensemble import IsolationForest
+
+    model = IsolationForest(n_estimators=100, contamination="auto", random_state=RANDOM_STATE, n_jobs=_THREADS)
+    labels = model.fit_predict(_processed()[ANOMALY_FEATURES].to_numpy())
+    return {"model": model, "labels": labels}
+
+
+def pick_iforest(fit):
+    return fit["model"]
+
+
+def anomaly_table(dbscan, iforest):
+    df = _processed().copy()
+    df["iso_label"] = iforest["labels"]
+    df["is_anomaly_iso"] = df["iso_label"] == -1
+    df["dbscan_label"] = dbscan.labels_
+    df["is_anomaly_dbscan"] = df["dbscan_label"] == -1
+    return df
+
+
+def fit_forecast():
+    from xgboost import XGBRegressor
+
+    from airsense.forecast import FORECAST_FEATURES, add_lag_features
+
+    # Only rows missing something the model uses are dropped
+    df = add_lag_features(_processed()).dropna(subset=FORECAST_FEATURES + ["pollution_index"]).reset_index(drop=True)
+    X, y = df[FORECAST_FEATURES].to_numpy(), df["pollution_index"].to_numpy()
+    train_size = int(0.8 * len(X))
+    model = XGBRegressor(n_estimators=500, learning_rate=0.05, max_depth=5, objective="reg:squarederror",
+                         random_state=RANDOM_STATE, n_jobs=_THREADS)
+    model.fit(X[:train_size], y[:train_size])
+    return model
+
+
+# --------------------------- Graph ---------------------------
+
+class Job:
+    """``fn(*args, *results_of_deps)``; ``local`` jobs are cheap and run in the parent."""
+
+    def __init__(self, name, fn, args=(), deps=(), local=False):
+        self.name = name
+        self.fn = fn
+        self.args = tuple(args)
+        self.deps = tuple(deps)
+        self.local = local
+
+
+def _grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _grid_name(params):
+    return "index:" + ",".join(f"{k}={v}" for k, v in params.items())
+
+
+def build_jobs(targets, k=DEFAULT_K, k_max=DEFAULT_K_MAX, index_grid=None):
+    """Jobs needed for ``targets`` (keys of ``TARGETS``)."""
+    jobs = []
+    if "index" in targets:
+        searches = [Job(_grid_name(params), fit_index, [params]) for params in _grid(index_grid or INDEX_GRID)]
+        jobs += searches + [Job("xgb", select_index, deps=[job.name for job in searches], local=True)]
+    if "severity" in targets:
+        sweep = range(2, max(k, k_max) + 1)
+        jobs += [Job(f"kmeans:{n}", fit_kmeans, [n]) for n in sweep]
+        jobs += [
+            Job("kmeans", pick_kmeans, deps=[f"kmeans:{k}"], local=True),
+            Job("severity_map", severity_map, deps=["kmeans"], local=True),
+        ]
+    if "anomaly" in targets:
+        jobs += [
+            Job("dbscan", fit_dbscan),
+            Job("iforest:fit", fit_iforest),
+            Job("iforest", pick_iforest, deps=["iforest:fit"], local=True),
+            Job("anomaly_table", anomaly_table, deps=["dbscan", "iforest:fit"], local=True),
+        ]
+    if "forecast" in targets:
+        jobs.append(Job("xgb_forecast", fit_forecast))
+    return jobs
+
+
+def _timed(fn, args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run_jobs(jobs, workers=None):
+    """Run ``jobs`` in dependency order; return ``(results, seconds)`` keyed by job name."""
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pending = {job.name: job for job in jobs}
+    results, seconds, running = {}, {}, {}
+
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(threads,)) if workers > 1 else None
+    if pool is None:
+        _init_worker(threads)
+    try:
+        while pending or running:
+            ready = [job for job in pending.values() if all(dep in results for dep in job.deps)]
+            if not ready and not running:
+                raise ValueError(f"unsatisfiable dependencies: {sorted(pending)}")
+            for job in ready:
+                del pending[job.name]
+                args = job.args + tuple(results[dep] for dep in job.deps)
+                if job.local or pool is None:
+                    results[job.name], seconds[job.name] = _timed(job.fn, args)
+                else:
+                    running[pool.submit(_timed, job.fn, args)] = job.name
+            if running and not any(all(d in results for d in job.deps) for job in pending.values()):
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], seconds[name] = future.result()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return results, seconds
+
+
+# --------------------------- Outputs ---------------------------
+
+def _output_path(name):
+    return ANOMALIES_CSV if name == "anomaly_table" else model_path(name)
+
+
+def write_outputs(results, names):
+    """Write every output to a temporary file first, then move them all into place."""
+    import joblib
+
+    staged = []
+    try:
+        for name in names:
+            path = _output_path(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.tmp")
+            if name == "anomaly_table":
+                results[name].to_csv(tmp, index=False)
+            else:
+                joblib.dump(results[name], tmp)
+            staged.append((tmp, path))
+    except BaseException:
+        for tmp, _ in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+    for tmp, path in staged:
+        os.replace(tmp, path)
+    return [path for _, path in staged]
+
+
+def train(targets=None, workers=None, k=DEFAULT_K, k_max=DEFAULT_K_MAX, index_grid=None, write=True):
+    """Train ``targets`` (default: all) and write their outputs; return a report dict."""
+    targets = list(targets or TARGETS)
+    start = time.perf_counter()
+    results, seconds = run_jobs(build_jobs(targets, k, k_max, index_grid), workers)
+    outputs = [name for target in targets for name in TARGETS[target]]
+    written = write_outputs(results, outputs) if write else []
+
+    report = {
+        "targets": targets,
+        "workers": workers or os.cpu_count() or 1,
+        "wall_s": round(time.perf_counter() - start, 3),
+        "job_s": {name: round(s, 3) for name, s in sorted(seconds.items(), key=lambda item: -item[1])},
+        "written": [str(path) for path in written],
+    }
+    if "index" in targets:
+        fits = [results[name] for name in results if name.startswith("index:")]
+        report["index_search"] = [{"params": f["params"], "val_mse": f["val_mse"]} for f in fits]
+        report["index_selected"] = min(fits, key=lambda f: f["val_mse"])["params"]
+    if "severity" in targets:
+        report["kmeans_inertia"] = {
+            results[name]["k"]: results[name]["inertia"] for name in results if name.startswith("kmeans:")
+        }
+        report["severity_map"] = results["severity_map"]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the AirSense models from the processed snapshot")
+    parser.add_argument("targets", nargs="*", help=f"what to train: {', '.join(TARGETS)} (default: all)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="clusters in the saved KMeans model")
+    parser.add_argument("--k-max", type=int, default=DEFAULT_K_MAX, help="largest k in the elbow sweep")
+    parser.add_argument("--dry-run", action="store_true", help="train but do not write anything")
+    parser.add_argument("--report", help="also write the training report to this JSON file")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(sorted(unknown))}")
+
+    report = train(args.targets or None, args.jobs, args.k, args.k_max, write=not args.dry_run)
+    print(f"trained {', '.join(report['targets'])} with {report['workers']} worker(s) in {report['wall_s']:.1f}s "
+          f"(jobs total {sum(report['job_s'].values()):.1f}s)")
+    for name, s in report["job_s"].items():
+        print(f"  {name:<40} {s:8.2f}s")
+    if "kmeans_inertia" in report:
+        print("  elbow: " + ", ".join(f"k={k} {v:,.0f}" for k, v in report["kmeans_inertia"].items()))
+    if "index_selected" in report:
+        print(f"  index model: {report['index_selected']}")
+    for path in report["written"]:
+        print(f"  wrote {path}")
+    if args.report:
+        with open(args.report, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
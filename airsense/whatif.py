@@ -0,0 +1,181 @@
+"""What-if response surfaces of the pollution index model.
+
+``evaluate`` scores the XGBoost index model over a regular grid of one or two
+pollutants, with the others held fixed, in a single ``predict`` call.  Grids
+are in µg/m³, but the model was fitted on the processed table's standardized
+columns, so given the pipeline's ``ReadingScaler`` the inputs are
+standardized first and the predictions are mapped back to index units, where
+the 50/100/150 bands apply.  Trees only ask whether a value lies below each
+split, so grid points between the same two split thresholds of every axis
+get the same prediction.  Given the model's ``split_points``, each axis is
+reduced to one point per interval before scoring (on the model's scale) and
+the result is expanded back, which gives identical values with fewer rows.
+
+``SurfaceCache`` keeps recent surfaces, least recently used first out, bounded
+by their array bytes (``AIRSENSE_SURFACE_CACHE_MB``, default 16).  They are
+keyed by ``grid_spec`` and checked against the model file like figures.
+
+The inverse queries read the cached grids, not the model.  The index is not
+monotone in any pollutant, so every grid point is checked instead of
+bisecting:
+
+* ``required_drops`` sweeps each pollutant from zero up to its current value
+  and returns the smallest reduction that lands in a better band;
+* ``nearest_better`` finds the closest point of a 2-D surface, reducing both
+  pollutants, in a better band than a given reading.
+"""
+import json
+import os
+
+import numpy as np
+
+from airsense.explain import booster_of
+from airsense.figures import FigureCache
+from airsense.pollution_index import INDEX_FEATURES, classify, model_features, predict_index
+
+SURFACE_CACHE_BYTES = int(float(os.environ.get("AIRSENSE_SURFACE_CACHE_MB", 16)) * 2**20)
+SWEEP_STEPS = 400
+
+
+def grid_spec(axes, fixed):
+    """Hashable spec of a grid.
+
+    ``axes`` is ``[(feature, low, high, steps), ...]``; ``fixed`` maps every
+    other ``INDEX_FEATURES`` column to its value (extra keys are ignored).
+    """
+    axes = tuple((name, float(low), float(high), int(steps)) for name, low, high, steps in axes)
+    names = [name for name, _, _, _ in axes]
+    unknown = set(names) - set(INDEX_FEATURES)
+    if unknown or len(set(names)) != len(names):
+        raise ValueError(f"axes must be distinct INDEX_FEATURES, got {names}")
+    return axes, tuple((name, float(fixed[name])) for name in INDEX_FEATURES if name not in names)
+
+
+def split_points(model):
+    """Sorted float32 split thresholds per feature of an XGBoost model, or None for other models."""
+    booster = booster_of(model)
+    if booster is None:
+        return None
+    trees = json.loads(booster.save_raw("json"))["learner"]["gradient_booster"]["model"]["trees"]
+    index = np.concatenate([tree["split_indices"] for tree in trees])
+    condition = np.concatenate([tree["split_conditions"] for tree in trees]).astype(np.float32)
+    inner = np.concatenate([tree["left_children"] for tree in trees]) != -1
+    names = list(booster.feature_names or model_features(model))
+    return {name: np.unique(condition[inner & (index == i)]) for i, name in enumerate(names)}
+
+
+class Surface:
+    """Predicted index over a grid; ``values[i, j]`` is at ``grids[0][i]``, ``grids[1][j]``."""
+
+    def __init__(self, spec, grids, values, rows_scored):
+        self.spec = spec
+        self.axes = [name for name, _, _, _ in spec[0]]
+        self.fixed = dict(spec[1])
+        self.grids = grids
+        self.values = values
+        self.bands = classify(values)
+        self.rows_scored = rows_scored
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.bands.nbytes + sum(g.nbytes for g in self.grids)
+
+
+def _axis_points(name, grid, splits):
+    """Points to score along one (float32, model-scale) axis and, for each grid value, its point's position."""
+    if splits is None or name not in splits:
+        return grid, np.arange(len(grid))
+    bins = np.searchsorted(splits[name], grid, side="right")
+    _, first, inverse = np.unique(bins, return_index=True, return_inverse=True)
+    return grid[first], inverse
+
+
+def evaluate(model, spec, splits=None, scaler=None):
+    """``Surface`` of ``model`` over ``spec``, in one ``predict`` call.
+
+    With an ``ingest.ReadingScaler``, the spec's µg/m³ values are standardized
+    for the model and the surface holds the index in index units; without one
+    they are passed to the model as they are.
+    """
+    def model_scale(name, values):
+        values = scaler.concentration(name, values) if scaler is not None else values
+        return np.asarray(values, dtype=np.float32)
+
+    axes, fixed = spec
+    grids = [np.linspace(low, high, steps) for _, low, high, steps in axes]
+    points, inverses = zip(*(_axis_points(name, model_scale(name, grid), splits)
+                             for (name, _, _, _), grid in zip(axes, grids)))
+    mesh = np.meshgrid(*points, indexing="ij")
+    X = np.empty((mesh[0].size, len(INDEX_FEATURES)), dtype=np.float32)
+    for (name, _, _, _), values in zip(axes, mesh):
+        X[:, INDEX_FEATURES.index(name)] = values.ravel()
+    for name, value in fixed:
+        X[:, INDEX_FEATURES.index(name)] = model_scale(name, value)
+    scored = predict_index(model, X)
+    if scaler is not None:
+        scored = scaler.index(scored)
+    scored = np.asarray(scored, dtype=np.float32).reshape(mesh[0].shape)
+    return Surface(spec, grids, scored[np.ix_(*inverses)], len(X))
+
+
+class SurfaceCache(FigureCache):
+    """``FigureCache`` of surfaces, sized by their arrays."""
+
+    def sizeof(self, surface):
+        return surface.nbytes
+
+
+SURFACES = SurfaceCache(SURFACE_CACHE_BYTES)
+
+
+def sweep_spec(reading, name, steps=SWEEP_STEPS):
+    """1-D grid of ``name`` from zero to its value in ``reading``, the others fixed."""
+    return grid_spec([(name, 0.0, reading[name], steps)], reading)
+
+
+def required_drops(reading, surface, steps=SWEEP_STEPS):
+    """Smallest single-pollutant reduction that moves ``reading`` into a better band.
+
+    ``surface(spec)`` returns the (cached) ``Surface`` for a spec.  Returns
+    ``{feature: {"value", "drop", "drop_pct", "index", "band"} or None}``,
+    None where lowering that pollutant alone never improves the band, and an
+    empty dict when the reading is already in the best band.
+    """
+    drops = {}
+    for name in INDEX_FEATURES:
+        sweep = surface(sweep_spec(reading, name, steps))
+        # The sweep ends exactly at the reading
+        current = sweep.bands[-1]
+        if current == 0:
+            return {}
+        better = np.flatnonzero(sweep.bands < current)
+        if not len(better):
+            drops[name] = None
+            continue
+        k = better[-1]
+        value = float(sweep.grids[0][k])
+        drops[name] = {
+            "value": value,
+            "drop": reading[name] - value,
+            "drop_pct": 100 * (reading[name] - value) / reading[name] if reading[name] else 0.0,
+            "index": float(sweep.values[k]),
+            "band": int(sweep.bands[k]),
+        }
+    return drops
+
+
+def nearest_better(surface, x, y, band):
+    """Closest grid point with both pollutants at or below ``(x, y)`` in a band better than ``band``.
+
+    Distance is measured relative to ``(x, y)``, so a 10% cut counts the same
+    on either axis.  Returns ``(x', y', index)`` or None.
+    """
+    gx, gy = surface.grids
+    allowed = (surface.bands < band) & (gx[:, None] <= x) & (gy[None, :] <= y)
+    if not allowed.any():
+        return None
+    dx = (x - gx[:, None]) / max(x, 1e-9)
+    dy = (y - gy[None, :]) / max(y, 1e-9)
+    distance = np.where(allowed, dx * dx + dy * dy, np.inf)
+    i, j = np.unravel_index(np.argmin(distance), distance.shape)
+    return float(gx[i]), float(gy[j]), float(surface.values[i, j])
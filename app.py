@@ -1,13 +1,45 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
-import folium
-from streamlit_folium import st_folium
-import joblib
-import json
+import os
+import tempfile
+
+# Plotting and mapping libraries are imported by the pages that use them so
+# the Home page (and every cold start) does not pay for them.
+
+from airsense import tracing
+from airsense.anomaly import ANOMALY_FEATURES
+from airsense.explain import BIAS
+from airsense.bulk import score_csv
+from airsense.cache import CACHE
+from airsense.config import BULK_UPLOAD_MB, INGEST_SOURCE, INGEST_SOURCES, PIPELINE_STATS
+from airsense.figures import FIGURES, downsample
+from airsense.ingest import running_sources
+from airsense.loaders import (
+    PAGE_COLUMNS,
+    load_analytics_cube,
+    load_anomalies,
+    load_anomaly_map,
+    load_anomaly_scorers,
+    load_city_index,
+    load_city_series,
+    load_figure,
+    load_forecast_attributions,
+    load_forecast_table,
+    load_index_attributions,
+    load_ingestor,
+    load_models,
+    load_processed,
+    load_raw,
+    require_reading_scaler,
+    load_severity_table,
+    load_station_index,
+    load_surface,
+)
+from airsense.maps import DETAIL_LEVELS
+from airsense.pollution_index import INDEX_COLORS, INDEX_LABELS, classify
+from airsense.severity import SEVERITY_COLORS, SEVERITY_LEVELS, severity_distribution
+from airsense.whatif import SURFACES, grid_spec, nearest_better, required_drops, sweep_spec
 
 st.set_page_config(page_title="AirSense", page_icon="🌍", layout="wide")
 
@@ -135,12 +167,25 @@ with st.sidebar:
     page = st.radio(
         "Navigation",
         ["🏠 Home", "🔬 Operations", "📈 Analytics"],
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key="page"
     )
     
 # Clean page names
 page = page.split(" ", 1)[1] if " " in page else page
 
+if tracing.ENABLED:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    tracing.begin_run(page, ctx.session_id if ctx else None)
+
+
+def stop():
+    """``st.stop()`` that still closes this run's trace, which the sidebar would otherwise do."""
+    tracing.end_run()
+    st.stop()
+
 # --------------------------- Home Page ---------------------------
 if page == "Home":
     st.title("AirSense 🌍")
@@ -180,14 +225,18 @@ if page == "Home":
         st.markdown("### Platform Overview")
         
         try:
-            df = pd.read_excel("data/raw/who_air_quality.xlsx")
+            with tracing.span("home.load_raw") as s:
+                df = load_raw(PAGE_COLUMNS["home"])
+                s.rows = len(df)
             
-            metrics = [
-                ("Cities", df["city"].nunique(), "🏙️"),
-                ("Countries", df["country_name"].nunique(), "🌍"),
-                ("Data Points", f"{len(df):,}", "📊"),
-                ("Years", df["year"].nunique(), "📅")
-            ]
+            with tracing.span("home.metrics") as s:
+                metrics = [
+                    ("Cities", df["city"].nunique(), "🏙️"),
+                    ("Countries", df["country_name"].nunique(), "🌍"),
+                    ("Data Points", f"{len(df):,}", "📊"),
+                    ("Years", df["year"].nunique(), "📅")
+                ]
+                s.rows = len(df)
             
             for label, value, emoji in metrics:
                 st.markdown(f"""
@@ -211,6 +260,37 @@ if page == "Home":
 
 # --------------------------- Operations ---------------------------
 elif page == "Operations":
+    import plotly.graph_objects as go
+
+    def feature_label(name):
+        for column, label in (("pm10_concentration", "PM10"), ("pm25_concentration", "PM2.5"),
+                              ("no2_concentration", "NO2")):
+            name = name.replace(column, label)
+        return name.replace("_", " ")
+
+    def contribution_figure(contributions, title, top=None):
+        """Bars of ``{feature: contribution}`` from a store row, largest first, the rest summed into one."""
+        bias = contributions.pop(BIAS)
+        ranked = sorted(contributions.items(), key=lambda item: abs(item[1]), reverse=True)
+        if top is not None and len(ranked) > top:
+            ranked = ranked[:top] + [(f"{len(ranked) - top} other features", sum(v for _, v in ranked[top:]))]
+        labels = [feature_label(name) for name, _ in ranked][::-1]
+        values = [value for _, value in ranked][::-1]
+        fig = go.Figure(go.Bar(
+            x=values,
+            y=labels,
+            orientation="h",
+            marker_color=["#dc3545" if v > 0 else "#28a745" for v in values],
+            text=[f"{v:+.2f}" for v in values],
+            textposition="outside"
+        ))
+        fig.update_layout(
+            title=f"{title}: baseline {bias:.2f} → {bias + sum(values):.2f}",
+            xaxis_title="Contribution",
+            height=max(240, 40 * len(values) + 120)
+        )
+        return fig
+
     st.title("🔬 Operations")
     st.write("Run predictions and analyze pollution data")
     
@@ -218,134 +298,291 @@ elif page == "Operations":
 
     objective = st.selectbox(
         "Select Analysis Type",
-        ["Pollution Index Prediction", "City Severity Classification", "Anomaly Detection", "Yearly Trend Forecast"]
+        ["Pollution Index Prediction", "City Severity Classification", "Anomaly Detection", "Regional Hotspots",
+         "Yearly Trend Forecast", "Live Monitor"],
+        key="objective"
     )
 
+    objective_columns = {
+        "City Severity Classification": PAGE_COLUMNS["severity"],
+    }
+
+    # Severity, anomaly and forecast views read precomputed tables; only the
+    # prediction view needs a model in memory
+    objective_models = {
+        "Pollution Index Prediction": ["xgb"],
+    }
+
     try:
-        df = pd.read_csv("data/processed/processed_data.csv")
-        models = {
-            "xgb": joblib.load("models/xgb_pollution_index_model.pkl"),
-            "kmeans": joblib.load("models/city_pollution_model.pkl"),
-            "severity_map": joblib.load("models/severity_label_map.pkl"),
-            "dbscan": joblib.load("models/dbscan_pollution_anomaly.pkl")
-        }
+        with tracing.span("operations.load") as s:
+            df = load_processed(objective_columns[objective]) if objective in objective_columns else None
+            models = load_models(*objective_models.get(objective, []))
+            s.rows = len(df) if df is not None else 0
     except Exception as e:
         st.error(f"Error loading data or models: {str(e)}")
-        st.stop()
+        stop()
 
     st.markdown("")
 
     # Pollution Index Prediction
     if objective == "Pollution Index Prediction":
         st.markdown("### 🌡️ Pollution Index Prediction")
-        st.write("Enter pollutant concentrations to predict the overall air quality index.")
+        mode = st.radio("Mode", ["Single reading", "Bulk upload", "What-if"], horizontal=True)
+
+        # The index model was fitted on standardized columns: raw µg/m³ would push it
+        # to its ceiling and every reading would come out "Good"
+        try:
+            scaler = require_reading_scaler()
+        except ValueError as e:
+            st.info(f"Predictions need the scaling the index model was trained with: {e}.")
+            stop()
+
+        if mode == "Single reading":
+            st.write("Enter pollutant concentrations to predict the overall air quality index.")
         
-        st.markdown("")
+            st.markdown("")
         
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            pm10 = st.number_input("PM10 (μg/m³)", min_value=0.0, max_value=500.0, value=50.0, 
-                                   help="Particulate Matter < 10μm")
-        with col2:
-            pm25 = st.number_input("PM2.5 (μg/m³)", min_value=0.0, max_value=500.0, value=30.0, 
-                                   help="Particulate Matter < 2.5μm")
-        with col3:
-            no2 = st.number_input("NO2 (μg/m³)", min_value=0.0, max_value=500.0, value=20.0, 
-                                  help="Nitrogen Dioxide")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                pm10 = st.number_input("PM10 (μg/m³)", min_value=0.0, max_value=500.0, value=50.0, 
+                                       help="Particulate Matter < 10μm")
+            with col2:
+                pm25 = st.number_input("PM2.5 (μg/m³)", min_value=0.0, max_value=500.0, value=30.0, 
+                                       help="Particulate Matter < 2.5μm")
+            with col3:
+                no2 = st.number_input("NO2 (μg/m³)", min_value=0.0, max_value=500.0, value=20.0, 
+                                      help="Nitrogen Dioxide")
         
-        st.markdown("")
+            st.markdown("")
         
-        if st.button("🔍 Calculate Pollution Index", use_container_width=True):
-            pred = models["xgb"].predict(np.array([[pm10, pm25, no2]]))[0]
+            if st.button("🔍 Calculate Pollution Index", use_container_width=True):
+                with tracing.span("prediction.predict") as s:
+                    pred = scaler.predict_index(models["xgb"], np.array([[pm10, pm25, no2]]))[0]
+                    s.rows = 1
             
-            # Determine severity
-            if pred < 50:
-                severity_color = "#28a745"
-                severity_text = "Good"
-            elif pred < 100:
-                severity_color = "#ffc107"
-                severity_text = "Moderate"
-            elif pred < 150:
-                severity_color = "#fd7e14"
-                severity_text = "Unhealthy for Sensitive Groups"
-            else:
-                severity_color = "#dc3545"
-                severity_text = "Unhealthy"
+                # Determine severity
+                band = classify(pred)
+                severity_color = INDEX_COLORS[band]
+                severity_text = INDEX_LABELS[band]
             
-            st.markdown(f"""
-            <div class="success-box">
-                <h3>Pollution Index: {pred:.2f}</h3>
-                <p style="color: {severity_color}; font-weight: 600; font-size: 1.1rem;">
-                    Air Quality: {severity_text}
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="success-box">
+                    <h3>Pollution Index: {pred:.2f}</h3>
+                    <p style="color: {severity_color}; font-weight: 600; font-size: 1.1rem;">
+                        Air Quality: {severity_text}
+                    </p>
+                </div>
+                """, unsafe_allow_html=True)
 
-            # Create visualization
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=["PM10", "PM2.5", "NO2"],
-                    y=[pm10, pm25, no2],
-                    marker_color=["#0068c9", "#9d4edd", "#06d6a0"],
-                    text=[f"{pm10:.1f}", f"{pm25:.1f}", f"{no2:.1f}"],
-                    textposition="outside"
-                )
-            ])
+                # Create visualization
+                fig = go.Figure(data=[
+                    go.Bar(
+                        x=["PM10", "PM2.5", "NO2"],
+                        y=[pm10, pm25, no2],
+                        marker_color=["#0068c9", "#9d4edd", "#06d6a0"],
+                        text=[f"{pm10:.1f}", f"{pm25:.1f}", f"{no2:.1f}"],
+                        textposition="outside"
+                    )
+                ])
             
-            fig.update_layout(
-                title="Pollutant Concentrations",
-                xaxis_title="Pollutant Type",
-                yaxis_title="Concentration (μg/m³)",
-                height=400
-            )
+                fig.update_layout(
+                    title="Pollutant Concentrations",
+                    xaxis_title="Pollutant Type",
+                    yaxis_title="Concentration (μg/m³)",
+                    height=400
+                )
             
-            st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(fig, use_container_width=True)
+
+        elif mode == "Bulk upload":
+            st.write("Upload a CSV with `pm10`, `pm25` and `no2` columns (or the full `*_concentration` names). "
+                     "The file is scored in blocks, but the upload and the scored download are held in memory, "
+                     f"so files are limited to {BULK_UPLOAD_MB:g} MB here; score larger station exports with "
+                     "`python -m airsense.bulk`.")
+
+            upload = st.file_uploader("Station readings (CSV)", type="csv")
+            if upload is not None and upload.size > BULK_UPLOAD_MB * 2**20:
+                st.error(f"File is {upload.size / 2**20:.0f} MB; the limit here is {BULK_UPLOAD_MB:g} MB. "
+                         "Use `python -m airsense.bulk` instead.")
+                upload = None
+
+            if upload is not None and st.button("🔍 Score File", use_container_width=True):
+                progress = st.empty()
+                out = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+                try:
+                    with out, tracing.span("prediction.bulk_score") as s:
+                        stats = score_csv(upload, out, models["xgb"], scaler,
+                                          progress=lambda rows: progress.caption(f"Scored {rows:,} rows…"))
+                        s.rows = stats.rows
+                except ValueError as e:
+                    os.unlink(out.name)
+                    st.error(f"Could not score file: {e}")
+                    stop()
+
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Rows Scored", f"{stats.rows:,}")
+                col2.metric("Time", f"{stats.seconds:.2f} s")
+                col3.metric("Throughput", f"{stats.rows_per_sec:,.0f} rows/s")
+                if stats.incomplete:
+                    st.warning(f"{stats.incomplete:,} rows are missing a pollutant; their index and "
+                               "air quality are left empty.")
+
+                with open(out.name, "rb") as fh:
+                    st.download_button("⬇️ Download Results", fh, file_name=f"scored_{upload.name}",
+                                       mime="text/csv", use_container_width=True)
+                os.unlink(out.name)
+
+        else:
+            st.write("See how the index responds across two pollutants, and how far each one has to fall "
+                     "for a reading to reach a better band.")
+
+            st.markdown("")
+
+            names = {"PM10": "pm10_concentration", "PM2.5": "pm25_concentration", "NO2": "no2_concentration"}
+            col1, col2, col3 = st.columns(3)
+            reading = {
+                names["PM10"]: col1.number_input("PM10 (μg/m³)", min_value=0.0, max_value=500.0, value=50.0),
+                names["PM2.5"]: col2.number_input("PM2.5 (μg/m³)", min_value=0.0, max_value=500.0, value=30.0),
+                names["NO2"]: col3.number_input("NO2 (μg/m³)", min_value=0.0, max_value=500.0, value=20.0),
+            }
+
+            col1, col2, col3, col4 = st.columns(4)
+            x_label = col1.selectbox("X axis", list(names), index=1)
+            y_label = col2.selectbox("Y axis", [label for label in names if label != x_label], index=1)
+            upper = col3.number_input("Axis range up to (μg/m³)", min_value=10.0, max_value=500.0, value=200.0)
+            steps = col4.select_slider("Resolution", [50, 100, 150, 200], value=200)
+            (fixed_label,) = set(names) - {x_label, y_label}
+            x_name, y_name = names[x_label], names[y_label]
+
+            # One batched predict per grid; surfaces are cached by grid spec
+            try:
+                with tracing.span("whatif.surface") as s:
+                    spec = grid_spec([(x_name, 0.0, upper, steps), (y_name, 0.0, upper, steps)], reading)
+                    surface = load_surface(spec)
+                    s.rows = surface.rows_scored
+            except ValueError as e:
+                # Without the pipeline's scaling the model would see µg/m³ where it was
+                # fitted on standardized values, and no reading would ever leave "Good"
+                st.info(f"What-if needs the scaling the index model was trained with: {e}.")
+                stop()
+
+            with tracing.span("whatif.inverse"):
+                current = classify(load_surface(sweep_spec(reading, x_name)).values[-1])
+                drops = required_drops(reading, load_surface)
+                target = nearest_better(surface, reading[x_name], reading[y_name], current)
+
+            def build_surface_figure():
+                fig = go.Figure()
+                fig.add_trace(go.Heatmap(
+                    x=surface.grids[0], y=surface.grids[1], z=surface.values.T,
+                    colorscale="RdYlGn_r", colorbar=dict(title="Index"),
+                    hovertemplate=f"{x_label} %{{x:.1f}}<br>{y_label} %{{y:.1f}}<br>Index %{{z:.1f}}<extra></extra>"
+                ))
+                # Band boundaries
+                fig.add_trace(go.Contour(
+                    x=surface.grids[0], y=surface.grids[1], z=surface.values.T, showscale=False,
+                    contours=dict(coloring="none", start=50, end=150, size=50, showlabels=True),
+                    line=dict(color="white", width=2), hoverinfo="skip"
+                ))
+                fig.add_trace(go.Scatter(
+                    x=[reading[x_name]], y=[reading[y_name]], mode="markers", name="Reading",
+                    marker=dict(size=14, color="black", symbol="x")
+                ))
+                if target is not None:
+                    fig.add_trace(go.Scatter(
+                        x=[target[0]], y=[target[1]], mode="markers", name="Nearest better band",
+                        marker=dict(size=14, color="white", symbol="star", line=dict(color="black", width=1))
+                    ))
+                fig.update_layout(
+                    title=f"Pollution Index: {x_label} × {y_label} at {fixed_label} "
+                          f"{reading[names[fixed_label]]:.1f} μg/m³",
+                    xaxis_title=f"{x_label} (μg/m³)",
+                    yaxis_title=f"{y_label} (μg/m³)",
+                    height=550,
+                    legend=dict(orientation="h", y=-0.15)
+                )
+                return fig
+
+            with tracing.span("whatif.chart"):
+                # The surface depends on the pipeline statistics as well as the model
+                fig = load_figure(("whatif", spec, reading[x_name], reading[y_name], PIPELINE_STATS),
+                                  build_surface_figure, models=["xgb"], files=[PIPELINE_STATS])
+                st.plotly_chart(fig, use_container_width=True)
+
+            st.markdown(f"#### Reaching a better band than **{INDEX_LABELS[current]}**")
+            if not drops:
+                st.success("This reading is already in the best band.")
+            else:
+                if target is not None:
+                    st.caption(f"Cutting both axes: {x_label} to {target[0]:.1f} and {y_label} to {target[1]:.1f} "
+                               f"μg/m³ gives an index of {target[2]:.1f}.")
+                rows = []
+                for label, name in names.items():
+                    drop = drops[name]
+                    rows.append({
+                        "Pollutant": label,
+                        "Current (μg/m³)": reading[name],
+                        "Needed (μg/m³)": drop["value"] if drop else None,
+                        "Drop (%)": drop["drop_pct"] if drop else None,
+                        "Index after": drop["index"] if drop else None,
+                        "Band after": INDEX_LABELS[drop["band"]] if drop else "Not reachable alone",
+                    })
+                st.dataframe(pd.DataFrame(rows).round({"Needed (μg/m³)": 1, "Drop (%)": 1, "Index after": 2}),
+                             hide_index=True)
 
     # City Severity Classification
     elif objective == "City Severity Classification":
         st.markdown("### 🏙️ City Severity Classification")
         st.write("Analyze pollution severity for any city in the database.")
 
+        with tracing.span("severity.city_index"):
+            city_index = load_city_index()
+
+        # Deep links such as ?country=india&city=new%20york resolve through the
+        # same normalized index, so case, accents and small typos are tolerated
+        linked = city_index.resolve(st.query_params.get("country", ""), st.query_params.get("city", ""))
+        countries = city_index.countries
+
         col1, col2 = st.columns(2)
         with col1:
-            country_input = st.text_input("Country Name", placeholder="e.g., India, United States")
+            country_input = st.selectbox(
+                "Country Name", countries,
+                index=countries.index(linked[0]) if linked and linked[0] in countries else None,
+                placeholder="Type to search, e.g., India"
+            )
         with col2:
-            city_input = st.text_input("City Name", placeholder="e.g., Delhi, New York")
+            cities = city_index.cities(country_input) if country_input else []
+            city_input = st.selectbox(
+                "City Name", cities,
+                index=cities.index(linked[1]) if linked and linked[1] in cities else None,
+                placeholder="Type to search, e.g., Delhi"
+            )
 
         st.markdown("")
 
         if st.button("🔍 Analyze City", use_container_width=True):
             if not country_input or not city_input:
-                st.warning("⚠️ Please enter both country and city names")
+                st.warning("⚠️ Please select both country and city names")
             else:
-                # Ensure the columns are strings
-                df["country_name"] = df["country_name"].fillna("").astype(str)
-                df["city"] = df["city"].fillna("").astype(str)
-
-                # Filter dynamically
-                row = df[(df["country_name"].str.lower() == country_input.lower()) &
-                         (df["city"].str.lower() == city_input.lower())]
-
-                if not row.empty:
-                    # Model prediction
-                    cluster = int(models["kmeans"].predict(
-                        row[["pm10_concentration", "pm25_concentration", "no2_concentration", 
-                          "pollution_per_person"]]
-                    )[0])
-
-                    severity = models["severity_map"][cluster]
-
-                    severity_colors = {
-                        "Low": "#28a745",
-                        "Moderate": "#ffc107",
-                        "High": "#fd7e14",
-                        "Critical": "#dc3545"
-                    }
-                    severity_color = severity_colors.get(severity, "#6c757d")
+                positions = city_index.rows(country_input, city_input)
+
+                if len(positions):
+                    # Severity is precomputed for every city-year; this is a row lookup
+                    with tracing.span("severity.lookup") as s:
+                        history = pd.concat([
+                            load_severity_table().iloc[positions].reset_index(drop=True),
+                            df.iloc[positions][["pm10_concentration", "pm25_concentration", "no2_concentration"]]
+                            .reset_index(drop=True)
+                        ], axis=1).sort_values("year")
+                        s.rows = len(history)
+                    row = history.iloc[[-1]]
+
+                    severity = row["severity"].values[0]
+                    severity_color = SEVERITY_COLORS.get(severity, "#6c757d")
 
                     st.markdown(f"""
                     <div class="success-box">
-                        <h3>{row['city'].values[0]}, {row['country_name'].values[0]}</h3>
+                        <h3>{row['city'].values[0]}, {row['country_name'].values[0]} ({row['year'].values[0]})</h3>
                         <h2 style="color: {severity_color}; margin: 0.5rem 0;">Severity: {severity}</h2>
                         <p>
                             PM10: {row['pm10_concentration'].values[0]:.1f} μg/m³ | 
@@ -355,16 +592,71 @@ elif page == "Operations":
                     </div>
                     """, unsafe_allow_html=True)
 
+                    # Attributions are precomputed for every city-year; this is a lookup
+                    city_name, year = row["city"].values[0], int(row["year"].values[0])
+                    try:
+                        with tracing.span("severity.attributions") as s:
+                            contributions = load_index_attributions().get(city_name, year)
+                            s.rows = 1
+                    except FileNotFoundError as e:
+                        contributions = None
+                        st.caption(f"Pollution index drivers unavailable: {e.filename or e} not found.")
+                    if contributions is not None:
+                        fig = load_figure(("index_contributions", city_name, year),
+                                          lambda: contribution_figure(contributions, "Pollution index drivers"),
+                                          tables=["processed"], models=["xgb"])
+                        st.plotly_chart(fig, use_container_width=True)
+
+                    if len(history) > 1:
+                        fig = go.Figure(go.Scatter(
+                            x=history["year"],
+                            y=history["severity"].cat.codes,
+                            mode="lines+markers",
+                            line=dict(color="#adb5bd", width=2),
+                            marker=dict(size=12, color=[SEVERITY_COLORS.get(s, "#6c757d") for s in history["severity"]]),
+                            text=history["severity"],
+                            hovertemplate="%{x}: %{text}<extra></extra>"
+                        ))
+                        fig.update_layout(
+                            title="Severity History",
+                            xaxis_title="Year",
+                            yaxis=dict(tickvals=list(range(len(SEVERITY_LEVELS))), ticktext=SEVERITY_LEVELS),
+                            height=320
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+
                 else:
-                    st.warning(f"⚠️ No data found for {city_input.title()}, {country_input.title()}")
+                    st.warning(f"⚠️ No data found for {city_input}, {country_input}")
+
+        with st.expander("🌍 Global severity distribution"):
+            def build_distribution_figure():
+                distribution = severity_distribution(load_severity_table())
+                fig = go.Figure(go.Bar(
+                    x=distribution.index,
+                    y=distribution.values,
+                    marker_color=[SEVERITY_COLORS[level] for level in distribution.index],
+                    text=distribution.values,
+                    textposition="outside"
+                ))
+                fig.update_layout(xaxis_title="Severity", yaxis_title="City-years", height=320)
+                return fig
+
+            with tracing.span("severity.distribution"):
+                fig = load_figure(("severity_distribution",), build_distribution_figure,
+                                  tables=["processed"], models=["kmeans", "severity_map"])
+            st.plotly_chart(fig, use_container_width=True)
                
     # Anomaly Detection
     elif objective == "Anomaly Detection":
+        from streamlit_folium import st_folium
+
         try:
-            anomaly_df = pd.read_csv("data/processed/processed_with_anomalies.csv")
+            with tracing.span("anomaly.load") as s:
+                anomaly_df = load_anomalies(PAGE_COLUMNS["anomaly_map"])
+                s.rows = len(anomaly_df)
         except:
             st.error("Anomaly data file not found")
-            st.stop()
+            stop()
 
         st.markdown("### 🚨 Anomaly Detection")
         st.write("Identify and visualize pollution hotspots with unusual patterns.")
@@ -384,36 +676,152 @@ elif page == "Operations":
 
         st.markdown("")
 
-        # Map
-        m = folium.Map(
-            location=[anomaly_df["latitude"].mean(), anomaly_df["longitude"].mean()],
-            zoom_start=3,
-            tiles="CartoDB positron"
-        )
+        # Map: normal readings are aggregated per grid cell, anomalies drawn individually
+        detail = st.select_slider("Map Detail", options=list(DETAIL_LEVELS), value="Medium")
+        with tracing.span("anomaly.map_build"):
+            m = load_anomaly_map(DETAIL_LEVELS[detail])
 
-        for _, r in anomaly_df.iterrows():
-            color = "#dc3545" if r["is_anomaly_dbscan"] else "#0068c9"
-            folium.CircleMarker(
-                location=[r["latitude"], r["longitude"]],
-                radius=4,
-                color=color,
-                fill=True,
-                fillOpacity=0.6,
-                popup=f"""
-                <b>{r['city']}</b><br>
-                Index: {r['pollution_index']:.1f}<br>
-                Anomaly: {'Yes' if r['is_anomaly_dbscan'] else 'No'}
-                """
-            ).add_to(m)
-
-        st_folium(m, height=500)
+        # returned_objects=[] keeps pan/zoom from triggering a rerun
+        with tracing.span("anomaly.map_render"):
+            st_folium(m, height=500, returned_objects=[])
 
         st.markdown("""
         <div class="info-box">
-        <strong>Legend:</strong> 🔵 Normal Pollution Levels | 🔴 Anomalous Pollution Hotspots
+        <strong>Legend:</strong> 🔵 Normal Pollution Levels (sized by readings per area) | 🔴 Anomalous Pollution Hotspots
         </div>
         """, unsafe_allow_html=True)
 
+        with st.expander("🧪 Score a new reading"):
+            st.caption("Values use the same scaling as the processed dataset.")
+            cols = st.columns(3)
+            reading = [
+                cols[i % 3].number_input(name.replace("_", " ").title(), value=0.0, format="%.3f", key=f"reading_{name}")
+                for i, name in enumerate(ANOMALY_FEATURES)
+            ]
+
+            if st.button("Score Reading", use_container_width=True):
+                with tracing.span("anomaly.score") as s:
+                    scorers = load_anomaly_scorers()
+                    dbscan_flag = scorers["dbscan"].is_anomaly(reading)[0]
+                    iso_score = scorers["iforest"].score_samples(reading)[0]
+                    s.rows = 1
+
+                col1, col2 = st.columns(2)
+                col1.metric("DBSCAN", "Anomaly" if dbscan_flag else "Normal")
+                col2.metric("Isolation Forest", "Anomaly" if iso_score < scorers["iforest"].offset else "Normal",
+                            f"score {iso_score:.3f}", delta_color="off")
+
+    # Regional Hotspots
+    elif objective == "Regional Hotspots":
+        st.markdown("### 🧭 Regional Hotspots")
+        st.write("Find the stations and anomalies around a city or a point, and the nearest anomaly hotspots.")
+
+        # Stations go into a spatial index once per data version; every query below is a tree lookup
+        try:
+            with tracing.span("hotspots.index") as s:
+                stations = load_station_index()
+                readings_df = load_anomalies(PAGE_COLUMNS["hotspots"])
+                s.rows = len(stations)
+        except Exception:
+            st.error("Anomaly data file not found")
+            stop()
+
+        center = st.radio("Center on", ["City", "Coordinates"], horizontal=True)
+        col1, col2 = st.columns(2)
+        if center == "City":
+            center_city = col1.selectbox("City", stations.cities)
+            city_stations = stations.stations_of(center_city)
+            if not len(city_stations):
+                st.info("No stations with coordinates are recorded for this city; center on coordinates instead.")
+                stop()
+            station = city_stations[0]
+            lat, lon = float(stations.lat[station]), float(stations.lon[station])
+            col2.caption(f"{stations.country[station]} · {lat:.3f}, {lon:.3f}")
+        else:
+            lat = col1.number_input("Latitude", min_value=-90.0, max_value=90.0, value=28.6, format="%.3f")
+            lon = col2.number_input("Longitude", min_value=-180.0, max_value=180.0, value=77.2, format="%.3f")
+
+        col1, col2 = st.columns(2)
+        radius = col1.slider("Radius (km)", 25, 2000, 250, step=25)
+        k = col2.slider("Nearest hotspots", 1, 20, 5)
+
+        with tracing.span("hotspots.query") as s:
+            (ids, km), = stations.within([lat], [lon], radius)
+            hot_ids, hot_km = stations.nearest_hotspots([lat], [lon], k)
+            hot_ids, hot_km = hot_ids[0][hot_ids[0] >= 0], hot_km[0][hot_ids[0] >= 0]
+            rows = stations.station_rows(ids)
+            s.rows = len(ids)
+
+        readings, anomalies = int(stations.readings[ids].sum()), int(stations.anomalies[ids].sum())
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Stations", f"{len(ids):,}")
+        col2.metric("Readings", f"{readings:,}")
+        col3.metric("Anomalies", f"{anomalies:,}")
+        col4.metric("Anomaly Rate", f"{100 * anomalies / readings:.1f}%" if readings else "–")
+
+        def build_hotspot_figure():
+            fig = go.Figure()
+            for label, selected, color in (("Stations", ids[stations.anomalies[ids] == 0], "#0068c9"),
+                                           ("Hotspots", ids[stations.anomalies[ids] > 0], "#dc3545"),
+                                           ("Nearest hotspots", np.setdiff1d(hot_ids, ids), "#fd7e14")):
+                fig.add_trace(go.Scattergeo(
+                    lat=stations.lat[selected],
+                    lon=stations.lon[selected],
+                    mode="markers",
+                    name=label,
+                    marker=dict(size=6 + 2 * np.sqrt(stations.anomalies[selected]), color=color),
+                    text=[f"{c}: {a} of {r} anomalous" for c, a, r in
+                          zip(stations.city[selected], stations.anomalies[selected], stations.readings[selected])],
+                    hovertemplate="%{text}<extra></extra>"
+                ))
+            fig.add_trace(go.Scattergeo(lat=[lat], lon=[lon], mode="markers", name="Center",
+                                        marker=dict(size=14, symbol="star", color="#212529")))
+            fig.update_layout(height=450, margin=dict(l=0, r=0, t=10, b=0),
+                              geo=dict(projection_type="natural earth", showcountries=True))
+            return fig
+
+        with tracing.span("hotspots.chart"):
+            fig = load_figure(("hotspots", lat, lon, radius, k), build_hotspot_figure, tables=["anomalies"])
+            st.plotly_chart(fig, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"**Stations within {radius} km**")
+            st.dataframe(pd.DataFrame({
+                "City": stations.city[ids],
+                "Country": stations.country[ids],
+                "Distance (km)": km.round(1),
+                "Readings": stations.readings[ids],
+                "Anomalies": stations.anomalies[ids],
+            }), hide_index=True)
+        with col2:
+            st.markdown("**Nearest hotspots**")
+            st.dataframe(pd.DataFrame({
+                "City": stations.city[hot_ids],
+                "Country": stations.country[hot_ids],
+                "Distance (km)": hot_km.round(1),
+                "Anomalies": stations.anomalies[hot_ids],
+            }), hide_index=True)
+
+        with st.expander(f"🚨 Anomalous readings within {radius} km"):
+            nearby = readings_df.iloc[rows]
+            st.dataframe(nearby[nearby["is_anomaly_dbscan"] == True][["city", "country_name", "year", "pollution_index"]]
+                         .sort_values(["city", "year"]), hide_index=True)
+
+        with st.expander("🗺️ Densest hotspot clusters"):
+            # One batched query from every hotspot ranks the regional clusters
+            with tracing.span("hotspots.clusters") as s:
+                hotspots = stations.hotspots
+                around = stations.within(stations.lat[hotspots], stations.lon[hotspots], radius, hotspots_only=True)
+                s.rows = len(hotspots)
+            clusters = pd.DataFrame({
+                "City": stations.city[hotspots],
+                "Country": stations.country[hotspots],
+                f"Hotspots within {radius} km": [len(found) for found, _ in around],
+                "Anomalies": [int(stations.anomalies[found].sum()) for found, _ in around],
+            }).sort_values("Anomalies", ascending=False, kind="stable")
+            st.dataframe(clusters.head(10), hide_index=True)
+
     # Yearly Trend Forecast
     elif objective == "Yearly Trend Forecast":
         st.markdown("### 📈 Trend Analysis")
@@ -421,86 +829,211 @@ elif page == "Operations":
         
         st.markdown("")
         
-        city = st.selectbox("Select City", sorted(df["city"].unique()))
+        # Rows are indexed by (city, year) once; a city switch is a slice
+        try:
+            with tracing.span("trend.cities") as s:
+                city_series = load_city_series()
+                s.rows = len(city_series)
+        except Exception as e:
+            st.error(f"Error loading data or models: {str(e)}")
+            stop()
+        city = st.selectbox("Select City", city_series.cities)
         
-        city_df = df[df["city"] == city].sort_values("year")
+        with tracing.span("trend.filter") as s:
+            years, values = city_series.series(city)
+            s.rows = len(years)
         
-        if not city_df.empty:
-            # Line chart
-            fig = go.Figure()
-            
-            fig.add_trace(go.Scatter(
-                x=city_df["year"],
-                y=city_df["pollution_index"],
-                mode='lines+markers',
-                name='Actual',
-                line=dict(color='#0068c9', width=3),
-                marker=dict(size=8)
-            ))
-            
-            if "predicted_pollution_index" in city_df.columns:
+        if len(years):
+            # Fitted values and forecasts are precomputed for every city
+            try:
+                with tracing.span("trend.forecast") as s:
+                    forecast = load_forecast_table()
+                    city_forecast = forecast.loc[[city]] if city in forecast.index else forecast.iloc[:0]
+                    s.rows = len(city_forecast)
+            except Exception:
+                city_forecast = None
+                st.caption("Forecast unavailable for the current data.")
+
+            def build_trend_figure():
+                fig = go.Figure()
+
+                x, y = downsample(years, values)
                 fig.add_trace(go.Scatter(
-                    x=city_df["year"],
-                    y=city_df["predicted_pollution_index"],
+                    x=x,
+                    y=y,
                     mode='lines+markers',
-                    name='Predicted',
-                    line=dict(color='#ff6b6b', width=3, dash='dash'),
+                    name='Actual',
+                    line=dict(color='#0068c9', width=3),
                     marker=dict(size=8)
                 ))
-            
-            fig.update_layout(
-                title=f"Pollution Trend: {city}",
-                xaxis_title="Year",
-                yaxis_title="Pollution Index",
-                height=450,
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+
+                if city_forecast is not None and not city_forecast.empty:
+                    fitted = city_forecast[city_forecast["kind"] == "fitted"]
+                    future = city_forecast[city_forecast["kind"] == "forecast"]
+
+                    x, y = downsample(fitted["year"], fitted["predicted_pollution_index"])
+                    fig.add_trace(go.Scatter(
+                        x=x,
+                        y=y,
+                        mode='lines+markers',
+                        name='Predicted',
+                        line=dict(color='#ff6b6b', width=3, dash='dash'),
+                        marker=dict(size=8)
+                    ))
+
+                    # Start the forecast line at the last actual point so the two connect
+                    fig.add_trace(go.Scatter(
+                        x=[years[-1], *future["year"]],
+                        y=[values[-1], *future["predicted_pollution_index"]],
+                        mode='lines+markers',
+                        name='Forecast',
+                        line=dict(color='#9d4edd', width=3, dash='dot'),
+                        marker=dict(size=8)
+                    ))
+
+                fig.update_layout(
+                    title=f"Pollution Trend: {city}",
+                    xaxis_title="Year",
+                    yaxis_title="Pollution Index",
+                    height=450,
+                    hovermode='x unified'
+                )
+                return fig
+
+            with tracing.span("trend.chart"):
+                fig = load_figure(("trend", city, city_forecast is not None), build_trend_figure,
+                                  tables=["processed"], models=["xgb_forecast"])
+                st.plotly_chart(fig, use_container_width=True)
             
             st.markdown("")
             
             # Statistics
+            stats = city_series.stats(city)
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Average", f"{city_df['pollution_index'].mean():.2f}")
+                st.metric("Average", f"{stats['mean']:.2f}")
             with col2:
-                st.metric("Maximum", f"{city_df['pollution_index'].max():.2f}")
+                st.metric("Maximum", f"{stats['max']:.2f}")
             with col3:
-                st.metric("Minimum", f"{city_df['pollution_index'].min():.2f}")
+                st.metric("Minimum", f"{stats['min']:.2f}")
             with col4:
-                st.metric("Std Dev", f"{city_df['pollution_index'].std():.2f}")
+                st.metric("Std Dev", f"{stats['std']:.2f}")
+
+            with st.expander("🧩 Forecast drivers"):
+                try:
+                    with tracing.span("trend.attributions") as s:
+                        store = load_forecast_attributions(build=False)
+                        driver_years = store.city(city)[0] if store is not None else []
+                        s.rows = len(driver_years)
+                except FileNotFoundError as e:
+                    st.caption(f"Forecast drivers unavailable: {e.filename or e} not found.")
+                else:
+                    if store is None:
+                        st.caption("Forecast attributions are not built yet: run `python -m airsense.explain`.")
+                    elif not len(driver_years):
+                        st.caption("No forecast for this city.")
+                    else:
+                        year = st.selectbox("Year", driver_years[::-1].tolist())
+                        fig = load_figure(("forecast_contributions", city, year),
+                                          lambda: contribution_figure(store.get(city, year), "Forecast drivers",
+                                                                      top=8),
+                                          tables=["processed"], models=["xgb_forecast"])
+                        st.plotly_chart(fig, use_container_width=True)
+
+    # Live Monitor
+    elif objective == "Live Monitor":
+        st.markdown("### 📡 Live Monitor")
+        st.write("Rolling scores of station readings streamed to the ingestion pipeline.")
+
+        st.markdown("")
+
+        # Only the configured sources can be started from the dashboard
+        source = st.selectbox("Source", INGEST_SOURCES) if len(INGEST_SOURCES) > 1 else INGEST_SOURCE
+        # One ingestor per source runs in the background for every session
+        if source not in running_sources() and not st.button("Start ingestion"):
+            st.caption(f"Listens on `{source}`. Send readings with `python -m airsense.ingest replay {source}` "
+                       "once started.")
+            stop()
+        try:
+            with tracing.span("live.start"):
+                ingestor = load_ingestor(source)
+        except (ValueError, OSError) as e:
+            st.error(f"Unable to start ingestion: {str(e)}")
+            stop()
+
+        @st.fragment(run_every=2)
+        def live_panel():
+            with tracing.span("live.snapshot") as s:
+                snapshot = ingestor.snapshot()
+                s.rows = len(snapshot["cities"])
+            metrics = snapshot["metrics"]
+
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Readings / sec", f"{metrics['readings_per_sec']:,.0f}")
+            col2.metric("Readings", f"{metrics['readings']:,}")
+            col3.metric("Cities", f"{metrics['cities']:,}")
+            col4.metric("p99 latency", f"{metrics['p99_ms']:.0f} ms")
+            if metrics["rejected"]:
+                st.caption(f"{metrics['rejected']:,} malformed readings skipped")
+
+            if not snapshot["cities"]:
+                st.info("Waiting for readings...")
+                return
+            table = pd.DataFrame(snapshot["cities"]).sort_values("mean_index", ascending=False).head(50)
+            table["last_ts"] = pd.to_datetime(table["last_ts"], unit="s")
+            st.dataframe(
+                table[["city", "mean_index", "last_index", "air_quality", "dbscan_rate", "iso_rate", "window",
+                       "total", "last_ts"]],
+                column_config={
+                    "mean_index": st.column_config.NumberColumn("Mean index", format="%.1f"),
+                    "last_index": st.column_config.NumberColumn("Last index", format="%.1f"),
+                    "air_quality": "Air quality",
+                    "dbscan_rate": st.column_config.ProgressColumn("DBSCAN anomalies", min_value=0, max_value=1),
+                    "iso_rate": st.column_config.ProgressColumn("IForest anomalies", min_value=0, max_value=1),
+                    "window": "In window",
+                    "total": "Total",
+                    "last_ts": "Last reading",
+                },
+                hide_index=True,
+            )
+
+        live_panel()
 
 elif page == "Analytics":
+    import plotly.graph_objects as go
+
     st.title("📊 Analytics & Model Insights")
     st.write("Comprehensive pollution trends, anomaly analysis, and model-driven insights")
 
     # -------------------- Load Data --------------------
     try:
-        df = pd.read_csv("data/processed/processed_data.csv")
-        anomaly_df = pd.read_csv("data/processed/processed_with_anomalies.csv")
+        with tracing.span("analytics.cube"):
+            cube = load_analytics_cube()
     except:
         st.error("Unable to load analytics data")
-        st.stop()
+        stop()
 
     # -------------------- Key Statistics --------------------
     st.markdown("### 🔢 Key Statistics")
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Cities Monitored", df["city"].nunique())
+        st.metric("Cities Monitored", cube.n_unique["city"])
     with col2:
-        st.metric("Countries", df["country_name"].nunique())
+        st.metric("Countries", cube.n_unique["country_name"])
     with col3:
-        st.metric("Total Anomalies", anomaly_df["is_anomaly_dbscan"].sum())
+        st.metric("Total Anomalies", cube.anomaly_count)
 
     # -------------------- Executive Insights --------------------
     st.markdown("### 🧠 Executive Insights")
 
-    avg_index = df["pollution_index"].mean()
-    worst_city = df.groupby("city")["pollution_index"].mean().idxmax()
-    worst_country = df.groupby("country_name")["pollution_index"].mean().idxmax()
-    anomaly_rate = (anomaly_df["is_anomaly_dbscan"].sum() / len(anomaly_df)) * 100
+    avg_index = cube.mean_index
+    if cube.top_means["city"].empty:
+        st.info("No pollution data to summarize yet.")
+        stop()
+    worst_city = cube.top_means["city"].index[0]
+    worst_country = cube.top_means["country_name"].index[0]
+    anomaly_rate = cube.anomaly_rate
 
     st.info(
         f"""
@@ -517,26 +1050,34 @@ elif page == "Analytics":
     # -------------------- Global Trend --------------------
     st.markdown("### Global Pollution Trend")
 
-    yearly_data = df.groupby("year")["pollution_index"].mean().reset_index()
-
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=yearly_data["year"],
-        y=yearly_data["pollution_index"],
-        mode="lines+markers",
-        line=dict(color="#0068c9", width=3),
-        fill="tozeroy",
-        fillcolor="rgba(0,104,201,0.15)"
-    ))
-
-    fig.update_layout(
-        xaxis_title="Year",
-        yaxis_title="Average Pollution Index",
-        height=360,
-        hovermode="x unified"
-    )
+    # Charts are cached per data version (see airsense.figures)
+    analytics_tables = ["processed", "anomalies"]
+
+    def build_trend_figure():
+        yearly_data = cube.means["year"].rename("pollution_index").rename_axis("year").reset_index()
+        x, y = downsample(yearly_data["year"], yearly_data["pollution_index"])
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            mode="lines+markers",
+            line=dict(color="#0068c9", width=3),
+            fill="tozeroy",
+            fillcolor="rgba(0,104,201,0.15)"
+        ))
 
-    st.plotly_chart(fig, use_container_width=True)
+        fig.update_layout(
+            xaxis_title="Year",
+            yaxis_title="Average Pollution Index",
+            height=360,
+            hovermode="x unified"
+        )
+        return fig
+
+    with tracing.span("analytics.trend_chart"):
+        fig = load_figure(("analytics_trend",), build_trend_figure, tables=analytics_tables)
+        st.plotly_chart(fig, use_container_width=True)
 
     st.success(
         """
@@ -554,69 +1095,73 @@ elif page == "Analytics":
     with col1:
         st.markdown("### 🏙️ Most Polluted Cities")
 
-        top_cities = (
-            df.groupby("city")["pollution_index"]
-            .mean()
-            .nlargest(10)
-            .reset_index()
-        )
+        def build_city_figure():
+            top_cities = cube.top_means["city"].rename("pollution_index").rename_axis("city").reset_index()
 
-        fig = go.Figure(go.Bar(
-            x=top_cities["pollution_index"],
-            y=top_cities["city"],
-            orientation="h",
-            marker_color="#dc3545",
-            text=top_cities["pollution_index"].round(1),
-            textposition="outside"
-        ))
+            fig = go.Figure(go.Bar(
+                x=top_cities["pollution_index"],
+                y=top_cities["city"],
+                orientation="h",
+                marker_color="#dc3545",
+                text=top_cities["pollution_index"].round(1),
+                textposition="outside"
+            ))
 
-        fig.update_layout(height=420, margin=dict(l=150))
-        st.plotly_chart(fig, use_container_width=True)
+            fig.update_layout(height=420, margin=dict(l=150))
+            return fig
+
+        with tracing.span("analytics.city_chart"):
+            fig = load_figure(("analytics_cities",), build_city_figure, tables=analytics_tables)
+            st.plotly_chart(fig, use_container_width=True)
 
     with col2:
         st.markdown("### 🚨 Cities with Most Anomalies")
 
-        anomaly_cities = (
-            anomaly_df[anomaly_df["is_anomaly_dbscan"] == True]["city"]
-            .value_counts()
-            .head(10)
-            .reset_index()
-        )
-        anomaly_cities.columns = ["city", "count"]
+        def build_anomaly_city_figure():
+            anomaly_cities = cube.top_anomalies["city"].rename("count").rename_axis("city").reset_index()
 
-        fig = go.Figure(go.Bar(
-            x=anomaly_cities["count"],
-            y=anomaly_cities["city"],
-            orientation="h",
-            marker_color="#fd7e14",
-            text=anomaly_cities["count"],
-            textposition="outside"
-        ))
+            fig = go.Figure(go.Bar(
+                x=anomaly_cities["count"],
+                y=anomaly_cities["city"],
+                orientation="h",
+                marker_color="#fd7e14",
+                text=anomaly_cities["count"],
+                textposition="outside"
+            ))
 
-        fig.update_layout(height=420, margin=dict(l=150))
-        st.plotly_chart(fig, use_container_width=True)
+            fig.update_layout(height=420, margin=dict(l=150))
+            return fig
+
+        with tracing.span("analytics.anomaly_city_chart"):
+            fig = load_figure(("analytics_anomaly_cities",), build_anomaly_city_figure, tables=analytics_tables)
+            st.plotly_chart(fig, use_container_width=True)
 
     st.markdown("---")
     # -------------------- Anomaly Summary --------------------
     st.markdown("### 🚨 Anomaly Detection Summary")
 
-    normal_count = anomaly_df["is_anomaly_dbscan"].value_counts().get(False, 0)
-    anomaly_count = anomaly_df["is_anomaly_dbscan"].value_counts().get(True, 0)
+    normal_count = cube.normal_count
+    anomaly_count = cube.anomaly_count
 
     col1, col2, col3 = st.columns(3)
     col1.metric("Normal Samples", f"{normal_count:,}")
     col2.metric("Anomalies Detected", anomaly_count)
     col3.metric("Detection Rate", f"{anomaly_rate:.2f}%")
 
-    fig = go.Figure(go.Pie(
-        labels=["Normal", "Anomaly"],
-        values=[normal_count, anomaly_count],
-        hole=0.4,
-        marker_colors=["#0068c9", "#dc3545"]
-    ))
+    def build_anomaly_figure():
+        fig = go.Figure(go.Pie(
+            labels=["Normal", "Anomaly"],
+            values=[normal_count, anomaly_count],
+            hole=0.4,
+            marker_colors=["#0068c9", "#dc3545"]
+        ))
+
+        fig.update_layout(height=350)
+        return fig
 
-    fig.update_layout(height=350)
-    st.plotly_chart(fig, use_container_width=True)
+    with tracing.span("analytics.anomaly_chart"):
+        fig = load_figure(("analytics_anomalies",), build_anomaly_figure, tables=analytics_tables)
+        st.plotly_chart(fig, use_container_width=True)
 
     st.warning(
         """
@@ -662,6 +1207,23 @@ elif page == "Analytics":
     )
 
 
+# Cache stats are rendered last so they include this rerun's lookups
+with st.sidebar:
+    with st.expander("Cache", expanded=False):
+        cache_stats = CACHE.stats()
+        st.caption(f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · Reloads: {cache_stats['reloads']}")
+        figure_stats = FIGURES.stats()
+        st.caption(f"Figures: {figure_stats['entries']} · {figure_stats['bytes'] / 2**20:.1f} MB · "
+                   f"Hits: {figure_stats['hits']} · Misses: {figure_stats['misses']}")
+        surface_stats = SURFACES.stats()
+        st.caption(f"Surfaces: {surface_stats['entries']} · {surface_stats['bytes'] / 2**20:.1f} MB · "
+                   f"Hits: {surface_stats['hits']} · Misses: {surface_stats['misses']}")
+
+    if tracing.ENABLED:
+        tracing.end_run()
+        with st.expander("Trace", expanded=False):
+            st.dataframe(pd.DataFrame(tracing.TRACER.snapshot()).round(2), hide_index=True)
+
 # Footer
 st.markdown("""
 <style>
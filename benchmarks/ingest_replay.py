@@ -0,0 +1,87 @@
+"""Sustained throughput of ``airsense.ingest`` on one core.
+
+Starts an ``Ingestor`` on a localhost TCP port and a replay generator
+(``python -m airsense.ingest replay``) in a second process, both pinned to
+the same CPU.  The generator sends for ``--seconds`` at ``--rate`` readings
+per second, or as fast as the ingestor accepts them (the default, which
+measures the saturated, backpressured rate).  The ingestor's counters are
+sampled after ``--warmup`` seconds and again at the end.  Reported:
+
+* ``readings_per_sec``: readings scored per second between the two samples;
+* ``p50_ms`` / ``p99_ms``: arrival to published aggregate, per reading;
+* ``queue_peak``: most blocks ever waiting (bounded by ``--queue-blocks``).
+
+Raw readings are mapped to the processed scale with ``--stats`` (a
+``python -m airsense.pipeline --stats`` file), or with statistics fitted on the
+raw export when it is not given.
+
+    python benchmarks/ingest_replay.py --seconds 20 --output ingest.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from airsense.ingest import Ingestor, ReadingScaler  # noqa: E402
+
+
+def fitted_scaler(path):
+    if path:
+        return ReadingScaler.from_json(path)
+    from airsense import pipeline
+
+    return ReadingScaler.from_stats(pipeline.fit(pipeline.RAW_XLSX).to_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sustained ingestion throughput on one core")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=0.0, help="readings per second (0: as fast as accepted)")
+    parser.add_argument("--cities", type=int, help="number of replayed cities (default: the processed table's)")
+    parser.add_argument("--cpu", type=int, default=0, help="core to pin both processes to")
+    parser.add_argument("--stats", help="pipeline --stats JSON (default: fit on the raw export)")
+    parser.add_argument("--queue-blocks", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=2048)
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    os.sched_setaffinity(0, {args.cpu})
+    ingestor = Ingestor("tcp://127.0.0.1:0", scaler=fitted_scaler(args.stats), queue_blocks=args.queue_blocks,
+                        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms).start()
+    host, port = ingestor.address
+    command = [sys.executable, "-m", "airsense.ingest", "replay", f"tcp://{host}:{port}",
+               "--seconds", str(args.seconds), "--rate", str(args.rate)]
+    if args.cities:
+        command += ["--cities", str(args.cities)]
+    replay = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True,
+                              preexec_fn=lambda: os.sched_setaffinity(0, {args.cpu}))
+
+    time.sleep(args.warmup)
+    start, first = time.perf_counter(), ingestor.snapshot()["metrics"]
+    replay.wait()
+    end, last = time.perf_counter(), ingestor.snapshot()["metrics"]
+    ingestor.stop()
+
+    result = {
+        "seconds": round(end - start, 2),
+        "rate": args.rate,
+        "readings_per_sec": round((last["readings"] - first["readings"]) / (end - start), 1),
+        "sent": replay.stdout.read().strip(),
+        **{k: last[k] for k in ("readings", "rejected", "cities", "p50_ms", "p99_ms", "mean_batch_size",
+                                "queue_peak")},
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps({"python": sys.version.split()[0], "result": result}, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
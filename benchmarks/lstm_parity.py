@@ -0,0 +1,127 @@
+"""LSTM forecaster: NumPy forward pass vs Keras.
+
+Both backends score the same batch in a fresh interpreter: every city-year of
+the processed data that has three years of lags (``FORECAST_FEATURES``).
+Reported per backend:
+
+* ``load_s``: library import plus model load;
+* ``predict_s``: median time to score the whole batch in one call;
+* ``rss_mb``: peak RSS growth over the interpreter baseline (the input batch
+  included).
+
+The predictions are then compared.  The exit status is 1 when any differs by
+more than ``--tolerance`` relative to ``max(1, |keras|)``.  Without
+TensorFlow installed, only the NumPy side is measured.
+
+    python benchmarks/lstm_parity.py --repeat 5 --output lstm.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, statistics, sys, time
+import numpy as np
+
+def peak_kb():
+    # ru_maxrss would start at the parent's peak, which survives fork and exec
+    with open("/proc/self/status") as fh:
+        return next(int(line.split()[1]) for line in fh if line.startswith("VmHWM:"))
+
+backend, inputs, outputs, repeat = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+base_kb = peak_kb()
+X = np.load(inputs)
+start = time.perf_counter()
+if backend == "keras":
+    import keras
+    from airsense.config import model_path
+
+    model = keras.models.load_model(model_path("lstm"), compile=False)
+    predict = lambda: np.asarray(model.predict_on_batch(X[:, None, :]))[:, 0]
+else:
+    from airsense.loaders import load_model
+
+    model = load_model("lstm")
+    predict = lambda: model.predict(X)
+load_s = time.perf_counter() - start
+
+times = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    pred = predict()
+    times.append(time.perf_counter() - start)
+np.save(outputs, pred.astype(np.float32))
+print(json.dumps({
+    "load_s": load_s,
+    "predict_s": statistics.median(times),
+    "rss_mb": (peak_kb() - base_kb) / 1024,
+}))
+"""
+
+
+def feature_batch():
+    sys.path.insert(0, str(ROOT))
+    from airsense import snapshots
+    from airsense.forecast import FORECAST_FEATURES, FORECAST_INPUT_COLUMNS, LAG_FEATURES, add_lag_features
+
+    df = add_lag_features(snapshots.read("processed", FORECAST_INPUT_COLUMNS).dropna(subset=["city", "year"]))
+    df = df[df[LAG_FEATURES].notna().all(axis=1)]
+    return df[FORECAST_FEATURES].to_numpy(dtype=np.float32)
+
+
+def run(backend, inputs, outputs, repeat):
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, backend, str(inputs), str(outputs), str(repeat)],
+        cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"), check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy LSTM forward pass against Keras")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    X = feature_batch()
+    backends = ["numpy"] + (["keras"] if importlib.util.find_spec("tensorflow") else [])
+    results, predictions = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = Path(tmp) / "X.npy"
+        np.save(inputs, X)
+        for backend in backends:
+            outputs = Path(tmp) / f"{backend}.npy"
+            r = results[backend] = run(backend, inputs, outputs, args.repeat)
+            predictions[backend] = np.load(outputs)
+            print(f"{backend:<6} load {r['load_s']:.3f}s  predict {r['predict_s'] * 1e3:8.2f} ms "
+                  f"({len(X):,} rows)  rss +{r['rss_mb']:.1f} MB")
+
+    failed = False
+    if "keras" in predictions:
+        expected, got = predictions["keras"], predictions["numpy"]
+        error = np.abs(got - expected) / np.maximum(1.0, np.abs(expected))
+        failed = bool(error.max() > args.tolerance)
+        results["parity"] = {"rows": len(X), "max_abs": float(np.abs(got - expected).max()),
+                             "max_rel": float(error.max()), "tolerance": args.tolerance}
+        print(f"parity max |diff| {results['parity']['max_abs']:.3g}  max rel {error.max():.3g}  "
+              f"{'FAIL' if failed else 'ok'}")
+    else:
+        print("keras  not installed (pip install tensorflow); parity not checked")
+
+    if args.output:
+        args.output.write_text(json.dumps({"python": sys.version.split()[0], "results": results}, indent=2) + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Load time and memory: joblib pickles vs the model registry.
+
+Each (model, format) pair is loaded in a fresh interpreter, so library import
+cost is included.  A first prediction follows each load, because
+memory-mapped arrays are only paged in when used.  Reported per pair:
+
+* ``load_s``: import plus load time;
+* ``first_call_s``: the first prediction;
+* ``rss_mb``: peak RSS growth over the interpreter baseline.
+
+    python -m airsense.registry export
+    python benchmarks/model_load.py --repeat 5 --output model_load.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from airsense import registry  # noqa: E402
+
+MODELS = ["xgb", "xgb_forecast", "kmeans", "dbscan", "iforest"]
+
+PROBE = r"""
+import json, resource, sys, time
+import numpy as np
+
+name, fmt = sys.argv[1], sys.argv[2]
+base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if fmt == "pickle":
+    import joblib
+    from airsense.anomaly import CoreSampleScorer, IsolationForestScorer
+    from airsense.config import model_path
+
+    obj = joblib.load(model_path(name))
+    if name == "dbscan":
+        obj = CoreSampleScorer.from_dbscan(obj)
+    elif name == "iforest":
+        obj = IsolationForestScorer.from_model(obj)
+else:
+    from airsense import registry
+
+    obj = registry.load(name, registry.entry(name))
+load_s = time.perf_counter() - start
+
+if name == "dbscan":
+    n_features = obj.tree.m
+elif name == "iforest":
+    n_features = 6
+elif name == "kmeans":
+    n_features = obj.cluster_centers_.shape[1]
+else:
+    n_features = obj.n_features_in_
+X = np.random.default_rng(0).normal(size=(256, n_features))
+start = time.perf_counter()
+if name == "dbscan":
+    obj.is_anomaly(X)
+elif name == "iforest":
+    obj.score_samples(X)
+else:
+    obj.predict(X.astype(np.float32) if name.startswith("xgb") else X)
+first_call_s = time.perf_counter() - start
+
+print(json.dumps({
+    "load_s": load_s,
+    "first_call_s": first_call_s,
+    "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_kb) / 1024,
+}))
+"""
+
+
+def run(name, fmt, repeat):
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE, name, fmt],
+            cwd=ROOT, capture_output=True, text=True, env=os.environ.copy(), check=True,
+        )
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {key: round(statistics.median(r[key] for r in runs), 4) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model load time and RSS: pickle vs registry")
+    parser.add_argument("--model", action="append", choices=MODELS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    manifest = registry.read_manifest()
+    results = {}
+    for name in args.model or MODELS:
+        formats = ["pickle"] + (["registry"] if registry.entry(name, manifest) is not None else [])
+        for fmt in formats:
+            r = results.setdefault(name, {})[fmt] = run(name, fmt, args.repeat)
+            print(f"{name:<13} {fmt:<9} load {r['load_s']:.3f}s  first call {r['first_call_s'] * 1e3:7.1f} ms  "
+                  f"rss +{r['rss_mb']:.1f} MB")
+        if len(formats) == 1:
+            print(f"{name:<13} no registry entry (run: python -m airsense.registry export {name})")
+
+    if args.output:
+        args.output.write_text(json.dumps({"python": sys.version.split()[0], "models": results}, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
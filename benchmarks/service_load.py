@@ -0,0 +1,100 @@
+"""Closed-loop load test for ``airsense.service`` on localhost.
+
+Starts the HTTP service in-process (or targets ``--url``), runs ``--clients``
+keep-alive connections that each send single-row requests back to back for
+``--seconds``, then prints client-side throughput and the service's own
+latency percentiles and batch-size histogram.
+
+    python benchmarks/service_load.py --clients 32 --seconds 10 --max-wait-ms 5 --stats stats.json
+
+Requests carry raw concentrations in µg/m³, so a service started here needs
+the pipeline statistics (``--stats``, default ``AIRSENSE_PIPELINE_STATS``).
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from airsense.pollution_index import INDEX_FEATURES  # noqa: E402
+
+
+def _client(host, port, kind, deadline, counts, errors, seed):
+    rng = np.random.default_rng(seed)
+    conn = http.client.HTTPConnection(host, port)
+    sent = 0
+    while time.perf_counter() < deadline:
+        record = dict(zip(INDEX_FEATURES, rng.uniform(0, 150, len(INDEX_FEATURES)).tolist()))
+        conn.request("POST", f"/predict/{kind}", json.dumps(record), {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            errors.append(response.status)
+        sent += 1
+    conn.close()
+    counts.append(sent)
+
+
+def run(url, clients, seconds, kind="index"):
+    parsed = urlparse(url)
+    counts, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=_client, args=(parsed.hostname, parsed.port, kind, deadline, counts, errors, i))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    conn.request("GET", "/metrics")
+    metrics = json.loads(conn.getresponse().read())[kind]
+    conn.close()
+    return {
+        "clients": clients,
+        "requests": sum(counts),
+        "errors": len(errors),
+        "requests_per_sec": round(sum(counts) / elapsed, 1),
+        **metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="existing service, e.g. http://127.0.0.1:8600 (default: start one)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--stats", help="pipeline --stats JSON for a service started here")
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        from airsense.loaders import require_reading_scaler
+        from airsense.service import serve
+
+        try:
+            scaler = require_reading_scaler(args.stats)
+        except ValueError as e:
+            parser.error(str(e))
+        server = serve(port=0, scaler=scaler, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(json.dumps(run(url, args.clients, args.seconds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Cold-start and first-render timing per page.
+
+Every scenario runs in a fresh interpreter: import Streamlit's test harness,
+render ``app.py`` once with the page (and Operations objective) preselected,
+then rerun it once more.  The report lists the median timings over
+``--repeat`` runs and which heavy libraries the page pulled in.
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --compare startup.json --tolerance 0.3
+
+With ``--compare`` the exit status is 1 when a first render got slower than
+the baseline by more than the tolerance, or a page started importing a heavy
+library it did not import before.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["matplotlib", "plotly", "folium", "streamlit_folium", "sklearn", "xgboost",
+                 "scipy", "pyarrow", "tensorflow", "keras", "joblib"]
+
+SCENARIOS = {
+    "home": ("🏠 Home", None),
+    "prediction": ("🔬 Operations", "Pollution Index Prediction"),
+    "severity": ("🔬 Operations", "City Severity Classification"),
+    "anomaly": ("🔬 Operations", "Anomaly Detection"),
+    "trend": ("🔬 Operations", "Yearly Trend Forecast"),
+    "analytics": ("📈 Analytics", None),
+}
+
+PROBE = r"""
+import json, sys, time
+page, objective, app, heavy = json.loads(sys.argv[1])
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import_s = time.perf_counter() - start
+before = set(sys.modules)
+
+at = AppTest.from_file(app, default_timeout=600)
+at.session_state["page"] = page
+if objective:
+    at.session_state["objective"] = objective
+start = time.perf_counter()
+at.run()
+first_s = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun_s = time.perf_counter() - start
+
+loaded = {name.split(".")[0] for name in set(sys.modules) - before}
+print(json.dumps({
+    "import_streamlit_s": import_s,
+    "first_render_s": first_s,
+    "rerun_s": rerun_s,
+    "heavy_modules": sorted(loaded & set(heavy)),
+    "errors": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def run_scenario(page, objective, repeat):
+    runs = []
+    for _ in range(repeat):
+        args = json.dumps([page, objective, str(ROOT / "app.py"), HEAVY_MODULES])
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE, args],
+            cwd=ROOT, capture_output=True, text=True, env=os.environ.copy(), check=True,
+        )
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    result = {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in ("import_streamlit_s", "first_render_s", "rerun_s")
+    }
+    result["heavy_modules"] = runs[-1]["heavy_modules"]
+    result["errors"] = runs[-1]["errors"]
+    return result
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, current in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        limit = before["first_render_s"] * (1 + tolerance)
+        if current["first_render_s"] > limit:
+            failures.append(f"{name}: first render {current['first_render_s']:.3f}s > {limit:.3f}s")
+        new_modules = set(current["heavy_modules"]) - set(before["heavy_modules"])
+        if new_modules:
+            failures.append(f"{name}: now imports {', '.join(sorted(new_modules))}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-page cold start timing for app.py")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="baseline JSON written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(*SCENARIOS[name], args.repeat)
+        r = results[name]
+        print(f"{name:<11} first render {r['first_render_s']:.3f}s  rerun {r['rerun_s']:.3f}s  "
+              f"heavy: {', '.join(r['heavy_modules']) or '-'}" + (f"  ERRORS: {r['errors']}" if r["errors"] else ""))
+
+    report = {"python": sys.version.split()[0], "scenarios": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        failures = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Data-path benchmarks at growing dataset sizes.
+
+For each scale, a WHO-shaped dataset is generated with ``synthetic.py`` (and
+reused on later runs).  Then each page's data path is timed in a fresh
+interpreter pointed at it via ``AIRSENSE_DATA_DIR``.  Every case runs cold
+(artifact cache cleared, persisted derived tables deleted) and then warm (the
+same call again, as a Streamlit rerun would).  Model loading is
+scale-independent and measured once via ``model_load.py``.
+
+    python benchmarks/suite.py --scales 1 10 --output baseline.json
+    python benchmarks/suite.py --scales 1 10 --compare baseline.json --tolerance 0.25
+
+With ``--compare`` the exit status is 1 when any cold or warm time exceeds
+the baseline by more than the tolerance.  Times under ``--floor-ms`` are not
+compared, so timer noise on trivial cases does not fail the run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import model_load
+import synthetic
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = [
+    "load_processed", "city_index", "city_lookup", "anomaly_map", "trend_filter", "analytics_cube",
+    "severity_table", "forecast_table", "index_inference", "anomaly_scoring",
+]
+
+PROBE = r"""
+import json, shutil, sys, time
+import numpy as np
+
+cases, repeat = json.loads(sys.argv[1])
+
+from airsense import loaders
+from airsense.cache import CACHE
+from airsense.config import DERIVED_DIR
+from airsense.loaders import PAGE_COLUMNS
+
+def reset():
+    CACHE.clear()
+    shutil.rmtree(DERIVED_DIR, ignore_errors=True)
+
+def city_lookup():
+    index = loaders.load_city_index()
+    countries = index.countries
+    for i in range(200):
+        country = countries[(i * 7919) % len(countries)]
+        cities = index.cities(country)
+        city = cities[i % len(cities)]
+        index.resolve(country.lower(), city.upper())
+        index.rows(country, city)
+
+def trend_filter():
+    series = loaders.load_city_series()
+    cities = series.cities
+    forecast = loaders.load_forecast_table()
+    for city in cities[::max(1, len(cities) // 20)][:20]:
+        series.series(city)
+        series.stats(city)
+        forecast.loc[[city]] if city in forecast.index else None
+
+def index_inference():
+    from airsense.pollution_index import INDEX_FEATURES, classify, predict_index
+
+    df = loaders.load_processed(INDEX_FEATURES)
+    classify(predict_index(loaders.load_model("xgb"), df))
+
+def anomaly_scoring():
+    from airsense.anomaly import ANOMALY_FEATURES
+
+    X = loaders.load_anomalies(ANOMALY_FEATURES).dropna().to_numpy()[:10_000]
+    scorers = loaders.load_anomaly_scorers()
+    scorers["dbscan"].is_anomaly(X)
+    scorers["iforest"].is_anomaly(X)
+
+def anomaly_map():
+    from airsense.maps import DETAIL_LEVELS
+
+    loaders.load_anomaly_map(DETAIL_LEVELS["Medium"])
+
+CASE_FUNCTIONS = {
+    "load_processed": lambda: loaders.load_processed(PAGE_COLUMNS["severity"]),
+    "city_index": loaders.load_city_index,
+    "city_lookup": city_lookup,
+    "anomaly_map": anomaly_map,
+    "trend_filter": trend_filter,
+    "analytics_cube": loaders.load_analytics_cube,
+    "severity_table": loaders.load_severity_table,
+    "forecast_table": loaders.load_forecast_table,
+    "index_inference": index_inference,
+    "anomaly_scoring": anomaly_scoring,
+}
+
+results = {}
+for case in cases:
+    cold, warm = [], []
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        CASE_FUNCTIONS[case]()
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        CASE_FUNCTIONS[case]()
+        warm.append(time.perf_counter() - start)
+    results[case] = {"cold_s": sorted(cold)[len(cold) // 2], "warm_s": sorted(warm)[len(warm) // 2]}
+reset()
+
+import resource
+print(json.dumps({"cases": results, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def _scale_label(scale):
+    return f"x{scale:g}"
+
+
+def ensure_dataset(data_root, scale, seed, regenerate=False):
+    out_dir = Path(data_root) / _scale_label(scale)
+    meta = synthetic.describe(out_dir)
+    current = meta is not None and meta["scale"] == scale and meta["seed"] == seed \
+        and meta["generator_version"] == synthetic.GENERATOR_VERSION
+    if regenerate or not current:
+        print(f"generating {_scale_label(scale)} in {out_dir} ...", flush=True)
+        synthetic.generate(out_dir, scale, seed)
+        meta = synthetic.describe(out_dir)
+    return out_dir, meta
+
+
+def run_scale(data_dir, cases, repeat):
+    env = dict(os.environ, AIRSENSE_DATA_DIR=str(data_dir))
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps([cases, repeat])],
+        cwd=ROOT, capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark probe failed for {data_dir}:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(report, baseline, tolerance, floor_s):
+    failures = []
+    for scale, current in report["scales"].items():
+        before = baseline.get("scales", {}).get(scale)
+        if before is None:
+            continue
+        for case, timings in current["cases"].items():
+            for key in ("cold_s", "warm_s"):
+                old = before["cases"].get(case, {}).get(key)
+                if old is None or max(old, timings[key]) < floor_s:
+                    continue
+                limit = old * (1 + tolerance)
+                if timings[key] > limit:
+                    failures.append(f"{scale} {case} {key[:-2]}: {timings[key]:.4f}s > {limit:.4f}s")
+    for name, formats in report.get("models", {}).items():
+        for fmt, timings in formats.items():
+            old = baseline.get("models", {}).get(name, {}).get(fmt, {}).get("load_s")
+            if old is not None and max(old, timings["load_s"]) >= floor_s and timings["load_s"] > old * (1 + tolerance):
+                failures.append(f"model {name} ({fmt}) load: {timings['load_s']:.4f}s > {old * (1 + tolerance):.4f}s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AirSense data-path benchmarks at 1x..1000x scale")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                        help="dataset sizes relative to the WHO extract (e.g. 1 10 100 1000)")
+    parser.add_argument("--case", action="append", choices=CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-root", type=Path, default=Path(tempfile.gettempdir()) / "airsense-bench")
+    parser.add_argument("--regenerate", action="store_true")
+    parser.add_argument("--skip-models", action="store_true")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="baseline JSON written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--floor-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    cases = args.case or CASES
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "scales": {}, "models": {}}
+    for scale in args.scales:
+        data_dir, meta = ensure_dataset(args.data_root, scale, args.seed, args.regenerate)
+        result = run_scale(data_dir, cases, args.repeat)
+        result["rows"] = meta["rows"]
+        report["scales"][_scale_label(scale)] = result
+        print(f"\n{_scale_label(scale)}: {meta['rows']:,} rows, peak RSS {result['max_rss_mb']:.0f} MB")
+        for case, r in result["cases"].items():
+            print(f"  {case:<16} cold {r['cold_s'] * 1e3:9.1f} ms   warm {r['warm_s'] * 1e3:8.2f} ms")
+
+    if not args.skip_models:
+        print("\nmodel loads")
+        for name in model_load.MODELS:
+            formats = ["pickle"] + (["registry"] if model_load.registry.entry(name) is not None else [])
+            for fmt in formats:
+                r = report["models"].setdefault(name, {})[fmt] = model_load.run(name, fmt, args.repeat)
+                print(f"  {name:<13} {fmt:<9} load {r['load_s']:.3f}s  rss +{r['rss_mb']:.1f} MB")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        failures = compare(report, json.loads(args.compare.read_text()), args.tolerance, args.floor_ms / 1e3)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
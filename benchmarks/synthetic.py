@@ -0,0 +1,213 @@
+"""Synthetic WHO-shaped datasets at a chosen scale.
+
+Scale 1 has about as many settlements, countries and city-years as the WHO
+ambient air quality database (~6,000 cities in 117 countries, 2010-2021,
+~40k rows).  Scale ``k`` has ``k`` times the cities over the same years.  For
+each scale this writes:
+
+* ``processed/processed_data.csv`` and
+  ``processed/processed_with_anomalies.csv``, with the same columns and value
+  ranges as the notebooks produce: standardized measurements, first one-hot
+  column for ``who_region``/``iso3``, and labels and anomaly flags;
+* Arrow snapshots of both, plus the raw table the Home page reads, under
+  ``snapshots/``.  There is no ``.xlsx``: Excel caps out at ~1M rows, and the
+  app uses a snapshot when one is present.
+
+Rows are generated and written a block of cities at a time, so memory does
+not grow with the scale.
+
+    python benchmarks/synthetic.py /tmp/airsense-x10 --scale 10
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_CITIES = 6_000
+N_COUNTRIES = 117
+N_REGIONS = 6
+YEARS = np.arange(2010, 2022)
+CITIES_PER_BLOCK = 20_000
+
+GENERATOR_VERSION = 1
+
+# Fixed-length consonant-vowel syllables, so different indices never spell the same name
+_SYLLABLES = [c + v for c in "bdfghjklmnprstvwyz" for v in "aeiou"]
+
+PROCESSED_COLUMNS = [
+    "who_region", "iso3", "country_name", "city", "year", "pm10_concentration", "pm25_concentration",
+    "no2_concentration", "pm10_tempcov", "pm25_tempcov", "no2_tempcov", "type_of_stations", "population",
+    "latitude", "longitude", "pollution_index", "pollution_per_person", "pollution_index_yearly_change",
+    "country_name_raw", "city_raw",
+]
+ANOMALY_COLUMNS = PROCESSED_COLUMNS + ["iso_label", "is_anomaly_iso", "dbscan_label", "is_anomaly_dbscan"]
+RAW_COLUMNS = ["who_region", "iso3", "country_name", "city", "year", "pm10_concentration", "pm25_concentration",
+               "no2_concentration", "population", "latitude", "longitude"]
+
+
+def _name(index, min_syllables):
+    """Pronounceable name, unique per ``index`` (its digits in base ``len(_SYLLABLES)``)."""
+    parts = []
+    while index or len(parts) < min_syllables:
+        index, digit = divmod(index, len(_SYLLABLES))
+        parts.append(_SYLLABLES[digit])
+    return "".join(parts).capitalize()
+
+
+def _countries(rng):
+    names = [_name(i, 2) + ("ia" if i % 3 else "") for i in range(N_COUNTRIES)]
+    return pd.DataFrame({
+        "country_name": names,
+        "iso3": [n[:3].upper() for n in names],
+        "region": rng.integers(0, N_REGIONS, N_COUNTRIES),
+        "lat": rng.uniform(-40, 60, N_COUNTRIES),
+        "lon": rng.uniform(-120, 150, N_COUNTRIES),
+        # Country-level pollution level drives most of the variance, as in the WHO data
+        "level": rng.normal(0, 0.6, N_COUNTRIES),
+    })
+
+
+def _standardize(x, mean, std):
+    return (x - mean) / std
+
+
+def _block(rng, countries, first_city, n_cities):
+    """City-years for cities ``first_city .. first_city + n_cities``."""
+    country = rng.integers(0, N_COUNTRIES, n_cities)
+    length = np.minimum(rng.geometric(0.12, n_cities), len(YEARS))
+    start = rng.integers(0, len(YEARS) - length + 1)
+    rows = np.repeat(np.arange(n_cities), length)
+    year_offset = np.arange(len(rows)) - np.repeat(np.cumsum(length) - length, length)
+    n = len(rows)
+
+    c = countries.iloc[country[rows]].reset_index(drop=True)
+    city_names = np.array([
+        _name(i, 3) + ("é" if i % 17 == 0 else "") for i in range(first_city, first_city + n_cities)
+    ], dtype=object)
+    city_level = (c["level"].to_numpy() + np.repeat(rng.normal(0, 0.35, n_cities), length))
+    trend = -0.03 * year_offset
+
+    pm10 = np.exp(3.4 + city_level + trend + rng.normal(0, 0.25, n))
+    pm25 = np.exp(2.8 + city_level + trend + rng.normal(0, 0.25, n))
+    no2 = np.exp(3.0 + 0.6 * city_level + rng.normal(0, 0.4, n))
+    population = np.repeat(np.exp(rng.normal(11.5, 1.4, n_cities)), length)
+
+    z10, z25, zno2 = _standardize(pm10, 38, 30), _standardize(pm25, 20, 17), _standardize(no2, 22, 15)
+    index = 0.60 * z10 + 0.60 * z25 + 0.53 * zno2
+    city = city_names[rows]
+    df = pd.DataFrame({
+        "who_region": (c["region"].to_numpy() == 0).astype(np.float64),
+        "iso3": (c["iso3"].to_numpy() == countries["iso3"].min()).astype(np.float64),
+        "country_name": c["country_name"].to_numpy(),
+        "city": city,
+        "year": YEARS[start[rows] + year_offset],
+        "pm10_concentration": z10,
+        "pm25_concentration": z25,
+        "no2_concentration": zno2,
+        "pm10_tempcov": _standardize(rng.uniform(0, 100, n), 50, 29),
+        "pm25_tempcov": _standardize(rng.uniform(0, 100, n), 50, 29),
+        "no2_tempcov": _standardize(rng.uniform(0, 100, n), 50, 29),
+        "type_of_stations": rng.integers(0, 9, n),
+        "population": _standardize(np.minimum(population, 2e6), 4e5, 5e5),
+        "latitude": c["lat"].to_numpy() + np.repeat(rng.normal(0, 3, n_cities), length),
+        "longitude": c["lon"].to_numpy() + np.repeat(rng.normal(0, 3, n_cities), length),
+        "pollution_index": index / 1.4,
+        "pollution_per_person": _standardize((pm10 + pm25) / population ** 2 + no2 / population, 1e-3, 4e-3),
+    })
+    change = np.diff(df["pollution_index"].to_numpy(), prepend=np.nan)
+    change[year_offset == 0] = 0.0
+    df["pollution_index_yearly_change"] = change
+    df["country_name_raw"] = df["country_name"]
+    df["city_raw"] = df["city"]
+
+    # Flags concentrate on extreme readings, like the fitted detectors' output
+    extremeness = np.abs(z10) + np.abs(z25) + np.abs(zno2) + rng.exponential(1.0, n)
+    iso = extremeness > np.quantile(extremeness, 0.95)
+    dbscan = extremeness > np.quantile(extremeness, 0.97)
+    anomalies = df.copy()
+    anomalies["iso_label"] = np.where(iso, -1, 1)
+    anomalies["is_anomaly_iso"] = iso
+    anomalies["dbscan_label"] = np.where(dbscan, -1, country[rows] % 5)
+    anomalies["is_anomaly_dbscan"] = dbscan
+
+    raw = df[RAW_COLUMNS].copy()
+    raw["who_region"] = np.where(c["region"].to_numpy() == 0, "1_Afr", "2_Amr")
+    raw["iso3"] = c["iso3"].to_numpy()
+    raw["pm10_concentration"], raw["pm25_concentration"], raw["no2_concentration"] = pm10, pm25, no2
+    raw["population"] = population
+    return df, anomalies, raw
+
+
+class _ArrowSink:
+    def __init__(self, path):
+        self.path = path
+        self.sink = None
+        self.writer = None
+
+    def write(self, frame):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.sink = pa.OSFile(str(self.path), "wb")
+            self.writer = pa.ipc.new_file(self.sink, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+
+
+def generate(out_dir, scale=1, seed=0):
+    """Write the scaled dataset under ``out_dir`` (an ``AIRSENSE_DATA_DIR``); return the row count."""
+    out_dir = Path(out_dir)
+    (out_dir / "processed").mkdir(parents=True, exist_ok=True)
+    (out_dir / "snapshots").mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    countries = _countries(rng)
+
+    n_cities = int(BASE_CITIES * scale)
+    processed_csv = out_dir / "processed" / "processed_data.csv"
+    anomalies_csv = out_dir / "processed" / "processed_with_anomalies.csv"
+    rows = 0
+    arrow = {name: _ArrowSink(out_dir / "snapshots" / f"{name}.arrow") for name in ("processed", "anomalies", "raw")}
+    with open(processed_csv, "w", newline="") as p_out, open(anomalies_csv, "w", newline="") as a_out:
+        for first in range(0, n_cities, CITIES_PER_BLOCK):
+            block_rng = np.random.default_rng([seed, first])
+            df, anomalies, raw = _block(block_rng, countries, first, min(CITIES_PER_BLOCK, n_cities - first))
+            df.to_csv(p_out, index=False, header=rows == 0)
+            anomalies.to_csv(a_out, index=False, header=rows == 0)
+            for name, frame in (("processed", df), ("anomalies", anomalies), ("raw", raw)):
+                arrow[name].write(frame)
+            rows += len(df)
+    # Closed after the CSVs, so the snapshots are newer and the app reads them
+    for sink in arrow.values():
+        sink.close()
+
+    (out_dir / "synthetic.json").write_text(json.dumps({
+        "scale": scale, "seed": seed, "rows": rows, "cities": n_cities, "generator_version": GENERATOR_VERSION,
+    }) + "\n")
+    return rows
+
+
+def describe(out_dir):
+    """Metadata written by ``generate`` (None if ``out_dir`` holds no generated data)."""
+    path = Path(out_dir) / "synthetic.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a WHO-shaped AirSense dataset")
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = generate(args.out_dir, args.scale, args.seed)
+    print(f"{rows:,} rows -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Parity of the out-of-core DBSCAN in ``airsense.anomaly_train`` with ``sklearn.cluster.DBSCAN``."""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+
+from airsense import anomaly_train, snapshots
+from airsense.anomaly import ANOMALY_FEATURES
+
+
+def clustered_table(seed, n_clusters=40, per_cluster=60, noise=300):
+    """Gaussian blobs spread over latitude, uniform noise and a few rows with a missing feature."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-6, 6, size=(n_clusters, len(ANOMALY_FEATURES)))
+    centers[:, anomaly_train.LAT] = rng.uniform(-60, 70, n_clusters)
+    X = np.concatenate([
+        rng.normal(centers.repeat(per_cluster, axis=0), 0.5),
+        rng.uniform([-8] * 4 + [-65, -8], [8] * 4 + [75, 8], size=(noise, len(ANOMALY_FEATURES))),
+    ])
+    X = X[rng.permutation(len(X))]
+    X[rng.choice(len(X), 20, replace=False), rng.integers(0, len(ANOMALY_FEATURES), 20)] = np.nan
+    df = pd.DataFrame(X, columns=ANOMALY_FEATURES)
+    df.insert(0, "city", [f"c{i}" for i in range(len(df))])
+    return df
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_sklearn_dbscan(tmp_path, monkeypatch, seed):
+    df = clustered_table(seed)
+
+    def iter_chunks(name, columns=None, chunk_rows=None):
+        table = df if columns is None else df[columns]
+        for start in range(0, len(table), chunk_rows):
+            yield table.iloc[start:start + chunk_rows]
+
+    monkeypatch.setattr(snapshots, "iter_chunks", iter_chunks)
+    monkeypatch.setattr(anomaly_train, "ANOMALIES_CSV", tmp_path / "anomalies.csv")
+    monkeypatch.setattr(anomaly_train, "model_path", lambda name: tmp_path / f"{name}.pkl")
+
+    result = anomaly_train.train(chunk_rows=500, strip_rows=250, edge_batch=2_000, work_dir=tmp_path)
+    assert result.rows == len(df)
+    assert result.n_strips > 8
+
+    valid = np.flatnonzero(~df[ANOMALY_FEATURES].isna().any(axis=1).to_numpy())
+    expected = DBSCAN(eps=anomaly_train.EPS, min_samples=anomaly_train.MIN_SAMPLES).fit(
+        df[ANOMALY_FEATURES].to_numpy()[valid])
+    got = joblib.load(tmp_path / "dbscan.pkl")
+
+    np.testing.assert_array_equal(got.labels_[valid], expected.labels_)
+    np.testing.assert_array_equal(np.delete(got.labels_, valid), -1)
+    np.testing.assert_array_equal(got.core_sample_indices_, valid[expected.core_sample_indices_])
+    np.testing.assert_array_equal(got.components_, expected.components_)
+
+    table = pd.read_csv(tmp_path / "anomalies.csv")
+    np.testing.assert_array_equal(table["dbscan_label"].to_numpy(), got.labels_)
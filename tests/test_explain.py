@@ -0,0 +1,54 @@
+"""Parity of the table-based TreeSHAP in ``airsense.explain`` with XGBoost's ``pred_contribs``."""
+import numpy as np
+import pytest
+
+from airsense.config import model_path
+from airsense.explain import TABLE_FEATURES, _IntervalTables, attributions, booster_of
+
+xgb = pytest.importorskip("xgboost")
+
+TOLERANCE = 1e-4
+
+
+def random_rows(booster, n, seed):
+    """Normal rows, rows on the split thresholds themselves and rows with missing values."""
+    rng = np.random.default_rng(seed)
+    n_features = booster.num_features()
+    X = rng.normal(scale=2.0, size=(n, n_features)).astype(np.float32)
+    thresholds = _IntervalTables(booster, n_features).thresholds
+    for f in range(n_features):
+        if len(thresholds[f]):
+            X[: n // 4, f] = rng.choice(thresholds[f], n // 4)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+def assert_parity(model, X):
+    booster = booster_of(model)
+    assert booster.num_features() <= TABLE_FEATURES
+    expected = booster.predict(xgb.DMatrix(X, feature_names=booster.feature_names), pred_contribs=True)
+    got = attributions(model, X)
+    assert got.shape == expected.shape == (len(X), X.shape[1] + 1)
+    # Feature columns and the bias column alike
+    np.testing.assert_allclose(got, expected, rtol=TOLERANCE, atol=TOLERANCE)
+
+
+def test_shipped_index_model_matches_pred_contribs():
+    path = model_path("xgb")
+    if not path.exists():
+        pytest.skip(f"{path} not found")
+    from airsense.loaders import load_model
+
+    model = load_model("xgb")
+    assert_parity(model, random_rows(booster_of(model), 2000, seed=0))
+
+
+@pytest.mark.parametrize("n_features", [1, 2, 3])
+def test_fitted_model_matches_pred_contribs(n_features):
+    rng = np.random.default_rng(n_features)
+    X = rng.normal(size=(3000, n_features)).astype(np.float32)
+    y = X @ rng.normal(size=n_features) + np.sin(3 * X[:, 0]) + rng.normal(scale=0.1, size=len(X))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    model = xgb.XGBRegressor(n_estimators=50, max_depth=5, learning_rate=0.2, random_state=0).fit(X, y)
+
+    assert_parity(model, random_rows(model.get_booster(), 1000, seed=n_features + 10))
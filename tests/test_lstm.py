@@ -0,0 +1,47 @@
+"""Parity of the NumPy LSTM forward pass with Keras (skipped without TensorFlow)."""
+import numpy as np
+import pytest
+
+from airsense.config import model_path
+from airsense.lstm import LSTMForecaster
+
+keras = pytest.importorskip("keras")
+pytest.importorskip("tensorflow")
+
+TOLERANCE = 1e-4
+
+
+def assert_parity(got, expected):
+    expected = np.asarray(expected, dtype=np.float32).reshape(-1)
+    assert got.shape == expected.shape
+    error = np.abs(got - expected) / np.maximum(1.0, np.abs(expected))
+    assert error.max() <= TOLERANCE
+
+
+def test_shipped_model_matches_keras():
+    path = model_path("lstm")
+    if not path.exists():
+        pytest.skip(f"{path} not found")
+    model = keras.models.load_model(path, compile=False)
+    forecaster = LSTMForecaster.from_h5(path)
+    X = np.random.default_rng(0).normal(size=(513, forecaster.n_features_in_)).astype(np.float32)
+
+    assert_parity(forecaster.predict(X), model.predict_on_batch(X[:, None, :]))
+    assert_parity(forecaster.predict(X[:, None, :], chunk_rows=100), model.predict_on_batch(X[:, None, :]))
+
+
+@pytest.mark.parametrize("activation", ["relu", "tanh"])
+def test_multi_timestep_model_matches_keras(tmp_path, activation):
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([
+        keras.Input((5, 7)),
+        keras.layers.LSTM(16, activation=activation),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(1),
+    ])
+    path = tmp_path / "lstm.h5"
+    model.save(path)
+    forecaster = LSTMForecaster.from_h5(path)
+    X = np.random.default_rng(1).normal(size=(300, 5, 7)).astype(np.float32)
+
+    assert_parity(forecaster.predict(X, chunk_rows=64), model.predict_on_batch(X))